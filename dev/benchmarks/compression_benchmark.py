@@ -0,0 +1,73 @@
+# Benchmark of the compressed cold segments of connectors.TimeSeriesStore over the retention window.
+# Compares the cache memory of the uncompressed store with the 'lossless' and 'float32' encodings and measures the
+# decode throughput of reads from compressed segments.
+# Run from the repository root: python dev/benchmarks/compression_benchmark.py [--tags 22] [--days 5] [--interval-seconds 60]
+
+# Library imports
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src', 'aurubis_advisory_model'))
+
+# Module imports
+from connectors.TimeSeriesStore import TimeSeriesStore
+
+
+def datasets(timestamps: np.ndarray, tags: int) -> dict:
+    """
+    Returns the values per tag of differently compressible datasets: smooth sine waves with 3 decimals like the series
+    of connectors.PIWebAPIStandIn, noisy random walks with 2 decimals and random walks stored as float32 by PI, i.e.
+    doubles with many digits.
+    """
+    rng = np.random.default_rng(0)
+    walks = [1000 + np.cumsum(rng.normal(0, 0.2, len(timestamps))) for _ in range(tags)]
+    return {
+        'smooth 3 decimals': [np.round(1000 + tag + 100 * np.sin(timestamps / 3.6e12 + tag), 3) for tag in range(tags)],
+        'noisy 2 decimals': [np.round(walk + rng.normal(0, 0.5, len(timestamps)), 2) for walk in walks],
+        'float32 sensor': [walk.astype('float32').astype('float64') for walk in walks],
+    }
+
+
+def measure(timestamps: np.ndarray, values: list, compression: str, hot_tail_hours: float, repeat: int) -> dict:
+    store = TimeSeriesStore(compression=compression)
+    for tag, tag_values in enumerate(values):
+        store.insert(f'TAG_{tag}', timestamps, tag_values)
+    started = time.perf_counter()
+    store.compress_before(int(timestamps[-1]) - int(hot_tail_hours * 3.6e12))
+    compress_seconds = time.perf_counter() - started
+
+    read_seconds = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for tag in range(len(values)):
+            store.range(f'TAG_{tag}', timestamps[0], timestamps[-1])
+        read_seconds.append(time.perf_counter() - started)
+    return {
+        'bytes': store.nbytes(),
+        'compress_seconds': compress_seconds,
+        'points_per_second': store.size() / min(read_seconds),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tags', type=int, default=22)
+    parser.add_argument('--days', type=float, default=5)
+    parser.add_argument('--interval-seconds', type=int, default=60)
+    parser.add_argument('--hot-tail-hours', type=float, default=2)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    points = int(args.days * 86400 / args.interval_seconds)
+    timestamps = 1_700_000_000_000_000_000 + np.arange(points, dtype='int64') * args.interval_seconds * 1_000_000_000
+    print(f'dataset: {args.tags} tags x {points} points, hot tail of {args.hot_tail_hours:g} hours stays uncompressed')
+    print(f'{"values":>18} {"encoding":>10} {"MiB":>8} {"ratio":>7} {"compress s":>11} {"read Mpoints/s":>15}')
+    for name, values in datasets(timestamps, args.tags).items():
+        plain = measure(timestamps, values, None, args.hot_tail_hours, args.repeat)
+        for compression in (None, 'lossless', 'float32'):
+            result = plain if compression is None else measure(timestamps, values, compression, args.hot_tail_hours, args.repeat)
+            print(f'{name:>18} {compression or "none":>10} {result["bytes"] / 2**20:>8.2f} {plain["bytes"] / result["bytes"]:>7.1f} '
+                  f'{result["compress_seconds"]:>11.3f} {result["points_per_second"] / 1e6:>15.2f}')
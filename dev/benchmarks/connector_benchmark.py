@@ -0,0 +1,166 @@
+# Benchmark suite of the OSIPIConnector against the local connectors.PIWebAPIStandIn, no PI server is required.
+# Measures cold fetch, warm cache hit, incremental tail poll, parse throughput and peak memory and writes the results as
+# JSON, so runs of different releases can be compared.
+# Run from the repository root: python dev/benchmarks/connector_benchmark.py [--days 5] [--output results.json]
+
+# Library imports
+import os
+import sys
+import gc
+import json
+import time
+import platform
+import argparse
+import subprocess
+import statistics
+import tracemalloc
+import pytz
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src', 'aurubis_advisory_model'))
+
+# Module imports
+from parse_benchmark import synthetic_response, parse_vectorized
+from memory_benchmark import decode_streaming
+from connectors.OSIPIConnector import OSIPIConnector
+from connectors.PIWebAPIStandIn import PIWebAPIStandIn
+
+# Configuration imports
+from config import (
+    TIMEZONE,
+    OSI_PI_PARAMETERS_REQUESTED,
+)
+
+timezone = pytz.timezone(TIMEZONE)
+
+
+def new_connector(stand_in: PIWebAPIStandIn) -> OSIPIConnector:
+    # Neither the tile cache nor the shared segment, every run starts from an empty cache
+    return OSIPIConnector(stand_in.base_url, 'user', 'password', tile_cache_directory='', shared_segment_directory='')
+
+
+def traffic(connector: OSIPIConnector, stand_in: PIWebAPIStandIn, function, *args, **kwargs) -> dict:
+    """
+    Calls function and returns its duration with the requests, points and bytes transferred meanwhile.
+    """
+    requests_before, points_before = stand_in.stats['requests'], stand_in.stats['points_served']
+    bytes_before = connector.get_request_stats()['bytes_received']
+    started = time.perf_counter()
+    function(*args, **kwargs)
+    seconds = time.perf_counter() - started
+    return {
+        'seconds': seconds,
+        'requests': stand_in.stats['requests'] - requests_before,
+        'points': stand_in.stats['points_served'] - points_before,
+        'bytes_received': connector.get_request_stats()['bytes_received'] - bytes_before,
+    }
+
+
+def benchmark_cold_fetch(stand_in: PIWebAPIStandIn, start_time: datetime, end_time: datetime) -> dict:
+    connector = new_connector(stand_in)
+    result = traffic(connector, stand_in, connector.get_data, start_time, end_time)
+    result['points_per_second'] = result['points'] / result['seconds']
+    connector.close()
+    return result
+
+
+def benchmark_warm_cache_hit(stand_in: PIWebAPIStandIn, start_time: datetime, end_time: datetime, repeat: int) -> dict:
+    connector = new_connector(stand_in)
+    connector.get_data(start_time, end_time)
+    durations, requests_before = [], stand_in.stats['requests']
+    for _ in range(repeat):
+        started = time.perf_counter()
+        df = connector.get_data(start_time, end_time)
+        durations.append(time.perf_counter() - started)
+    connector.close()
+    return {
+        'median_seconds': statistics.median(durations),
+        'min_seconds': min(durations),
+        'rows': len(df),
+        'requests': stand_in.stats['requests'] - requests_before,
+    }
+
+
+def benchmark_tail_poll(stand_in: PIWebAPIStandIn, start_time: datetime, tail_minutes: int) -> dict:
+    connector = new_connector(stand_in)
+    connector.get_data(start_time, datetime.now(timezone) - timedelta(minutes=tail_minutes))
+    result = traffic(connector, stand_in, connector.update_tail)
+    connector.close()
+    return result
+
+
+def benchmark_parse_throughput(points: int, repeat: int) -> dict:
+    response_object = synthetic_response(points)
+    body = json.dumps(response_object).encode('utf-8')
+    results = {}
+    for name, function, argument in (('vectorized', parse_vectorized, response_object), ('streaming', decode_streaming, body)):
+        seconds = min(_duration(function, argument) for _ in range(repeat))
+        results[name] = {'seconds': seconds, 'points_per_second': points / seconds}
+    return results
+
+
+def _duration(function, argument) -> float:
+    started = time.perf_counter()
+    function(argument)
+    return time.perf_counter() - started
+
+
+def benchmark_peak_memory(stand_in: PIWebAPIStandIn, start_time: datetime, end_time: datetime) -> dict:
+    """
+    Returns the peak of the traced allocations of a cold fetch per decoding mode.
+    """
+    results = {}
+    for mode, streaming in (('json', False), ('streaming', True)):
+        connector = new_connector(stand_in)
+        gc.collect()
+        tracemalloc.start()
+        connector.get_data(start_time, end_time, streaming=streaming)
+        results[mode] = {'peak_mib': tracemalloc.get_traced_memory()[1] / 2**20, 'cached_points': connector.store.size()}
+        tracemalloc.stop()
+        connector.close()
+    return results
+
+
+def metadata(args: argparse.Namespace) -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'timestamp': datetime.now(timezone).isoformat(),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parameters': vars(args),
+        'tags': len(OSI_PI_PARAMETERS_REQUESTED),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--days', type=float, default=5, help='length of the fetched range')
+    parser.add_argument('--interval-seconds', type=int, default=60, help='time between two recorded values of the stand-in')
+    parser.add_argument('--latency', type=float, default=0.02, help='latency of the stand-in per request in seconds')
+    parser.add_argument('--tail-minutes', type=int, default=15)
+    parser.add_argument('--parse-points', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='file the JSON results are written to, stdout if not provided')
+    args = parser.parse_args()
+
+    with PIWebAPIStandIn(interval_seconds=args.interval_seconds, latency_seconds=args.latency) as stand_in:
+        end_time = datetime.now(timezone).replace(microsecond=0) - timedelta(hours=1)
+        start_time = end_time - timedelta(days=args.days)
+        results = {
+            'cold_fetch': benchmark_cold_fetch(stand_in, start_time, end_time),
+            'warm_cache_hit': benchmark_warm_cache_hit(stand_in, start_time, end_time, args.repeat),
+            'incremental_tail_poll': benchmark_tail_poll(stand_in, end_time, args.tail_minutes),
+            'parse_throughput': benchmark_parse_throughput(args.parse_points, args.repeat),
+            'peak_memory': benchmark_peak_memory(stand_in, start_time, end_time),
+        }
+
+    report = json.dumps({'metadata': metadata(args), 'results': results}, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(report + '\n')
+    else:
+        print(report)
@@ -0,0 +1,62 @@
+# Peak memory benchmark of decoding a large streamsets/recorded response.
+# Compares decoding the complete JSON tree, like response.json(), with the incremental connectors.StreamingDecoder.
+# Run from the repository root: python dev/benchmarks/memory_benchmark.py [--points 1000000]
+
+# Library imports
+import os
+import sys
+import gc
+import json
+import time
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src', 'aurubis_advisory_model'))
+
+# Module imports
+from parse_benchmark import synthetic_response
+from connectors.StreamParsing import parse_stream_items
+from connectors.StreamingDecoder import StreamingDecoder
+
+CHUNK_SIZE = 64 * 1024
+
+
+def decode_json_tree(body: bytes) -> dict:
+    response_object = json.loads(body)
+    return {item.get('Name'): parse_stream_items(item.get('Items', []))[:2] for item in response_object.get('Items', [])}
+
+
+def decode_streaming(body: bytes) -> dict:
+    return StreamingDecoder(initial_capacity=10000).decode(body[i:i + CHUNK_SIZE] for i in range(0, len(body), CHUNK_SIZE))
+
+
+def measure(function, body: bytes) -> tuple:
+    """
+    Returns the peak of the traced allocations during the call, the duration and the result.
+    """
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    streams = function(body)
+    duration = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak, duration, streams
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--points', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    body = json.dumps(synthetic_response(args.points)).encode('utf-8')
+    json_peak, json_seconds, json_streams = measure(decode_json_tree, body)
+    json_streams = None
+    streaming_peak, streaming_seconds, streams = measure(decode_streaming, body)
+
+    output_bytes = sum(timestamps.nbytes + values.nbytes for timestamps, values in streams.values())
+    print(f'response body:        {len(body) / 2**20:8.1f} MiB')
+    print(f'output arrays:        {output_bytes / 2**20:8.1f} MiB')
+    print(f'json tree peak:       {json_peak / 2**20:8.1f} MiB  ({json_seconds:.2f} s)')
+    print(f'streaming peak:       {streaming_peak / 2**20:8.1f} MiB  ({streaming_seconds:.2f} s)')
+    print(f'peak reduction:       {json_peak / streaming_peak:8.1f} x')
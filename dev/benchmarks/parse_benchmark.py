@@ -0,0 +1,85 @@
+# Microbenchmark of the parsing of streamsets/recorded responses into a Pandas DataFrame.
+# Compares the original per-point dict-of-dicts parsing with the vectorized columnar parsing of connectors.StreamParsing.
+# Run from the repository root: python dev/benchmarks/parse_benchmark.py [--points 1000000]
+
+# Library imports
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src', 'aurubis_advisory_model'))
+
+# Module imports
+from connectors.StreamParsing import parse_stream_items, merge_stream_arrays, frame_from_arrays
+
+# Configuration imports
+from config import (
+    TIMEZONE,
+    OSI_PI_PARAMETERS_REQUESTED,
+)
+
+
+def synthetic_response(points: int, digital_state_every: int = 5000) -> dict:
+    """
+    Build a streamsets/recorded response with points values spread over all tags, one value per second.
+    Every digital_state_every-th value is a digital state instead of a number.
+    """
+    points_per_tag = points // len(OSI_PI_PARAMETERS_REQUESTED)
+    start = pd.Timestamp('2023-10-01T06:00:00Z')
+    timestamps = pd.date_range(start, periods=points_per_tag, freq='1s').strftime('%Y-%m-%dT%H:%M:%SZ').tolist()
+    rng = np.random.default_rng(0)
+    items = []
+    for object_name in OSI_PI_PARAMETERS_REQUESTED:
+        values = rng.normal(1000, 50, points_per_tag).round(3).tolist()
+        for i in range(0, points_per_tag, digital_state_every):
+            values[i] = {'Name': 'Shutdown', 'Value': 254, 'IsSystem': True}
+        items.append({'Name': object_name, 'Items': [{'Timestamp': timestamp, 'Value': value} for timestamp, value in zip(timestamps, values)]})
+    return {'Items': items}
+
+
+def parse_per_point(response_object: dict) -> pd.DataFrame:
+    """
+    The original parsing, one pd.Timestamp per point and a dict-of-dicts DataFrame construction.
+    """
+    response_dict = {item.get('Name', None): {pd.Timestamp(entry.get('Timestamp',None)) : entry.get('Value',None) for entry in item.get('Items', [])} for item in response_object.get('Items', [])}
+    df_request = pd.DataFrame(response_dict)
+    df_request.index = pd.to_datetime(df_request.index, utc=True)
+    df_request.index = df_request.index.tz_convert(TIMEZONE)
+    return df_request
+
+
+def parse_vectorized(response_object: dict) -> pd.DataFrame:
+    arrays = {}
+    for item in response_object.get('Items', []):
+        timestamps, values, mask = parse_stream_items(item.get('Items', []))
+        arrays[item.get('Name')] = merge_stream_arrays([(timestamps, values)])
+    return frame_from_arrays(arrays)
+
+
+def measure(function, response_object: dict, repeat: int) -> tuple:
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        df = function(response_object)
+        durations.append(time.perf_counter() - started)
+    return min(durations), df
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--points', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    response_object = synthetic_response(args.points)
+    before_seconds, df_before = measure(parse_per_point, response_object, args.repeat)
+    after_seconds, df_after = measure(parse_vectorized, response_object, args.repeat)
+
+    assert df_before.index.equals(df_after.index)
+    print(f'points: {df_after.count().sum() + df_after.isna().sum().sum():,}')
+    print(f'per-point parsing:  {before_seconds:8.3f} s  ({args.points / before_seconds:12,.0f} points/s)')
+    print(f'vectorized parsing: {after_seconds:8.3f} s  ({args.points / after_seconds:12,.0f} points/s)')
+    print(f'speed-up:           {before_seconds / after_seconds:8.1f} x')
@@ -0,0 +1,96 @@
+# Memory benchmark of N worker processes reading the same cached dataset (Linux only, reads /proc/self/smaps_rollup).
+# Compares a private copy of the data per worker with the memory-mapped connectors.SharedSegment.
+# Run from the repository root: python dev/benchmarks/shared_segment_benchmark.py [--tags 22] [--days 5] [--workers 1 2 4 8]
+
+# Library imports
+import os
+import sys
+import argparse
+import tempfile
+import multiprocessing
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src', 'aurubis_advisory_model'))
+
+# Module imports
+from connectors.CacheSnapshot import CacheSnapshot
+from connectors.IntervalSet import IntervalSet
+from connectors.SharedSegment import SharedSegment
+from connectors.TimeSeriesStore import TimeSeriesStore
+
+
+def private_and_shared_bytes() -> tuple:
+    """
+    Returns the private and the shared resident memory of the calling process.
+    """
+    sizes = {}
+    with open('/proc/self/smaps_rollup') as smaps:
+        for line in smaps:
+            key, _, value = line.partition(':')
+            if value.strip().endswith('kB'):
+                sizes[key] = int(value.split()[0]) * 1024
+    return sizes['Private_Clean'] + sizes['Private_Dirty'], sizes['Shared_Clean'] + sizes['Shared_Dirty']
+
+
+def read_all(snapshot: CacheSnapshot) -> float:
+    # Touches every page of every array
+    return sum(float(snapshot.store.range(object_name, 0, 2**62)[1].sum()) for object_name in snapshot.coverage)
+
+
+def worker(directory: str, mode: str, start_barrier, done_barrier, results):
+    private_before, _ = private_and_shared_bytes()
+    snapshot = SharedSegment(directory).read()
+    if mode == 'private':
+        # Like a per-process cache, every worker holds its own copy of the data
+        store = TimeSeriesStore()
+        for object_name in snapshot.coverage:
+            store.insert(object_name, *(np.array(array) for array in snapshot.store.range(object_name, 0, 2**62)))
+        snapshot = CacheSnapshot(store.snapshot, snapshot.coverage, {})
+    start_barrier.wait()
+    read_all(snapshot)
+    private_after, shared = private_and_shared_bytes()
+    results.put((private_after - private_before, shared))
+    done_barrier.wait()
+
+
+def measure(directory: str, mode: str, workers: int) -> tuple:
+    """
+    Returns the private memory added per worker and the shared memory of one worker, averaged over the workers.
+    """
+    start_barrier, done_barrier = multiprocessing.Barrier(workers), multiprocessing.Barrier(workers + 1)
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=worker, args=(directory, mode, start_barrier, done_barrier, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    measurements = [results.get() for _ in processes]
+    done_barrier.wait()
+    for process in processes:
+        process.join()
+    return tuple(sum(values) / workers for values in zip(*measurements))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tags', type=int, default=22)
+    parser.add_argument('--days', type=float, default=5)
+    parser.add_argument('--interval-seconds', type=int, default=10)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir='/dev/shm' if os.path.isdir('/dev/shm') else None) as directory:
+        points = int(args.days * 86400 / args.interval_seconds)
+        timestamps = 1_700_000_000_000_000_000 + np.arange(points, dtype='int64') * args.interval_seconds * 1_000_000_000
+        store = TimeSeriesStore()
+        coverage = {}
+        for tag in range(args.tags):
+            store.insert(f'TAG_{tag}', timestamps, np.random.default_rng(tag).normal(1000, 50, points))
+            coverage[f'TAG_{tag}'] = IntervalSet([(int(timestamps[0]), int(timestamps[-1]))])
+        # The benchmark keeps the coverage in nanoseconds, SharedSegment stores any pd.Timestamp compatible bounds
+        SharedSegment(directory, writer=True).write(CacheSnapshot(store.snapshot, coverage, {}, version=1))
+        print(f'dataset:              {args.tags} tags x {points} points = {store.size() * 16 / 2**20:.1f} MiB')
+
+        print(f'{"workers":>8} {"private copy MiB/worker":>24} {"shared segment MiB/worker":>26} {"segment pages shared MiB":>25}')
+        for workers in args.workers:
+            private_copy, _ = measure(directory, 'private', workers)
+            private_segment, shared = measure(directory, 'segment', workers)
+            print(f'{workers:>8} {private_copy / 2**20:>24.1f} {private_segment / 2**20:>26.1f} {shared / 2**20:>25.1f}')
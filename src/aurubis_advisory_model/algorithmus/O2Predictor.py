@@ -0,0 +1,141 @@
+# This file contains the O2Predictor class which predicts when the Celox O2 of the running charge reaches its set point.
+
+# Library imports
+import threading
+import pytz
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+
+# Module imports
+from algorithmus.TrajectoryFilter import TrajectoryFilter
+
+# Configuration imports
+from config import (
+    TIMEZONE,
+    CHARGE_START_HOUR,
+    CELOX_O2_SET_POINT,
+    CELOX_O2_PROCESS_NOISE,
+    CELOX_O2_MEASUREMENT_NOISE,
+)
+
+
+class O2Predictor:
+    """
+    Predicts the time at which the Celox O2 of the running charge falls to its set point, for every furnace at once.
+
+    The O2 of every tag is aligned to the start of the charge (hours since charge start, as in the Celox curves of
+    dev/data) and tracked by a TrajectoryFilter. Every update fetches only the data after the last processed timestamp
+    from the connector and feeds the new Celox measurements into the filter, i.e. the samples whose value differs from
+    the previous one, the values in between are held by the OSI PI system. Each measurement costs O(1), so the
+    prediction can be recomputed on every poll. When a new charge starts, the filter is reset.
+
+    Args:
+        connector (OSIPIConnector or LazyConnector): The connector the O2 is read from.
+        tags (list, optional): The Celox O2 tags, one per furnace. Defaults to ['ACTUAL_O2_CELOX'].
+        set_point (float, optional): The O2 the charge has to reach. Defaults to CELOX_O2_SET_POINT.
+        falling (bool, optional): Whether the O2 reaches the set point from above. Defaults to True.
+        process_noise (float, optional): The process noise of the filter. Defaults to CELOX_O2_PROCESS_NOISE.
+        measurement_noise (float, optional): The measurement noise of the filter. Defaults to CELOX_O2_MEASUREMENT_NOISE.
+        charge_start_hour (int, optional): The hour of the day the charges start. Defaults to CHARGE_START_HOUR.
+
+    Methods:
+        update(now: datetime = None, charge_start: datetime = None) -> dict: Feeds the data since the last update into the filter and returns the predictions.
+        predictions() -> dict: Returns the predictions of every tag without fetching data.
+        current_charge_start(now: datetime = None) -> datetime: Returns the start of the charge running at now.
+
+    Attributes:
+        charge_start (datetime): The start of the charge tracked, None before the first update.
+        last_timestamp (pd.Timestamp): The timestamp of the last sample processed, None before the first sample of the charge.
+        filter (TrajectoryFilter): The filter tracking the O2 of every tag.
+    """
+    def __init__(self, connector, tags: list = None, set_point: float = CELOX_O2_SET_POINT, falling: bool = True, process_noise: float = CELOX_O2_PROCESS_NOISE,
+                 measurement_noise: float = CELOX_O2_MEASUREMENT_NOISE, charge_start_hour: int = CHARGE_START_HOUR):
+        self.connector = connector
+        self.tags = list(tags) if tags else ['ACTUAL_O2_CELOX']
+        self.set_point = float(set_point)
+        self.falling = falling
+        self.charge_start_hour = int(charge_start_hour)
+        self.timezone = pytz.timezone(TIMEZONE)
+        self.filter = TrajectoryFilter(len(self.tags), process_noise=process_noise, measurement_noise=measurement_noise)
+        self.charge_start = None
+        self.last_timestamp = None
+        self._last_values = np.full(len(self.tags), np.nan)
+        self._lock = threading.Lock()
+
+    def current_charge_start(self, now: datetime = None) -> datetime:
+        """
+        Returns the start of the charge running at now, today at charge_start_hour once it has passed, otherwise
+        yesterday at charge_start_hour.
+        """
+        now = (now or datetime.now(self.timezone)).astimezone(self.timezone)
+        day = now.date() if now.hour >= self.charge_start_hour else now.date() - timedelta(days=1)
+        return self.timezone.localize(datetime(day.year, day.month, day.day, self.charge_start_hour))
+
+    def update(self, now: datetime = None, charge_start: datetime = None) -> dict:
+        """
+        Fetches the O2 of the tags after the last processed sample until now, feeds its measurements into the filter
+        and returns the predictions. A charge_start other than the one tracked starts a new charge.
+        """
+        now = now or datetime.now(self.timezone)
+        charge_start = charge_start or self.current_charge_start(now)
+        with self._lock:
+            if charge_start != self.charge_start:
+                self.filter.reset()
+                self.charge_start = charge_start
+                self.last_timestamp = None
+                self._last_values = np.full(len(self.tags), np.nan)
+
+            start_time = self.charge_start if self.last_timestamp is None else self.last_timestamp.to_pydatetime()
+            if start_time < now:
+                df = self.connector.get_data(start_time, now, tags=self.tags)
+                if self.last_timestamp is not None:
+                    df = df[df.index > self.last_timestamp]
+                if len(df):
+                    self._process(df)
+            return self._predictions()
+
+    def predictions(self) -> dict:
+        with self._lock:
+            return self._predictions()
+
+    def _process(self, df: pd.DataFrame):
+        """
+        Feeds the samples of df which are Celox measurements into the filter, i.e. whose value differs from the
+        previous sample of their tag. Must be called holding the lock.
+        """
+        values = df.reindex(columns=self.tags).to_numpy(dtype='float64')
+        held = pd.DataFrame(np.vstack([self._last_values, values])).ffill().to_numpy()
+        measured = ~np.isnan(values) & (values != held[:-1])
+        rows = measured.any(axis=1)
+        hours = (df.index - pd.Timestamp(self.charge_start)) / pd.Timedelta(hours=1)
+        self.filter.fit(np.asarray(hours)[rows], np.where(measured, values, np.nan)[rows])
+        self._last_values = held[-1].copy()
+        self.last_timestamp = df.index[-1]
+
+    def _predictions(self) -> dict:
+        """
+        Returns per tag the current O2 level and slope per hour with their standard deviations, the predicted time the
+        set point is reached (None if the O2 does not approach it) and its standard deviation in minutes.
+        Must be called holding the lock.
+        """
+        level, level_std, slope, slope_std = self.filter.state()
+        crossing_hours, crossing_std = self.filter.crossing(self.set_point, falling=self.falling)
+        charge_start = None if self.charge_start is None else pd.Timestamp(self.charge_start)
+
+        def optional(value):
+            return None if np.isnan(value) else float(value)
+
+        predictions = {}
+        for index, tag in enumerate(self.tags):
+            predictions[tag] = {
+                'level': optional(level[index]),
+                'level_std': optional(level_std[index]),
+                'slope_per_hour': optional(slope[index]),
+                'slope_std': optional(slope_std[index]),
+                'set_point': self.set_point,
+                'crossing_time': None if np.isnan(crossing_hours[index]) else charge_start + pd.Timedelta(hours=crossing_hours[index]),
+                'crossing_std_minutes': optional(crossing_std[index] * 60),
+                'measurements': int(self.filter.measurements[index]),
+            }
+        return predictions
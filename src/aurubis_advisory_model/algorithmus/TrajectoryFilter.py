@@ -0,0 +1,164 @@
+# This file contains the TrajectoryFilter class, an incrementally updated model of the O2 curves of running charges.
+
+# Library imports
+import numpy as np
+
+# Configuration imports
+from config import (
+    CELOX_O2_PROCESS_NOISE,
+    CELOX_O2_MEASUREMENT_NOISE,
+)
+
+# Prior standard deviation of the slope of a series before its second measurement, in units per hour
+INITIAL_SLOPE_STD = 10000.0
+
+
+class TrajectoryFilter:
+    """
+    A Kalman filter tracking the level and slope of several time series at once, e.g. the Celox O2 of every furnace
+    over the hours since the start of its charge.
+
+    Every series follows a local linear trend: between two measurements the level moves with the slope and the slope
+    changes by white noise of process_noise per hour (continuous white noise acceleration model). A measurement updates
+    level and slope of its series in O(1), no past points are kept or refitted. All series are stored as arrays and
+    updated in one vectorized step, series without a new measurement (NaN) only keep their state.
+
+    The time at which a series crosses a target is extrapolated from its current trend. Its uncertainty is the
+    standard deviation of the extrapolated level at that time, from the covariance of level and slope and the process
+    noise until then, divided by the slope (delta method).
+
+    Args:
+        series_count (int, optional): The number of series tracked. Defaults to 1.
+        process_noise (float, optional): The standard deviation of the change of the slope per hour. Defaults to CELOX_O2_PROCESS_NOISE.
+        measurement_noise (float, optional): The standard deviation of a measurement. Defaults to CELOX_O2_MEASUREMENT_NOISE.
+
+    Methods:
+        update(hours: np.ndarray, values: np.ndarray): Updates every series with a measurement at hours (NaN: no measurement).
+        fit(hours: np.ndarray, values: np.ndarray) -> TrajectoryFilter: Updates the series with rows of measurements, e.g. a charge so far.
+        state(hours: np.ndarray = None) -> tuple: Returns level, slope and their standard deviations, extrapolated to hours if given.
+        crossing(target: float, falling: bool = True) -> tuple: Returns the hours at which the series fall (or rise) to target and their standard deviations.
+        reset(mask: np.ndarray = None): Forgets the series selected by mask (default: all), e.g. when a new charge starts.
+
+    Attributes:
+        hours (np.ndarray): The time of the last measurement of every series, NaN before the first one.
+        level (np.ndarray): The estimated value of every series at its last measurement.
+        slope (np.ndarray): The estimated change of every series per hour.
+        covariance (np.ndarray): The covariance of level and slope of every series, shape (series_count, 2, 2).
+        measurements (np.ndarray): The number of measurements of every series.
+    """
+    def __init__(self, series_count: int = 1, process_noise: float = CELOX_O2_PROCESS_NOISE, measurement_noise: float = CELOX_O2_MEASUREMENT_NOISE):
+        if series_count <= 0:
+            raise ValueError("series_count must be positive")
+        if process_noise < 0 or measurement_noise <= 0:
+            raise ValueError("process_noise must not be negative and measurement_noise must be positive")
+        self.series_count = series_count
+        self.process_variance = float(process_noise) ** 2
+        self.measurement_variance = float(measurement_noise) ** 2
+        self.hours = np.full(series_count, np.nan)
+        self.level = np.zeros(series_count)
+        self.slope = np.zeros(series_count)
+        self.covariance = np.zeros((series_count, 2, 2))
+        self.measurements = np.zeros(series_count, dtype='int64')
+
+    def reset(self, mask: np.ndarray = None):
+        mask = np.ones(self.series_count, dtype=bool) if mask is None else np.asarray(mask, dtype=bool)
+        self.hours[mask] = np.nan
+        self.level[mask] = 0
+        self.slope[mask] = 0
+        self.covariance[mask] = 0
+        self.measurements[mask] = 0
+
+    def update(self, hours, values):
+        """
+        Updates every series with a measurement of value at hours, scalars apply to all series. NaN values are skipped,
+        measurements older than the last one of their series raise a ValueError.
+        """
+        hours = np.broadcast_to(np.asarray(hours, dtype='float64'), (self.series_count,))
+        values = np.broadcast_to(np.asarray(values, dtype='float64'), (self.series_count,))
+        measured = ~np.isnan(values) & ~np.isnan(hours)
+        if np.any(measured & (hours < self.hours)):
+            raise ValueError("Measurements must be in chronological order")
+
+        # The first measurement of a series sets its level, the slope is unknown yet
+        first = measured & (self.measurements == 0)
+        self.level[first] = values[first]
+        self.slope[first] = 0
+        self.covariance[first] = [[self.measurement_variance, 0], [0, INITIAL_SLOPE_STD ** 2]]
+
+        update = measured & ~first
+        if update.any():
+            dt = hours[update] - self.hours[update]
+            level, slope, covariance = self.level[update], self.slope[update], self.covariance[update]
+
+            # Predict level and slope at the time of the measurement
+            level = level + slope * dt
+            p00 = covariance[:, 0, 0] + 2 * dt * covariance[:, 0, 1] + dt ** 2 * covariance[:, 1, 1] + self.process_variance * dt ** 3 / 3
+            p01 = covariance[:, 0, 1] + dt * covariance[:, 1, 1] + self.process_variance * dt ** 2 / 2
+            p11 = covariance[:, 1, 1] + self.process_variance * dt
+
+            # Correct them with the measurement
+            innovation = values[update] - level
+            innovation_variance = p00 + self.measurement_variance
+            gain_level, gain_slope = p00 / innovation_variance, p01 / innovation_variance
+            self.level[update] = level + gain_level * innovation
+            self.slope[update] = slope + gain_slope * innovation
+            self.covariance[update] = np.stack([
+                np.stack([(1 - gain_level) * p00, (1 - gain_level) * p01], axis=-1),
+                np.stack([(1 - gain_level) * p01, p11 - gain_slope * p01], axis=-1),
+            ], axis=-2)
+
+        self.hours[measured] = hours[measured]
+        self.measurements[measured] += 1
+
+    def fit(self, hours, values):
+        """
+        Updates the series with the rows of values, shape (len(hours), series_count) or (len(hours),) for all series,
+        measured at hours. Every row costs one vectorized update, so a charge is processed in O(len(hours)).
+        """
+        hours = np.asarray(hours, dtype='float64')
+        values = np.asarray(values, dtype='float64').reshape(len(hours), -1)
+        for row_hours, row_values in zip(hours, values):
+            self.update(row_hours, row_values)
+        return self
+
+    def state(self, hours=None) -> tuple:
+        """
+        Returns (level, level_std, slope, slope_std) of every series, extrapolated from its last measurement to hours
+        if given. Series without measurement are NaN, the slope of a series with a single measurement is unknown (NaN).
+        """
+        dt = np.zeros(self.series_count) if hours is None else np.broadcast_to(np.asarray(hours, dtype='float64'), (self.series_count,)) - self.hours
+        level = self.level + self.slope * dt
+        level_variance = self._level_variance(dt)
+        slope_variance = self.covariance[:, 1, 1] + self.process_variance * np.abs(dt)
+        unmeasured, single = self.measurements == 0, self.measurements == 1
+        level[unmeasured], level_variance[unmeasured] = np.nan, np.nan
+        slope, slope_variance = self.slope.copy(), slope_variance.copy()
+        slope[unmeasured | single], slope_variance[unmeasured | single] = np.nan, np.nan
+        return level, np.sqrt(level_variance), slope, np.sqrt(slope_variance)
+
+    def crossing(self, target: float, falling: bool = True) -> tuple:
+        """
+        Returns (hours, hours_std) at which every series falls (rising with falling=False) to target following its
+        current trend. Series already at or beyond target are at the time of their last measurement, series not
+        approaching target or with fewer than two measurements are NaN.
+        """
+        hours, hours_std = np.full(self.series_count, np.nan), np.full(self.series_count, np.nan)
+        sign = -1 if falling else 1
+        trended = self.measurements >= 2
+        reached = trended & (sign * (self.level - target) >= 0)
+        approaching = trended & ~reached & (sign * self.slope > 0)
+
+        dt = np.zeros(self.series_count)
+        dt[approaching] = (target - self.level[approaching]) / self.slope[approaching]
+        predicted = reached | approaching
+        hours[predicted] = self.hours[predicted] + dt[predicted]
+        hours_std[approaching] = np.sqrt(self._level_variance(dt)[approaching]) / np.abs(self.slope[approaching])
+        hours_std[reached] = 0
+        return hours, hours_std
+
+    def _level_variance(self, dt: np.ndarray) -> np.ndarray:
+        """
+        Returns the variance of the level extrapolated dt hours from the last measurement of every series.
+        """
+        covariance = self.covariance
+        return covariance[:, 0, 0] + 2 * dt * covariance[:, 0, 1] + dt ** 2 * covariance[:, 1, 1] + self.process_variance * np.abs(dt) ** 3 / 3
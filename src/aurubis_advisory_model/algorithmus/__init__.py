@@ -6,8 +6,11 @@
 
 # Module imports
 from connectors import instantiated_osipiconnector # Use this instantiated connector to retrieve data
+from algorithmus.TrajectoryFilter import TrajectoryFilter
+from algorithmus.O2Predictor import O2Predictor
 
 # Configuration imports
-from config import (
-    OSI_PI_PARAMETERS_HANDLING, # Should you need more parameters that potentially are parameters, please put them in the config.py file and import from there.
-)
\ No newline at end of file
+# Should you need more parameters that potentially are parameters, please put them in the config.py file and import from there.
+
+# The prediction of the time the Celox O2 of the running charge reaches its set point, call update() on every poll
+o2_predictor = O2Predictor(instantiated_osipiconnector)
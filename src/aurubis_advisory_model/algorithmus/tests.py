@@ -0,0 +1,126 @@
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytz
+from django.test import SimpleTestCase
+
+from algorithmus.O2Predictor import O2Predictor
+from algorithmus.TrajectoryFilter import TrajectoryFilter
+from config import TIMEZONE
+
+timezone = pytz.timezone(TIMEZONE)
+
+CELOX_CURVE = os.path.join(os.path.dirname(__file__), '..', '..', '..', 'dev', 'data', 'Celox ppm O2 [ppm].csv')
+
+
+def celox_curve() -> pd.Series:
+    """
+    Returns the mean Celox O2 curve of dev/data indexed by the hours since charge start.
+    """
+    df = pd.read_csv(CELOX_CURVE, sep=';', index_col=0).dropna()
+    return df.iloc[:, 0]
+
+
+class CurveConnector:
+    """
+    Connector serving the Celox curve of dev/data for a charge start and recording the requested ranges.
+    """
+    def __init__(self, charge_start, tags):
+        curve = celox_curve()
+        index = pd.DatetimeIndex([charge_start + timedelta(hours=hours) for hours in curve.index])
+        self.df = pd.DataFrame({tag: curve.to_numpy() for tag in tags}, index=index)
+        self.requested_ranges = []
+
+    def get_data(self, start_time, end_time, tags=None):
+        self.requested_ranges.append((start_time, end_time))
+        return self.df.loc[start_time:end_time, tags]
+
+
+class TrajectoryFilterTest(SimpleTestCase):
+    def test_linear_ramps_are_tracked_per_series(self):
+        trajectory_filter = TrajectoryFilter(series_count=3, process_noise=10, measurement_noise=5)
+        hours = np.arange(0, 4, 1 / 60)
+        rng = np.random.default_rng(0)
+        values = np.column_stack([5000 - 1000 * hours, 1000 + 500 * hours, 5000 - 1000 * hours]) + rng.normal(0, 5, (len(hours), 3))
+        # The third series is measured every other minute only
+        values[1::2, 2] = np.nan
+        trajectory_filter.fit(hours, values)
+
+        level, level_std, slope, slope_std = trajectory_filter.state()
+        np.testing.assert_allclose(slope, [-1000, 500, -1000], rtol=0.02)
+        np.testing.assert_array_equal(trajectory_filter.measurements, [240, 240, 120])
+        self.assertTrue(np.all(level_std < 10))
+
+        crossing, crossing_std = trajectory_filter.crossing(500)
+        np.testing.assert_allclose(crossing[[0, 2]], 4.5, atol=0.02)
+        self.assertTrue(np.all(crossing_std[[0, 2]] < 0.05))
+        # The rising series never falls to 500 but has reached 2500 on its way up
+        self.assertTrue(np.isnan(crossing[1]))
+        self.assertEqual(trajectory_filter.crossing(2500, falling=False)[0][1], trajectory_filter.hours[1])
+        with self.assertRaises(ValueError):
+            trajectory_filter.update(1, [0, 0, 0])
+
+    def test_falling_celox_curve_is_predicted(self):
+        curve = celox_curve()
+        trajectory_filter = TrajectoryFilter()
+        rising = curve[curve.index <= 15]
+        trajectory_filter.fit(rising.index, rising.to_numpy())
+
+        # 15 h after charge start the O2 falls towards 2000 ppm, which it reaches 17.9 h after charge start
+        crossing, crossing_std = trajectory_filter.crossing(2000)
+        actual = curve.index[(curve.index > 12) & (curve.to_numpy() <= 2000)][0]
+        self.assertAlmostEqual(crossing[0], actual, delta=1)
+        self.assertTrue(0 < crossing_std[0] < 1)
+
+        trajectory_filter.reset()
+        self.assertTrue(np.isnan(trajectory_filter.state()[0][0]))
+
+
+class O2PredictorTest(SimpleTestCase):
+    def test_every_update_feeds_only_the_new_measurements(self):
+        charge_start = timezone.localize(datetime(2024, 1, 9, 6))
+        tags = ['ACTUAL_O2_CELOX', 'ACTUAL_O2_CELOX_2']
+        connector = CurveConnector(charge_start, tags)
+        predictor = O2Predictor(connector, tags=tags, set_point=2000)
+
+        # While the O2 still rises there is no crossing
+        predictions = predictor.update(now=charge_start + timedelta(hours=12), charge_start=charge_start)
+        self.assertIsNone(predictions['ACTUAL_O2_CELOX']['crossing_time'])
+        first_measurements = predictions['ACTUAL_O2_CELOX']['measurements']
+
+        predictions = predictor.update(now=charge_start + timedelta(hours=15), charge_start=charge_start)
+        self.assertEqual(connector.requested_ranges[1][0], charge_start + timedelta(hours=12))
+        self.assertGreater(predictions['ACTUAL_O2_CELOX']['measurements'], first_measurements)
+        self.assertEqual(predictions['ACTUAL_O2_CELOX'], predictions['ACTUAL_O2_CELOX_2'])
+        crossing_time = predictions['ACTUAL_O2_CELOX']['crossing_time']
+        self.assertLess(abs(crossing_time - (charge_start + timedelta(hours=17.9))), timedelta(hours=1))
+        self.assertLess(predictions['ACTUAL_O2_CELOX']['crossing_std_minutes'], 60)
+
+        # The same prediction results from fitting the whole charge at once
+        refitted = O2Predictor(CurveConnector(charge_start, tags), tags=tags, set_point=2000)
+        self.assertEqual(refitted.update(now=charge_start + timedelta(hours=15), charge_start=charge_start), predictions)
+
+        # Held values are not measurements, the baseline after the fall holds less than one per minute
+        predictions = predictor.update(now=charge_start + timedelta(hours=36), charge_start=charge_start)
+        self.assertLess(predictions['ACTUAL_O2_CELOX']['measurements'] - refitted.predictions()['ACTUAL_O2_CELOX']['measurements'], 21 * 60)
+
+        # A new charge starts over
+        predictions = predictor.update(now=charge_start + timedelta(days=1), charge_start=charge_start + timedelta(days=1))
+        self.assertEqual(predictions['ACTUAL_O2_CELOX']['measurements'], 0)
+
+    def test_charge_start_defaults_to_the_charge_running_at_now(self):
+        charge_start = timezone.localize(datetime(2024, 1, 10, 6))
+        tags = ['ACTUAL_O2_CELOX']
+        connector = CurveConnector(charge_start, tags)
+        # The hour is a str when set from the environment
+        predictor = O2Predictor(connector, tags=tags, set_point=2000, charge_start_hour='6')
+
+        self.assertEqual(predictor.current_charge_start(charge_start), charge_start)
+        self.assertEqual(predictor.current_charge_start(charge_start - timedelta(minutes=1)), charge_start - timedelta(days=1))
+        self.assertEqual(predictor.current_charge_start(charge_start + timedelta(hours=23, minutes=59)), charge_start)
+
+        predictor.update(now=charge_start + timedelta(hours=12))
+        self.assertEqual(predictor.charge_start, charge_start)
+        self.assertEqual(connector.requested_ranges[0][0], charge_start)
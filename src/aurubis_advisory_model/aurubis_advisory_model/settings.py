@@ -49,6 +49,7 @@ INSTALLED_APPS = [
     'user_management',
     'material_handler',
     'dashboard',
+    'connectors',
     # Needed libraries
     'bootstrap4',
     'bootstrapform',
@@ -20,7 +20,16 @@ SECRET_KEY = os.environ.get('SECRET_KEY', base64.urlsafe_b64encode(os.urandom(50
 # Dash Application parameters
 CELOX_O2_DEFAULT_UPPER_THRESHHOLD = os.environ.get('CELOX_O2_DEFAULT_UPPER_THRESHHOLD', 20000)
 CELOX_O2_DEFAULT_LOWER_THRESHHOLD = os.environ.get('CELOX_O2_DEFAULT_LOWER_THRESHHOLD', 0)
-CHARGE_START_HOUR = os.environ.get('CHARGE_START_HOUR', 6)
+CHARGE_START_HOUR = int(os.environ.get('CHARGE_START_HOUR', 6))
+# Celox O2 prediction, the time the O2 of the running charge falls to the set point is extrapolated from its current trend.
+# The process noise is the change of the trend per hour in ppm/h, the measurement noise the scatter of the Celox in ppm.
+CELOX_O2_SET_POINT = float(os.environ.get('CELOX_O2_SET_POINT', 1000))
+CELOX_O2_PROCESS_NOISE = float(os.environ.get('CELOX_O2_PROCESS_NOISE', 500))
+CELOX_O2_MEASUREMENT_NOISE = float(os.environ.get('CELOX_O2_MEASUREMENT_NOISE', 100))
+# Upper limit of the rows of a graph sent to the browser, shared by all its lines, roughly the pixel width of the graph
+DASHBOARD_MAX_POINTS = int(os.environ.get('DASHBOARD_MAX_POINTS', 1500))
+# Upper limit of the measurements listed in the checklist, the most recent ones are shown
+DASHBOARD_MAX_CHECKLIST_OPTIONS = int(os.environ.get('DASHBOARD_MAX_CHECKLIST_OPTIONS', 100))
 
 # Application configuration
 TIMEZONE = os.environ.get('TIMEZONE', 'Europe/Berlin')
@@ -36,7 +45,84 @@ DEFAULT_ADMIN_PASSWORD = os.environ.get('DEFAULT_ADMIN_PASSWORD', 'AurubisAdmin'
 OSI_PI_BASE_URL = os.environ.get('OSI_PI_BASE_URL', '')
 OSI_PI_USERNAME = os.environ.get('OSI_PI_USERNAME', '')
 OSI_PI_PASSWORD = os.environ.get('OSI_PI_PASSWORD', '')
-CACHE_STORAGE_DURATION_HOURS = os.environ.get('CACHE_STORAGE_DURATION_HOURS', 24*5)
+CACHE_STORAGE_DURATION_HOURS = int(os.environ.get('CACHE_STORAGE_DURATION_HOURS', 24*5))
+# Upper limit of the bytes of cached points per process, cold time buckets are evicted beyond it. 0 disables the limit.
+OSI_PI_CACHE_BYTE_BUDGET = int(os.environ.get('OSI_PI_CACHE_BYTE_BUDGET', 0))
+OSI_PI_CACHE_BUCKET_MINUTES = int(os.environ.get('OSI_PI_CACHE_BUCKET_MINUTES', 60))
+# 'lru' evicts the least recently, 'lfu' the least frequently read buckets first
+OSI_PI_CACHE_EVICTION_POLICY = os.environ.get('OSI_PI_CACHE_EVICTION_POLICY', 'lru')
+# The live tail of this many hours is never evicted
+OSI_PI_CACHE_PINNED_TAIL_HOURS = float(os.environ.get('OSI_PI_CACHE_PINNED_TAIL_HOURS', 24))
+# Encoding of the cold time buckets older than the hot tail, 'lossless' or 'float32'. An empty value keeps all points uncompressed.
+OSI_PI_CACHE_COMPRESSION = os.environ.get('OSI_PI_CACHE_COMPRESSION', '')
+OSI_PI_CACHE_HOT_TAIL_HOURS = float(os.environ.get('OSI_PI_CACHE_HOT_TAIL_HOURS', 2))
+# File the cache is saved to on shutdown and periodically and restored from on startup. An empty value disables it.
+OSI_PI_CACHE_CHECKPOINT_PATH = os.environ.get('OSI_PI_CACHE_CHECKPOINT_PATH', '')
+OSI_PI_CACHE_CHECKPOINT_INTERVAL_SECONDS = float(os.environ.get('OSI_PI_CACHE_CHECKPOINT_INTERVAL_SECONDS', 300))
+OSI_PI_CONNECTION_POOL_SIZE = int(os.environ.get('OSI_PI_CONNECTION_POOL_SIZE', 10))
+OSI_PI_WARM_UP_ON_STARTUP = os.environ.get('OSI_PI_WARM_UP_ON_STARTUP', 'False').lower() in ('1', 'true', 'yes')
+
+# OSI-PI background tail poller, keeps the live window of the cache current in every server process. The background
+# features (warm-up, tail poller, prefetch, checkpoint on shutdown) only run in processes serving requests, not in
+# management commands such as migrate, test or ingest_sensor_readings.
+OSI_PI_TAIL_POLLER_ENABLED = os.environ.get('OSI_PI_TAIL_POLLER_ENABLED', 'False').lower() in ('1', 'true', 'yes')
+OSI_PI_TAIL_POLL_INTERVAL_SECONDS = float(os.environ.get('OSI_PI_TAIL_POLL_INTERVAL_SECONDS', 30))
+OSI_PI_TAIL_POLL_JITTER_SECONDS = float(os.environ.get('OSI_PI_TAIL_POLL_JITTER_SECONDS', 5))
+
+# OSI-PI predictive prefetch, the windows next to the ones viewed on the dashboard (previous/next window, the same window
+# of the previous charge) are fetched into the cache in a background thread, at most OSI_PI_PREFETCH_BUDGET_PER_MINUTE per minute.
+OSI_PI_PREFETCH_ENABLED = os.environ.get('OSI_PI_PREFETCH_ENABLED', 'False').lower() in ('1', 'true', 'yes')
+OSI_PI_PREFETCH_BUDGET_PER_MINUTE = float(os.environ.get('OSI_PI_PREFETCH_BUDGET_PER_MINUTE', 12))
+OSI_PI_PREFETCH_MAX_PENDING = int(os.environ.get('OSI_PI_PREFETCH_MAX_PENDING', 8))
+OSI_PI_PREFETCH_MAX_WINDOW_HOURS = float(os.environ.get('OSI_PI_PREFETCH_MAX_WINDOW_HOURS', 48))
+OSI_PI_PREFETCH_MAX_SESSIONS = int(os.environ.get('OSI_PI_PREFETCH_MAX_SESSIONS', 100))
+
+# OSI-PI request chunking, long ranges are split into windows and tag groups which are requested concurrently.
+# PI Web API caps every stream at maxCount values (server default 1000), truncated streams are paged.
+OSI_PI_REQUEST_WINDOW_HOURS = float(os.environ.get('OSI_PI_REQUEST_WINDOW_HOURS', 12))
+OSI_PI_REQUEST_TAGS_PER_REQUEST = int(os.environ.get('OSI_PI_REQUEST_TAGS_PER_REQUEST', 8))
+OSI_PI_REQUEST_MAX_COUNT = int(os.environ.get('OSI_PI_REQUEST_MAX_COUNT', 10000))
+OSI_PI_REQUEST_WORKERS = int(os.environ.get('OSI_PI_REQUEST_WORKERS', 4))
+
+# OSI-PI request resilience. The read timeout applies between two received bytes, not to the whole response.
+# Failed requests (connection errors, timeouts, 429 and 5xx) are retried with exponential backoff and full jitter.
+# After OSI_PI_CIRCUIT_BREAKER_FAILURES consecutive failures no requests are sent for OSI_PI_CIRCUIT_BREAKER_RESET_SECONDS,
+# reads are served from the cache meanwhile, then a single probe request decides whether PI is healthy again.
+OSI_PI_REQUEST_CONNECT_TIMEOUT_SECONDS = float(os.environ.get('OSI_PI_REQUEST_CONNECT_TIMEOUT_SECONDS', 5))
+OSI_PI_REQUEST_TIMEOUT_SECONDS = float(os.environ.get('OSI_PI_REQUEST_TIMEOUT_SECONDS', 30))
+OSI_PI_REQUEST_RETRIES = int(os.environ.get('OSI_PI_REQUEST_RETRIES', 2))
+OSI_PI_REQUEST_BACKOFF_SECONDS = float(os.environ.get('OSI_PI_REQUEST_BACKOFF_SECONDS', 0.5))
+OSI_PI_REQUEST_BACKOFF_MAX_SECONDS = float(os.environ.get('OSI_PI_REQUEST_BACKOFF_MAX_SECONDS', 8))
+OSI_PI_CIRCUIT_BREAKER_FAILURES = int(os.environ.get('OSI_PI_CIRCUIT_BREAKER_FAILURES', 5))
+OSI_PI_CIRCUIT_BREAKER_RESET_SECONDS = float(os.environ.get('OSI_PI_CIRCUIT_BREAKER_RESET_SECONDS', 30))
+
+# OSI-PI on-disk tile cache shared by all worker processes, an empty directory disables it.
+OSI_PI_TILE_CACHE_DIRECTORY = os.environ.get('OSI_PI_TILE_CACHE_DIRECTORY', '')
+OSI_PI_TILE_CACHE_BUCKET_MINUTES = int(os.environ.get('OSI_PI_TILE_CACHE_BUCKET_MINUTES', 60))
+
+# OSI-PI shared cache segment, one writer process (which should run the tail poller) publishes its cache into memory-mapped
+# files in this directory (e.g. on /dev/shm), all other worker processes serve reads from them. An empty value disables it.
+OSI_PI_SHARED_SEGMENT_DIRECTORY = os.environ.get('OSI_PI_SHARED_SEGMENT_DIRECTORY', '')
+OSI_PI_SHARED_SEGMENT_WRITER = os.environ.get('OSI_PI_SHARED_SEGMENT_WRITER', 'False').lower() in ('1', 'true', 'yes')
+# Readers accept a segment whose data ends at most this many seconds before the end of the requested range.
+OSI_PI_SHARED_SEGMENT_MAX_STALENESS_SECONDS = float(os.environ.get('OSI_PI_SHARED_SEGMENT_MAX_STALENESS_SECONDS', 60))
+# The writer rewrites the whole segment, so it publishes the changes of its cache at most every so many seconds.
+OSI_PI_SHARED_SEGMENT_PUBLISH_INTERVAL_SECONDS = float(os.environ.get('OSI_PI_SHARED_SEGMENT_PUBLISH_INTERVAL_SECONDS', 10))
+
+# Local history of the OSI-PI tags in the SensorReading table, filled by `manage.py ingest_sensor_readings`. If enabled, the
+# connector serves the ranges the table holds from the database instead of requesting them from the OSI PI system.
+OSI_PI_LOCAL_HISTORY_ENABLED = os.environ.get('OSI_PI_LOCAL_HISTORY_ENABLED', 'False').lower() in ('1', 'true', 'yes')
+OSI_PI_LOCAL_HISTORY_RETENTION_DAYS = float(os.environ.get('OSI_PI_LOCAL_HISTORY_RETENTION_DAYS', 365))
+OSI_PI_INGESTION_INTERVAL_SECONDS = float(os.environ.get('OSI_PI_INGESTION_INTERVAL_SECONDS', 60))
+OSI_PI_INGESTION_BATCH_SIZE = int(os.environ.get('OSI_PI_INGESTION_BATCH_SIZE', 5000))
+# Length of the windows the ingestion requests at once and of the history fetched by the first run
+OSI_PI_INGESTION_WINDOW_HOURS = float(os.environ.get('OSI_PI_INGESTION_WINDOW_HOURS', 24))
+OSI_PI_INGESTION_BACKFILL_DAYS = float(os.environ.get('OSI_PI_INGESTION_BACKFILL_DAYS', 30))
+# Only data older than this is ingested, so values arriving late in the OSI PI system are not missed
+OSI_PI_INGESTION_SETTLE_SECONDS = float(os.environ.get('OSI_PI_INGESTION_SETTLE_SECONDS', 300))
+
+# Bucket sizes of the pre-aggregated resolution levels of the connector cache, every size a multiple of the previous one.
+OSI_PI_AGGREGATION_LEVELS = os.environ.get('OSI_PI_AGGREGATION_LEVELS', '10s,1min,15min,1h').split(',')
 
 # This mapping is currently static and needs to be updated manually if the OSI-PI parameters change.
 OSI_PI_WEBID_MAPPING = {
@@ -0,0 +1,137 @@
+# This file contains the AggregationPyramid class which keeps pre-aggregated resolution levels of the cached OSI-PI data.
+
+# Library imports
+import numpy as np
+import pandas as pd
+
+# Structured dtype of one aggregated bucket, the bucket start is stored as UTC nanoseconds
+AGGREGATE_DTYPE = np.dtype([('timestamp', '<i8'), ('min', '<f8'), ('max', '<f8'), ('sum', '<f8'), ('count', '<i8'), ('last', '<f8')])
+AGGREGATE_STATISTICS = ('min', 'max', 'mean', 'count', 'last')
+
+
+def _aggregate(timestamps: np.ndarray, buckets: np.ndarray, bucket_size: int) -> np.ndarray:
+    """
+    Combine sorted buckets (or raw points with count 1) into buckets of bucket_size nanoseconds.
+    """
+    if len(buckets) == 0:
+        return np.empty(0, dtype=AGGREGATE_DTYPE)
+    bucket_starts = timestamps - timestamps % bucket_size
+    first = np.flatnonzero(np.r_[True, bucket_starts[1:] != bucket_starts[:-1]])
+    last = np.r_[first[1:] - 1, len(buckets) - 1]
+
+    aggregated = np.empty(len(first), dtype=AGGREGATE_DTYPE)
+    aggregated['timestamp'] = bucket_starts[first]
+    aggregated['min'] = np.minimum.reduceat(buckets['min'], first)
+    aggregated['max'] = np.maximum.reduceat(buckets['max'], first)
+    aggregated['sum'] = np.add.reduceat(buckets['sum'], first)
+    aggregated['count'] = np.add.reduceat(buckets['count'], first)
+    aggregated['last'] = buckets['last'][last]
+    return aggregated
+
+
+class AggregationPyramid:
+    """
+    Pre-aggregated resolution levels (e.g. 10 s, 1 min, 15 min, 1 h) of the cached raw data per tag.
+
+    Every level stores min, max, sum, count and last value of its non-empty buckets, aligned to the unix epoch.
+    Updates are incremental: only the buckets of the coarsest level overlapping new data (and all finer buckets inside
+    of them) are recomputed, the finest level from the raw points and every coarser level from the level below.
+    A query picks the finest level whose number of buckets fits into a point budget, so zooming over the complete
+    retention window never touches more than one level and max_points buckets.
+
+    The aggregates are copy-on-write: every change replaces the aggregates mapping instead of modifying it, so a
+    reference to it is an immutable snapshot which can be passed to select_level and query from any thread.
+
+    Args:
+        levels (list): The bucket sizes as pandas frequency strings, e.g. ['10s', '1min', '15min', '1h']. Every size must be a multiple of the previous one.
+
+    Methods:
+        update_span(start_time: datetime, end_time: datetime) -> tuple: Returns the time range aligned to the coarsest level which has to be passed to update.
+        update(object_name: str, timestamps: np.ndarray, values: np.ndarray, span: tuple): Recomputes all buckets of the span from the raw points of the span.
+        select_level(object_names: list, start_time: datetime, end_time: datetime, max_points: int, raw_counts: dict = None, aggregates: dict = None) -> int: Returns the index of the finest level fitting the point budget, -1 for raw data.
+        query(object_name: str, level: int, start_time: datetime, end_time: datetime, aggregates: dict = None) -> np.ndarray: Returns the buckets of a level overlapping the time range.
+        discard_before(timestamp: datetime): Removes all buckets ending before timestamp.
+
+    Attributes:
+        levels (list): The bucket sizes as pd.Timedelta.
+        aggregates (dict): A mapping of object names to a tuple with one structured array of buckets per level, replaced on every change.
+    """
+    def __init__(self, levels: list):
+        self.levels = [pd.Timedelta(level) for level in levels]
+        self._sizes = [level.value for level in self.levels]
+        if not self._sizes or any(size <= 0 for size in self._sizes):
+            raise ValueError("levels must be positive durations")
+        if any(coarse % fine for fine, coarse in zip(self._sizes, self._sizes[1:])):
+            raise ValueError("every level must be a multiple of the previous level")
+        self.aggregates = {}
+
+    @staticmethod
+    def _nanoseconds(timestamp) -> int:
+        return pd.Timestamp(timestamp).value
+
+    def update_span(self, start_time, end_time) -> tuple:
+        """
+        Returns the time range [start, end) in UTC nanoseconds covering all coarsest buckets that overlap [start_time, end_time].
+        """
+        coarsest = self._sizes[-1]
+        start, end = self._nanoseconds(start_time), self._nanoseconds(end_time)
+        return start - start % coarsest, end - end % coarsest + coarsest
+
+    def update(self, object_name: str, timestamps: np.ndarray, values: np.ndarray, span: tuple):
+        """
+        Recomputes all buckets inside span from the raw points, which must be all cached points of the tag within span.
+        Timestamps are int64 UTC nanoseconds in ascending order, missing values (NaN) are ignored.
+        """
+        valid = ~np.isnan(values)
+        timestamps, values = timestamps[valid], values[valid]
+        raw = np.empty(len(values), dtype=AGGREGATE_DTYPE)
+        raw['timestamp'] = timestamps
+        for statistic in ('min', 'max', 'sum', 'last'):
+            raw[statistic] = values
+        raw['count'] = 1
+
+        levels = list(self.aggregates.get(object_name, [np.empty(0, dtype=AGGREGATE_DTYPE) for _ in self._sizes]))
+        buckets = raw
+        for level, size in enumerate(self._sizes):
+            buckets = _aggregate(buckets['timestamp'], buckets, size)
+            existing = levels[level]
+            first, last = np.searchsorted(existing['timestamp'], span)
+            levels[level] = np.concatenate([existing[:first], buckets, existing[last:]])
+        self.aggregates = {**self.aggregates, object_name: tuple(levels)}
+
+    def select_level(self, object_names: list, start_time, end_time, max_points: int, raw_counts: dict = None, aggregates: dict = None) -> int:
+        """
+        Returns the index of the finest level with at most max_points buckets in the time range for all tags.
+        Returns -1 if the raw points (raw_counts per tag) fit into the budget and the coarsest level if nothing fits.
+        A snapshot of the aggregates can be passed, the current aggregates are used otherwise.
+        """
+        if raw_counts is not None and all(raw_counts.get(object_name, 0) <= max_points for object_name in object_names):
+            return -1
+        for level in range(len(self._sizes)):
+            if all(len(self.query(object_name, level, start_time, end_time, aggregates)) <= max_points for object_name in object_names):
+                return level
+        return len(self._sizes) - 1
+
+    def query(self, object_name: str, level: int, start_time, end_time, aggregates: dict = None) -> np.ndarray:
+        """
+        Returns a view of the buckets of the level which overlap [start_time, end_time], taken from the snapshot
+        aggregates if provided.
+        """
+        aggregates = self.aggregates if aggregates is None else aggregates
+        if object_name not in aggregates:
+            return np.empty(0, dtype=AGGREGATE_DTYPE)
+        buckets = aggregates[object_name][level]
+        start, end = self._nanoseconds(start_time), self._nanoseconds(end_time)
+        first = np.searchsorted(buckets['timestamp'], start - start % self._sizes[level])
+        last = np.searchsorted(buckets['timestamp'], end, side='right')
+        return buckets[first:last]
+
+    def discard_before(self, timestamp):
+        """
+        Removes all buckets which end at or before timestamp.
+        """
+        cut_off = self._nanoseconds(timestamp)
+        self.aggregates = {
+            object_name: tuple(buckets[np.searchsorted(buckets['timestamp'], cut_off - size, side='right'):] for buckets, size in zip(levels, self._sizes))
+            for object_name, levels in self.aggregates.items()
+        }
@@ -0,0 +1,121 @@
+# This file contains the CacheCheckpoint class which persists the connector cache across restarts.
+
+# Library imports
+import os
+import json
+import zlib
+import struct
+import tempfile
+import numpy as np
+import pandas as pd
+
+# Module imports
+from connectors.IntervalSet import IntervalSet
+from connectors.SeriesCompression import CompressedSegment
+
+# Layout of a checkpoint file: magic, format version, time of the checkpoint in UTC nanoseconds and length of the JSON
+# directory, followed by the directory and the serialized CompressedSegment of every tag
+CHECKPOINT_MAGIC = b'OSIPICKP'
+CHECKPOINT_FORMAT_VERSION = 1
+CHECKPOINT_HEADER = struct.Struct('<8sIqI')
+
+
+class CacheCheckpoint:
+    """
+    A compact binary file holding the points and the coverage of the connector cache, so a restarted process serves
+    the cached history from memory right away and only fetches the gap since the checkpoint.
+
+    The points of every tag are stored losslessly as one CompressedSegment. The WebID of every tag is stored with its
+    points, on load only tags which are still requested with the same WebID are restored, the others are fetched again.
+    The file is written to a temporary file first and then atomically renamed, so a crash while saving leaves the
+    previous checkpoint intact and several processes may save the same file.
+
+    Args:
+        path (str): The path of the checkpoint file. Its directory is created if it does not exist.
+
+    Methods:
+        save(snapshot: CacheSnapshot, webid_mapping: dict, saved_at: datetime) -> int: Writes the points and coverage of the tags of webid_mapping, returns the size of the file.
+        load(webid_mapping: dict) -> tuple: Returns the time of the checkpoint, the arrays and the coverage of the tags still matching webid_mapping.
+        exists() -> bool: Checks whether a checkpoint file exists.
+    """
+    def __init__(self, path: str):
+        if not path:
+            raise ValueError("path must be provided")
+        self.path = path
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def save(self, snapshot, webid_mapping: dict, saved_at) -> int:
+        """
+        Writes the points and coverage of the snapshot of all tags of webid_mapping into the checkpoint file.
+        """
+        directory, segments, offset = {}, [], 0
+        for object_name, webid in webid_mapping.items():
+            if object_name not in snapshot.coverage:
+                continue
+            timestamps, values = snapshot.store.range(object_name, np.iinfo('int64').min, np.iinfo('int64').max)
+            segment = CompressedSegment.encode(timestamps, values).to_bytes() if len(timestamps) else b''
+            directory[object_name] = {
+                'webid': webid,
+                'offset': offset,
+                'length': len(segment),
+                'coverage': [[pd.Timestamp(start).value, pd.Timestamp(end).value] for start, end in snapshot.coverage[object_name]],
+            }
+            segments.append(segment)
+            offset += len(segment)
+        directory_bytes = json.dumps(directory).encode('utf-8')
+
+        directory_name = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory_name, exist_ok=True)
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=directory_name, suffix='.tmp')
+        try:
+            with os.fdopen(file_descriptor, 'wb') as checkpoint_file:
+                checkpoint_file.write(CHECKPOINT_HEADER.pack(CHECKPOINT_MAGIC, CHECKPOINT_FORMAT_VERSION, pd.Timestamp(saved_at).value, len(directory_bytes)))
+                checkpoint_file.write(directory_bytes)
+                for segment in segments:
+                    checkpoint_file.write(segment)
+            os.replace(temporary_path, self.path)
+        except BaseException:
+            os.remove(temporary_path)
+            raise
+        return CHECKPOINT_HEADER.size + len(directory_bytes) + offset
+
+    def load(self, webid_mapping: dict) -> tuple:
+        """
+        Returns (saved_at, arrays, coverage) of the checkpoint: the time it was saved as UTC pd.Timestamp, the
+        (timestamps, values) arrays and the IntervalSet of every tag in webid_mapping whose WebID did not change.
+        Returns None if there is no checkpoint, raises a ValueError if the file is not a valid checkpoint.
+        """
+        if not self.exists():
+            return None
+        with open(self.path, 'rb') as checkpoint_file:
+            data = checkpoint_file.read()
+        if len(data) < CHECKPOINT_HEADER.size:
+            raise ValueError(f"Invalid cache checkpoint {self.path}")
+        magic, format_version, saved_at, directory_length = CHECKPOINT_HEADER.unpack_from(data)
+        if magic != CHECKPOINT_MAGIC or format_version != CHECKPOINT_FORMAT_VERSION:
+            raise ValueError(f"Invalid cache checkpoint {self.path}")
+        data_start = CHECKPOINT_HEADER.size + directory_length
+        try:
+            directory = json.loads(data[CHECKPOINT_HEADER.size:data_start])
+        except ValueError:
+            raise ValueError(f"Invalid cache checkpoint {self.path}")
+
+        arrays, coverage = {}, {}
+        view = memoryview(data)
+        try:
+            for object_name, entry in directory.items():
+                if webid_mapping.get(object_name) != entry['webid']:
+                    continue
+                if entry['length']:
+                    start = data_start + entry['offset']
+                    arrays[object_name] = CompressedSegment.from_bytes(view[start:start + entry['length']]).decode()
+                coverage[object_name] = IntervalSet(
+                    (pd.Timestamp(interval_start, tz='UTC').to_pydatetime(), pd.Timestamp(interval_end, tz='UTC').to_pydatetime())
+                    for interval_start, interval_end in entry['coverage']
+                )
+        except (zlib.error, struct.error, ValueError, TypeError, KeyError, AttributeError):
+            # A file cut short or with corrupted segments
+            raise ValueError(f"Invalid cache checkpoint {self.path}")
+        return pd.Timestamp(saved_at, tz='UTC'), arrays, coverage
@@ -0,0 +1,131 @@
+# This file contains the CachePolicy class which bounds the memory of the connector cache.
+
+# Library imports
+import threading
+import pandas as pd
+
+# Configuration imports
+from config import (
+    OSI_PI_CACHE_BYTE_BUDGET,
+    OSI_PI_CACHE_BUCKET_MINUTES,
+    OSI_PI_CACHE_EVICTION_POLICY,
+    OSI_PI_CACHE_PINNED_TAIL_HOURS,
+)
+
+EVICTION_POLICIES = ('lru', 'lfu')
+
+
+class CachePolicy:
+    """
+    A byte budget for the cached points with LRU or LFU eviction of cold time buckets.
+
+    The cache is accounted per tag and per time bucket of bucket_minutes, aligned to the unix epoch, compressed segments
+    of the store with their encoded size. Every read records an access of the buckets it touches. If the cached points exceed the byte budget, whole buckets are evicted,
+    the least recently read first ('lru') or the least frequently read first ('lfu', ties broken by recency). Buckets
+    overlapping the live tail of pinned_tail_hours are never evicted, so the budget may be exceeded if the tail alone is
+    larger. Evicted buckets are fetched again on their next read.
+
+    All methods are thread-safe, readers record accesses concurrently with the writer selecting evictions.
+
+    Args:
+        byte_budget (int, optional): The maximum bytes of cached points, 0 disables the budget. Defaults to OSI_PI_CACHE_BYTE_BUDGET.
+        bucket_minutes (int, optional): The size of the evicted time buckets in minutes. Defaults to OSI_PI_CACHE_BUCKET_MINUTES.
+        policy (str, optional): 'lru' or 'lfu'. Defaults to OSI_PI_CACHE_EVICTION_POLICY.
+        pinned_tail_hours (float, optional): The length of the live tail which is never evicted. Defaults to OSI_PI_CACHE_PINNED_TAIL_HOURS.
+
+    Methods:
+        record_access(object_names: list, start_time: datetime, end_time: datetime, hit: bool): Records a read of the buckets of the tags overlapping the time range.
+        select_evictions(store: StoreSnapshot, now: datetime, protected: tuple = None) -> list: Returns the (object_name, bucket_start, bucket_end) to evict to meet the budget.
+        record_evictions(evictions: list, evicted_bytes: int): Counts evicted buckets and forgets their accesses.
+        discard_before(timestamp: datetime): Forgets the accesses of buckets before timestamp.
+        entries(store: StoreSnapshot) -> int: Returns the number of cached buckets of all tags.
+        get_stats() -> dict: Returns the counters of hits, misses and evictions.
+    """
+    def __init__(self, byte_budget: int = OSI_PI_CACHE_BYTE_BUDGET, bucket_minutes: int = OSI_PI_CACHE_BUCKET_MINUTES, policy: str = OSI_PI_CACHE_EVICTION_POLICY,
+                 pinned_tail_hours: float = OSI_PI_CACHE_PINNED_TAIL_HOURS):
+        if byte_budget < 0:
+            raise ValueError("byte_budget must not be negative")
+        if bucket_minutes <= 0:
+            raise ValueError("bucket_minutes must be positive")
+        if policy not in EVICTION_POLICIES:
+            raise ValueError(f"policy must be one of {', '.join(EVICTION_POLICIES)}")
+        self.byte_budget = byte_budget
+        self.bucket_size = pd.Timedelta(minutes=bucket_minutes).value
+        self.policy = policy
+        self.pinned_tail = pd.Timedelta(hours=pinned_tail_hours).value
+        # (object_name, bucket start) -> [last access tick, number of accesses]
+        self._accesses = {}
+        self._tick = 0
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'evicted_bytes': 0}
+        self._lock = threading.Lock()
+
+    def _bucket_starts(self, start_time, end_time) -> range:
+        start, end = pd.Timestamp(start_time).value, pd.Timestamp(end_time).value
+        return range(start - start % self.bucket_size, end + 1, self.bucket_size)
+
+    def record_access(self, object_names: list, start_time, end_time, hit: bool):
+        with self._lock:
+            self._tick += 1
+            self._stats['hits' if hit else 'misses'] += 1
+            if not self.byte_budget:
+                return
+            for object_name in object_names:
+                for bucket_start in self._bucket_starts(start_time, end_time):
+                    access = self._accesses.setdefault((object_name, bucket_start), [0, 0])
+                    access[0] = self._tick
+                    access[1] += 1
+
+    def select_evictions(self, store, now, protected: tuple = None) -> list:
+        """
+        Returns the buckets (object_name, bucket_start, bucket_end as UTC nanoseconds) which have to be evicted from the
+        store snapshot to meet the byte budget, in eviction order. Buckets of the pinned tail and buckets of the tags
+        overlapping a protected (object_names, start_time, end_time) range, e.g. the request being served, are kept.
+        """
+        total_bytes = store.nbytes()
+        if not self.byte_budget or total_bytes <= self.byte_budget:
+            return []
+        pinned_from = pd.Timestamp(now).value - self.pinned_tail
+        protected_tags, protected_start, protected_end = (set(protected[0]), pd.Timestamp(protected[1]).value, pd.Timestamp(protected[2]).value) if protected else (set(), 0, 0)
+
+        candidates = []
+        with self._lock:
+            for object_name in store.object_names():
+                for bucket_start, bucket_bytes in store.bucket_bytes(object_name, self.bucket_size).items():
+                    bucket_end = bucket_start + self.bucket_size
+                    if bucket_end > pinned_from:
+                        continue
+                    if object_name in protected_tags and bucket_start <= protected_end and bucket_end > protected_start:
+                        continue
+                    last_access, accesses = self._accesses.get((object_name, bucket_start), (0, 0))
+                    key = (last_access,) if self.policy == 'lru' else (accesses, last_access)
+                    candidates.append((key, bucket_start, object_name, bucket_bytes))
+
+        evictions = []
+        for _, bucket_start, object_name, bucket_bytes in sorted(candidates):
+            if total_bytes <= self.byte_budget:
+                break
+            evictions.append((object_name, bucket_start, bucket_start + self.bucket_size))
+            total_bytes -= bucket_bytes
+        return evictions
+
+    def record_evictions(self, evictions: list, evicted_bytes: int):
+        with self._lock:
+            self._stats['evictions'] += len(evictions)
+            self._stats['evicted_bytes'] += evicted_bytes
+            for object_name, bucket_start, _ in evictions:
+                self._accesses.pop((object_name, bucket_start), None)
+
+    def discard_before(self, timestamp):
+        cut_off = pd.Timestamp(timestamp).value
+        with self._lock:
+            self._accesses = {key: access for key, access in self._accesses.items() if key[1] + self.bucket_size > cut_off}
+
+    def entries(self, store) -> int:
+        return sum(len(store.bucket_bytes(object_name, self.bucket_size)) for object_name in store.object_names())
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats['byte_budget'] = self.byte_budget
+        stats['policy'] = self.policy
+        return stats
@@ -0,0 +1,42 @@
+# This file contains the CacheSnapshot class, an immutable and consistent view of the OSIPIConnector cache.
+
+# Library imports
+import time
+
+
+class CacheSnapshot:
+    """
+    An immutable view of the connector cache: the points of the store, the coverage per tag and the aggregation pyramid
+    at the same moment. The connector builds a new snapshot after every change of the cache and swaps it in with a
+    single assignment, readers take the current snapshot without locking and never see a half-merged state.
+
+    Args:
+        store (StoreSnapshot): The snapshot of the TimeSeriesStore.
+        coverage (dict): A mapping of object names to copies of their IntervalSet, which must not be modified.
+        aggregates (dict): The aggregates mapping of the AggregationPyramid.
+        version (int): The number of the snapshot, increased with every published snapshot.
+
+    Methods:
+        missing(object_name: str, start_time: datetime, end_time: datetime) -> list: Returns the sub-intervals of the time range the snapshot holds no data for.
+
+    Attributes:
+        store (StoreSnapshot): The snapshot of the points of all tags.
+        coverage (dict): A mapping of object names to the IntervalSet of time ranges covered by the snapshot.
+        aggregates (dict): The snapshot of the aggregation pyramid, see AggregationPyramid.query.
+        version (int): The number of the snapshot.
+        published_at (float): The time.monotonic() the snapshot was built at.
+    """
+    __slots__ = ('store', 'coverage', 'aggregates', 'version', 'published_at')
+
+    def __init__(self, store, coverage: dict, aggregates: dict, version: int = 0):
+        self.store = store
+        self.coverage = coverage
+        self.aggregates = aggregates
+        self.version = version
+        self.published_at = time.monotonic()
+
+    def missing(self, object_name: str, start_time, end_time) -> list:
+        return self.coverage[object_name].missing(start_time, end_time)
+
+    def __repr__(self):
+        return f'CacheSnapshot(version={self.version}, points={self.store.size()})'
@@ -0,0 +1,93 @@
+# This file contains the CircuitBreaker class which stops requests to the OSI PI system while it is unhealthy.
+
+# Library imports
+import time
+import threading
+
+# Configuration imports
+from config import (
+    OSI_PI_CIRCUIT_BREAKER_FAILURES,
+    OSI_PI_CIRCUIT_BREAKER_RESET_SECONDS,
+)
+
+CIRCUIT_CLOSED = 'closed'
+CIRCUIT_OPEN = 'open'
+CIRCUIT_HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """
+    A thread-safe circuit breaker guarding the requests to the OSI PI system.
+
+    The circuit is closed as long as requests succeed. After failure_threshold consecutive failures it opens and every
+    request is rejected right away instead of waiting for a timeout, the callers serve cached data meanwhile. Once
+    reset_timeout_seconds passed, the circuit is half-open and a single probe request is let through: its success
+    closes the circuit, its failure opens it again for another reset_timeout_seconds.
+
+    Args:
+        failure_threshold (int, optional): The number of consecutive failures opening the circuit. Defaults to OSI_PI_CIRCUIT_BREAKER_FAILURES.
+        reset_timeout_seconds (float, optional): The time the circuit stays open before a probe request. Defaults to OSI_PI_CIRCUIT_BREAKER_RESET_SECONDS.
+
+    Methods:
+        allow_request() -> bool: Checks whether a request may be sent, claims the probe request of a half-open circuit.
+        record_success(): Records a successful request, which closes the circuit.
+        record_failure(): Records a failed request, which opens the circuit beyond the threshold or after a failed probe.
+        is_open() -> bool: Checks whether requests are currently rejected, without claiming a probe.
+        get_stats() -> dict: Returns the state, the consecutive failures and the number of openings and rejected requests.
+    """
+    def __init__(self, failure_threshold: int = OSI_PI_CIRCUIT_BREAKER_FAILURES, reset_timeout_seconds: float = OSI_PI_CIRCUIT_BREAKER_RESET_SECONDS):
+        if failure_threshold <= 0:
+            raise ValueError("failure_threshold must be positive")
+        if reset_timeout_seconds < 0:
+            raise ValueError("reset_timeout_seconds must not be negative")
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_seconds = reset_timeout_seconds
+        self._state = CIRCUIT_CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._probe_started_at = None
+        self._stats = {'opened': 0, 'rejected': 0}
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            if self._state == CIRCUIT_OPEN and now - self._opened_at >= self.reset_timeout_seconds:
+                self._state = CIRCUIT_HALF_OPEN
+                self._probe_started_at = None
+            if self._state == CIRCUIT_CLOSED:
+                return True
+            # A probe which never reported back, e.g. because it raised, does not block the circuit forever
+            if self._state == CIRCUIT_HALF_OPEN and (self._probe_started_at is None or now - self._probe_started_at >= self.reset_timeout_seconds):
+                self._probe_started_at = now
+                return True
+            self._stats['rejected'] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = CIRCUIT_CLOSED
+            self._consecutive_failures = 0
+            self._probe_started_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive_failures += 1
+            if self._state == CIRCUIT_HALF_OPEN or (self._state == CIRCUIT_CLOSED and self._consecutive_failures >= self.failure_threshold):
+                self._state = CIRCUIT_OPEN
+                self._opened_at = time.monotonic()
+                self._probe_started_at = None
+                self._stats['opened'] += 1
+
+    def is_open(self) -> bool:
+        with self._lock:
+            return self._state == CIRCUIT_OPEN and time.monotonic() - self._opened_at < self.reset_timeout_seconds
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {'state': self._state, 'consecutive_failures': self._consecutive_failures, **self._stats}
@@ -0,0 +1,89 @@
+# This file contains the InFlightRegistry class which coalesces concurrent requests for the same missing data.
+
+# Library imports
+import threading
+
+# Module imports
+from connectors.IntervalSet import IntervalSet
+
+
+class InFlightFetch:
+    """
+    A fetch of the interval [start_time, end_time] for some tags which is currently requested from the OSI PI system.
+    Other threads needing the same data wait for it instead of sending their own request.
+
+    Attributes:
+        object_names (list): The tags being fetched.
+        start_time (datetime): Start of the fetched interval.
+        end_time (datetime): End of the fetched interval.
+        succeeded (bool): Whether the fetched data was merged into the cache, None while the fetch is running.
+    """
+    def __init__(self, object_names: list, start_time, end_time):
+        self.object_names = list(object_names)
+        self.start_time = start_time
+        self.end_time = end_time
+        self.succeeded = None
+        self._done = threading.Event()
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Waits until the fetch is completed, returns whether it succeeded (None on timeout).
+        """
+        self._done.wait(timeout)
+        return self.succeeded
+
+    def __repr__(self):
+        return f'InFlightFetch({self.object_names!r}, {self.start_time!r}, {self.end_time!r})'
+
+
+class InFlightRegistry:
+    """
+    The registry of intervals per tag that are currently fetched from the OSI PI system (single-flight).
+
+    Before requesting a missing interval, a thread claims it: the parts already being fetched by another thread are
+    returned as fetches to wait for, only the remaining parts have to be registered and requested by the thread itself.
+    So concurrent queries with overlapping ranges send exactly one request per missing interval.
+
+    The registry is not synchronized itself, all calls have to hold the lock guarding the cache coverage, so claiming
+    the missing intervals and completing a fetch are atomic with respect to the coverage.
+
+    Methods:
+        claim(object_name: str, intervals: list) -> tuple: Splits missing intervals of a tag into the parts nobody fetches yet and the fetches to wait for.
+        register(object_names: list, start_time: datetime, end_time: datetime) -> InFlightFetch: Registers a fetch of the calling thread.
+        complete(fetch: InFlightFetch, succeeded: bool): Removes a fetch from the registry and wakes up all waiting threads.
+        in_flight() -> list: Returns all running fetches.
+    """
+    def __init__(self):
+        self._fetches = {}
+
+    def claim(self, object_name: str, intervals: list) -> tuple:
+        """
+        Returns the sub-intervals of intervals which are not being fetched for the tag and the set of running fetches
+        overlapping intervals.
+        """
+        fetches = self._fetches.get(object_name, [])
+        if not fetches:
+            return list(intervals), set()
+        in_flight = IntervalSet((fetch.start_time, fetch.end_time) for fetch in fetches)
+        unclaimed, pending = [], set()
+        for start_time, end_time in intervals:
+            unclaimed.extend(in_flight.missing(start_time, end_time))
+            pending.update(fetch for fetch in fetches if fetch.start_time < end_time and fetch.end_time > start_time)
+        return unclaimed, pending
+
+    def register(self, object_names: list, start_time, end_time) -> InFlightFetch:
+        fetch = InFlightFetch(object_names, start_time, end_time)
+        for object_name in fetch.object_names:
+            self._fetches.setdefault(object_name, []).append(fetch)
+        return fetch
+
+    def complete(self, fetch: InFlightFetch, succeeded: bool):
+        for object_name in fetch.object_names:
+            fetches = self._fetches.get(object_name, [])
+            if fetch in fetches:
+                fetches.remove(fetch)
+        fetch.succeeded = succeeded
+        fetch._done.set()
+
+    def in_flight(self) -> list:
+        return list({id(fetch): fetch for fetches in self._fetches.values() for fetch in fetches}.values())
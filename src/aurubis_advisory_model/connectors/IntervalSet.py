@@ -0,0 +1,115 @@
+# This file contains the IntervalSet class which keeps track of the time ranges covered by the connector cache.
+
+# Library imports
+import bisect
+
+
+class IntervalSet:
+    """
+    A set of closed, non-overlapping time intervals kept sorted by their start.
+
+    Overlapping or touching intervals are merged when added, so the set always holds the minimal number of intervals.
+    Works with any ordered type, the connector uses timezone aware datetimes.
+
+    Methods:
+        add(start, end): Adds the interval [start, end] to the set.
+        missing(start, end) -> list: Returns the sub-intervals of [start, end] which are not covered by the set.
+        covers(start, end) -> bool: Checks whether [start, end] is covered completely.
+        discard_before(timestamp): Removes everything before timestamp from the set.
+        discard(start, end): Removes the open interval (start, end) from the set.
+        copy() -> IntervalSet: Returns an independent copy of the set.
+
+    Attributes:
+        intervals (list): The sorted list of (start, end) tuples.
+    """
+    def __init__(self, intervals: list = None):
+        self.intervals = []
+        for start, end in intervals or []:
+            self.add(start, end)
+
+    def __iter__(self):
+        return iter(self.intervals)
+
+    def __len__(self):
+        return len(self.intervals)
+
+    def __bool__(self):
+        return bool(self.intervals)
+
+    def __repr__(self):
+        return f'IntervalSet({self.intervals!r})'
+
+    def add(self, start, end):
+        """
+        Adds the interval [start, end] and merges it with all intervals it overlaps or touches.
+        """
+        if end < start:
+            start, end = end, start
+
+        # Find the first interval that ends at or after start and the first interval that starts after end
+        starts = [interval[0] for interval in self.intervals]
+        ends = [interval[1] for interval in self.intervals]
+        first = bisect.bisect_left(ends, start)
+        last = bisect.bisect_right(starts, end)
+
+        if first < last:
+            start = min(start, self.intervals[first][0])
+            end = max(end, self.intervals[last - 1][1])
+        self.intervals[first:last] = [(start, end)]
+
+    def missing(self, start, end) -> list:
+        """
+        Returns the sub-intervals of [start, end] which are not covered, sorted by their start.
+        """
+        if end < start:
+            start, end = end, start
+
+        gaps = []
+        cursor = start
+        for interval_start, interval_end in self.intervals:
+            if interval_end < cursor:
+                continue
+            if interval_start > end:
+                break
+            if interval_start > cursor:
+                gaps.append((cursor, interval_start))
+            cursor = max(cursor, interval_end)
+            if cursor >= end:
+                break
+        if cursor < end:
+            gaps.append((cursor, end))
+        return gaps
+
+    def covers(self, start, end) -> bool:
+        """
+        Checks whether the interval [start, end] is covered completely.
+        """
+        return not self.missing(start, end)
+
+    def discard_before(self, timestamp):
+        """
+        Removes everything before timestamp, an interval spanning the timestamp is cut.
+        """
+        self.intervals = [(max(start, timestamp), end) for start, end in self.intervals if end >= timestamp]
+
+    def discard(self, start, end):
+        """
+        Removes the open interval (start, end), intervals spanning it are split. The bounds themselves stay covered.
+        """
+        if end < start:
+            start, end = end, start
+        intervals = []
+        for interval_start, interval_end in self.intervals:
+            if interval_end <= start or interval_start >= end:
+                intervals.append((interval_start, interval_end))
+                continue
+            if interval_start <= start:
+                intervals.append((interval_start, start))
+            if interval_end >= end:
+                intervals.append((end, interval_end))
+        self.intervals = intervals
+
+    def copy(self):
+        interval_set = IntervalSet()
+        interval_set.intervals = list(self.intervals)
+        return interval_set
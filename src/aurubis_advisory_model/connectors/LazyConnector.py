@@ -0,0 +1,56 @@
+# This file contains the LazyConnector class which defers the construction of a connector until it is first used.
+
+# Library imports
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class LazyConnector:
+    """
+    A thread-safe proxy constructing the wrapped connector on first attribute access.
+
+    Importing the connectors package therefore does no I/O and does not need OSI-PI credentials, which keeps manage.py
+    commands, migrations, test runs and worker boot independent of the OSI PI system.
+
+    Args:
+        factory (callable): A callable without arguments returning the connector.
+
+    Methods:
+        get_instance(): Returns the connector, constructing it on the first call.
+        is_initialized() -> bool: Checks whether the connector has been constructed.
+        start_warm_up() -> threading.Thread: Constructs the connector and fills its cache in a background thread.
+    """
+    def __init__(self, factory):
+        self._factory = factory
+        self._instance = None
+        self._lock = threading.Lock()
+
+    def get_instance(self):
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = self._factory()
+        return self._instance
+
+    def is_initialized(self) -> bool:
+        return self._instance is not None
+
+    def __getattr__(self, name):
+        # Only called for attributes not found on the proxy itself
+        return getattr(self.get_instance(), name)
+
+    def start_warm_up(self) -> threading.Thread:
+        """
+        Constructs the connector and calls its warm_up method in a daemon thread, errors are logged and not raised.
+        """
+        def warm_up():
+            try:
+                self.get_instance().warm_up()
+            except Exception:
+                logger.exception('Warm-up of the connector failed')
+
+        thread = threading.Thread(target=warm_up, name='connector-warm-up', daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,138 @@
+# This file contains the LocalHistory class, the time series of the OSI-PI tags ingested into the local database.
+
+# Library imports
+import numpy as np
+import pandas as pd
+from django.apps import apps
+from django.db import connection, transaction
+
+# Module imports
+from connectors.StreamParsing import frame_from_arrays
+
+# Configuration imports
+from config import (
+    TIMEZONE,
+    OSI_PI_INGESTION_BATCH_SIZE,
+)
+
+READING_DTYPE = np.dtype([('ts', 'int64'), ('value', 'float64')])
+
+
+def _nanoseconds(timestamp) -> int:
+    return pd.Timestamp(timestamp).value
+
+
+class LocalHistory:
+    """
+    The SensorReading table of the connectors app, a narrow (tag, ts, value) table filled by the ingest_sensor_readings
+    command, which serves historical ranges without requests to the OSI PI system.
+
+    Every write records the time range it holds the complete data for in the SensorCoverage table, a write adjacent to
+    the covered range of a tag extends it. Reads select the readings of one tag at a time through the composite
+    (tag, ts) index and build the arrays directly from the database cursor, without creating model instances.
+
+    The models are looked up on first use, so this module can be imported before the Django apps are loaded.
+
+    Args:
+        batch_size (int, optional): The number of readings written per executemany call. Defaults to OSI_PI_INGESTION_BATCH_SIZE.
+
+    Methods:
+        write(df: pd.DataFrame, start_time: datetime, end_time: datetime, tags: list = None) -> int: Inserts or updates the readings of a range of the tags, returns the number of readings written.
+        coverage(tags: list) -> dict: Returns the covered (start, end) as UTC pd.Timestamp per tag, tags without readings are missing.
+        covered_range(tags: list) -> tuple: Returns the time range all tags hold complete data for, (None, None) if there is none.
+        arrays(object_name: str, start_time: datetime, end_time: datetime) -> tuple: Returns the timestamps and values of a tag within [start_time, end_time].
+        frame(tags: list, start_time: datetime, end_time: datetime, timezone: str = TIMEZONE) -> pd.DataFrame: Returns the readings of the tags as wide DataFrame.
+        prune_before(timestamp: datetime) -> int: Deletes all readings before timestamp, returns the number of readings deleted.
+    """
+    def __init__(self, batch_size: int = OSI_PI_INGESTION_BATCH_SIZE):
+        if batch_size <= 0:
+            raise ValueError("batch_size must be positive")
+        self.batch_size = batch_size
+
+    @property
+    def reading_model(self):
+        return apps.get_model('connectors', 'SensorReading')
+
+    @property
+    def coverage_model(self):
+        return apps.get_model('connectors', 'SensorCoverage')
+
+    def write(self, df: pd.DataFrame, start_time, end_time, tags: list = None) -> int:
+        """
+        Inserts the readings of a DataFrame indexed by timestamp with one column per tag, which holds the complete data
+        of the tags (default: the columns) within [start_time, end_time], a tag without column had no values. Existing
+        readings of the same tag and timestamp are updated, missing values (NaN) are skipped. The covered range of every
+        tag is extended if it overlaps or touches the range, otherwise it is replaced by the range.
+        """
+        start, end = _nanoseconds(start_time), _nanoseconds(end_time)
+        timestamps = df.index.as_unit('ns').asi8
+        table = connection.ops.quote_name(self.reading_model._meta.db_table)
+        # The upsert rows are built from the arrays, creating a model instance per reading costs more than the INSERT itself
+        upsert = f'INSERT INTO {table} (tag, ts, value) VALUES (%s, %s, %s) ON CONFLICT (tag, ts) DO UPDATE SET value = excluded.value'
+        written = 0
+        with transaction.atomic(), connection.cursor() as cursor:
+            for object_name in df.columns:
+                values = df[object_name].to_numpy(dtype='float64', na_value=np.nan)
+                valid = ~np.isnan(values)
+                tag_timestamps, tag_values = timestamps[valid], values[valid]
+                for offset in range(0, len(tag_values), self.batch_size):
+                    cursor.executemany(upsert, [
+                        (object_name, ts, value)
+                        for ts, value in zip(tag_timestamps[offset:offset + self.batch_size].tolist(), tag_values[offset:offset + self.batch_size].tolist())
+                    ])
+                written += len(tag_values)
+
+            for object_name in (df.columns if tags is None else tags):
+                coverage = self.coverage_model.objects.select_for_update().filter(tag=object_name).first()
+                if coverage is None:
+                    self.coverage_model.objects.create(tag=object_name, start=start, end=end)
+                elif coverage.start <= end and start <= coverage.end:
+                    coverage.start, coverage.end = min(coverage.start, start), max(coverage.end, end)
+                    coverage.save(update_fields=['start', 'end'])
+                elif end > coverage.end:
+                    # A gap to the covered range, only the newer range is known to be complete
+                    coverage.start, coverage.end = start, end
+                    coverage.save(update_fields=['start', 'end'])
+        return written
+
+    def coverage(self, tags: list) -> dict:
+        return {
+            object_name: (pd.Timestamp(start, tz='UTC'), pd.Timestamp(end, tz='UTC'))
+            for object_name, start, end in self.coverage_model.objects.filter(tag__in=tags).values_list('tag', 'start', 'end')
+        }
+
+    def covered_range(self, tags: list) -> tuple:
+        """
+        Returns the range between the latest covered start and the earliest covered end of the tags, which all of them
+        hold complete data for.
+        """
+        coverage = self.coverage(tags)
+        if not tags or len(coverage) < len(set(tags)):
+            return None, None
+        start, end = max(start for start, _ in coverage.values()), min(end for _, end in coverage.values())
+        return (start, end) if start < end else (None, None)
+
+    def arrays(self, object_name: str, start_time, end_time) -> tuple:
+        table = connection.ops.quote_name(self.reading_model._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT ts, value FROM {table} WHERE tag = %s AND ts >= %s AND ts <= %s ORDER BY ts', [object_name, _nanoseconds(start_time), _nanoseconds(end_time)])
+            readings = np.array(cursor.fetchall(), dtype=READING_DTYPE)
+        return readings['ts'], readings['value']
+
+    def frame(self, tags: list, start_time, end_time, timezone: str = TIMEZONE) -> pd.DataFrame:
+        """
+        Returns the readings of the tags within [start_time, end_time] as DataFrame indexed by the union of their timestamps.
+        """
+        return frame_from_arrays({object_name: self.arrays(object_name, start_time, end_time) for object_name in tags}, timezone=timezone)
+
+    def prune_before(self, timestamp) -> int:
+        """
+        Deletes the readings before timestamp and moves the start of the covered ranges, coverage ending before
+        timestamp is deleted as well.
+        """
+        cut_off = _nanoseconds(timestamp)
+        with transaction.atomic():
+            deleted, _ = self.reading_model.objects.filter(ts__lt=cut_off).delete()
+            self.coverage_model.objects.filter(end__lt=cut_off).delete()
+            self.coverage_model.objects.filter(start__lt=cut_off).update(start=cut_off)
+        return deleted
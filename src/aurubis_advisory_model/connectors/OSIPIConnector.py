@@ -2,14 +2,36 @@
 # Created by Jan Macenka @ 25 Sept 2023
 
 # Library imports
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import yaml
 import requests
 import pytz
 import pandas as pd
 import numpy as np
 from datetime import datetime, timezone, timedelta
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
 
+# Module imports
+from connectors.AggregationPyramid import AggregationPyramid, AGGREGATE_STATISTICS
+from connectors.CacheCheckpoint import CacheCheckpoint
+from connectors.CachePolicy import CachePolicy
+from connectors.CircuitBreaker import CircuitBreaker
+from connectors.CacheSnapshot import CacheSnapshot
+from connectors.InFlightRegistry import InFlightRegistry
+from connectors.IntervalSet import IntervalSet
+from connectors.LocalHistory import LocalHistory
+from connectors.SharedSegment import SharedSegment
+from connectors.StreamParsing import parse_stream_items, merge_stream_arrays, frame_from_arrays
+from connectors.StreamingDecoder import StreamingDecoder
+from connectors.TileCache import TileCache
+from connectors.TimeSeriesStore import TimeSeriesStore
+from utils.Downsampling import downsample_frame
+
 # Configuration imports
 from config import (
     TIMEZONE,
@@ -17,8 +39,42 @@ from config import (
     CACHE_STORAGE_DURATION_HOURS,
     OSI_PI_PARAMETERS_REQUESTED,
     OSI_PI_WEBID_MAPPING,
+    OSI_PI_TILE_CACHE_DIRECTORY,
+    OSI_PI_TILE_CACHE_BUCKET_MINUTES,
+    OSI_PI_CONNECTION_POOL_SIZE,
+    OSI_PI_REQUEST_WINDOW_HOURS,
+    OSI_PI_REQUEST_TAGS_PER_REQUEST,
+    OSI_PI_REQUEST_MAX_COUNT,
+    OSI_PI_REQUEST_WORKERS,
+    OSI_PI_REQUEST_CONNECT_TIMEOUT_SECONDS,
+    OSI_PI_REQUEST_TIMEOUT_SECONDS,
+    OSI_PI_REQUEST_RETRIES,
+    OSI_PI_REQUEST_BACKOFF_SECONDS,
+    OSI_PI_REQUEST_BACKOFF_MAX_SECONDS,
+    OSI_PI_CIRCUIT_BREAKER_FAILURES,
+    OSI_PI_CIRCUIT_BREAKER_RESET_SECONDS,
+    OSI_PI_AGGREGATION_LEVELS,
+    OSI_PI_SHARED_SEGMENT_DIRECTORY,
+    OSI_PI_SHARED_SEGMENT_WRITER,
+    OSI_PI_SHARED_SEGMENT_MAX_STALENESS_SECONDS,
+    OSI_PI_SHARED_SEGMENT_PUBLISH_INTERVAL_SECONDS,
+    OSI_PI_CACHE_BYTE_BUDGET,
+    OSI_PI_CACHE_COMPRESSION,
+    OSI_PI_CACHE_HOT_TAIL_HOURS,
+    OSI_PI_CACHE_CHECKPOINT_PATH,
+    OSI_PI_CACHE_CHECKPOINT_INTERVAL_SECONDS,
+    OSI_PI_LOCAL_HISTORY_ENABLED,
 )
 
+logger = logging.getLogger(__name__)
+
+# Only these fields of the streamsets/recorded response are transferred, PI Web API drops everything else server-side
+RECORDED_SELECTED_FIELDS = 'Items.Name;Items.Items.Timestamp;Items.Items.Value'
+# Size of the decompressed chunks read from the response in streaming mode
+STREAMING_CHUNK_SIZE = 64 * 1024
+# Responses with these status codes are transient failures of the OSI PI system and retried, other errors are not
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+
 class OSIPIConnector:
     """
     A class for connecting to an OSI PI system and retrieving data.
@@ -28,25 +84,95 @@ class OSIPIConnector:
         username (str): The username for authentication.
         password (str): The password for authentication.
         timezone (str, optional): The timezone of the OSI PI system. Defaults to 'Europe/Berlin'.
-        request_timeout_seconds (int, optional): The timeout for requests to the OSI PI system in seconds. Defaults to 120.
+        request_timeout_seconds (float, optional): The read timeout of requests to the OSI PI system in seconds. Defaults to OSI_PI_REQUEST_TIMEOUT_SECONDS.
+        tile_cache_directory (str, optional): Directory of the on-disk tile cache shared by all worker processes. Defaults to OSI_PI_TILE_CACHE_DIRECTORY, an empty value disables the tile cache.
+        pool_size (int, optional): The maximum number of keep-alive connections kept open to the OSI PI system. Defaults to OSI_PI_CONNECTION_POOL_SIZE.
+        request_window_hours (float, optional): Long time ranges are split into windows of this length. Defaults to OSI_PI_REQUEST_WINDOW_HOURS.
+        tags_per_request (int, optional): The maximum number of WebIDs sent in a single request. Defaults to OSI_PI_REQUEST_TAGS_PER_REQUEST.
+        max_count (int, optional): The maximum number of values per stream and request, truncated streams are paged. Defaults to OSI_PI_REQUEST_MAX_COUNT.
+        request_workers (int, optional): The number of chunks requested concurrently. Defaults to OSI_PI_REQUEST_WORKERS.
+        aggregation_levels (list, optional): The bucket sizes of the aggregation pyramid as pandas frequency strings. Defaults to OSI_PI_AGGREGATION_LEVELS.
+        shared_segment_directory (str, optional): Directory of the memory-mapped cache segment shared by all worker processes. Defaults to OSI_PI_SHARED_SEGMENT_DIRECTORY, an empty value disables it.
+        shared_segment_writer (bool, optional): Whether this process publishes its cache into the shared segment, the other processes read get_data from it. Defaults to OSI_PI_SHARED_SEGMENT_WRITER.
+        byte_budget (int, optional): The maximum bytes of cached points, cold time buckets are evicted beyond it. Defaults to OSI_PI_CACHE_BYTE_BUDGET, 0 disables the budget.
+        compression (str, optional): The encoding of the cached points older than OSI_PI_CACHE_HOT_TAIL_HOURS, 'lossless' or 'float32'. Defaults to OSI_PI_CACHE_COMPRESSION, an empty value disables compression.
+        checkpoint_path (str, optional): The file the cache is saved to and restored from on startup. Defaults to OSI_PI_CACHE_CHECKPOINT_PATH, an empty value disables checkpoints.
+        local_history (bool, optional): Whether ranges held by the SensorReading table are read from the database instead of the OSI PI system. Defaults to OSI_PI_LOCAL_HISTORY_ENABLED.
+        request_retries (int, optional): The number of retries of a failed request. Defaults to OSI_PI_REQUEST_RETRIES.
+        backoff_seconds (float, optional): The maximum delay before the first retry, doubled for every further retry up to OSI_PI_REQUEST_BACKOFF_MAX_SECONDS. Defaults to OSI_PI_REQUEST_BACKOFF_SECONDS.
+        circuit_breaker_failures (int, optional): The consecutive failed requests after which no requests are sent for circuit_breaker_reset_seconds. Defaults to OSI_PI_CIRCUIT_BREAKER_FAILURES.
+        circuit_breaker_reset_seconds (float, optional): The time no requests are sent once the circuit breaker opened. Defaults to OSI_PI_CIRCUIT_BREAKER_RESET_SECONDS.
 
     Methods:
-        get_data(start_time: datetime = None, end_time: datetime = None, verify_cert: bool = False) -> pd.DataFrame: Retrieves data from OSI PI system for a given time range, uses a local cache to minimize the number of web-requests to OSI-PI API.
+        get_data(start_time: datetime = None, end_time: datetime = None, verify_cert: bool = False, streaming: bool = False, max_points: int = None, tags: list = None) -> pd.DataFrame: Retrieves data from OSI PI system for a given time range, uses a local cache to minimize the number of web-requests to OSI-PI API.
+        get_aggregated_data(start_time: datetime = None, end_time: datetime = None, max_points: int = 1000, statistic: str = 'mean', verify_cert: bool = False, tags: list = None) -> pd.DataFrame: Retrieves data at the finest resolution fitting a point budget from the aggregation pyramid.
+        fetch_range(start_time: datetime, end_time: datetime, verify_cert: bool = False, streaming: bool = False, tags: list = None) -> pd.DataFrame: Retrieves a time range without the in-memory cache, e.g. for ingestion into the local history.
+        warm_up(verify_cert: bool = False, tags: list = None): Fills the cache from the start of the current charge till now.
+        prefetch(start_time: datetime, end_time: datetime, verify_cert: bool = False, tags: list = None) -> bool: Fetches a time range into the cache without counting it as a read.
+        is_cached(start_time: datetime, end_time: datetime, tags: list = None) -> bool: Checks whether a time range is served without requests.
+        update_tail(verify_cert: bool = False, tags: list = None) -> datetime: Fetches only the data after the end of the cached window.
+        tags_in_use() -> list: Returns the tags which hold cached data.
+        cached_until(tags: list = None) -> datetime: Returns the end of the cached window common to the tags.
+        staleness_seconds(tags: list = None) -> float: Returns the time since the end of the cached window in seconds.
+        get_request_stats() -> dict: Returns counters of the requests, retries, failures, bytes received and opened/reused connections and the state of the circuit breaker.
+        get_cache_stats() -> dict: Returns the bytes, entries, hits, misses and evictions of the cache.
+        save_checkpoint() -> int: Saves the cache into the checkpoint file and returns the size of the file.
+        save_checkpoint_if_due(interval_seconds: float = OSI_PI_CACHE_CHECKPOINT_INTERVAL_SECONDS) -> bool: Saves the cache if it changed and the last checkpoint is older than interval_seconds.
+        restore_checkpoint() -> list: Restores the cache from the checkpoint file and returns the restored tags.
+        publish_shared_segment_if_due(interval_seconds: float = OSI_PI_SHARED_SEGMENT_PUBLISH_INTERVAL_SECONDS) -> bool: Writes the cache into the shared segment if it changed and the segment is older than interval_seconds.
+        close(): Closes all pooled connections to the OSI PI system, publishes the pending changes and releases the shared segment.
 
     Internal Methods:
-        _convert_timestamps(timestamp: datetime) -> str: Convert a timestamp to the correct format for the OSI PI system.
+        _convert_timestamps(timestamp: datetime, round_down: bool = False) -> str: Convert a timestamp to the correct format for the OSI PI system.
         _generate_batch_start_timestamp(charge_hour_start: int = CHARGE_START_HOUR) -> datetime: Generate a timestamp for the start of the current charge.
-        _batch_retriev_data(start_time: datetime, end_time: datetime, verify_cert: bool = False, object_names: list = OSI_PI_PARAMETERS_REQUESTED) -> pd.DataFrame: Retrieve multiple data-ranges for same timespan and returns a Pandas DataFrame.
+        _batch_retriev_data(start_time: datetime, end_time: datetime, verify_cert: bool = False, streaming: bool = False, tags: list = None) -> pd.DataFrame: Retrieve multiple data-ranges for same timespan in concurrent chunks and returns a Pandas DataFrame.
+        _retrieve_chunk(object_names: list, start_time: datetime, end_time: datetime, verify_cert: bool = False, streaming: bool = False) -> dict: Retrieve the arrays of one chunk, paging truncated streams.
+        _request_recorded(object_names: list, start_time_converted: str, end_time_converted: str, verify_cert: bool = False, streaming: bool = False) -> dict: Send a single streamsets/recorded request, retrying transient failures.
+        _backoff_delay(retry: int) -> float: Return the randomized delay before a retry.
+        _retrieve_data(start_time: datetime, end_time: datetime, verify_cert: bool = False, streaming: bool = False, tags: list = None) -> pd.DataFrame: Retrieve data from the local history and through the on-disk tile cache, only buckets missing on disk are requested from the OSI PI system.
+        _normalize_range(start_time: datetime = None, end_time: datetime = None) -> tuple: Make a time range timezone aware and fill in the defaults.
+        _shared_snapshot(tags: list, start_time: datetime, end_time: datetime, now: datetime) -> CacheSnapshot: Return the shared segment if it covers a time range.
+        _update_cache(start_time: datetime = None, end_time: datetime = None, verify_cert: bool = False, streaming: bool = False, tags: list = None) -> tuple: Fetch the sub-intervals missing in the cache and merge them into cache and aggregation pyramid.
+        _requested_tags(tags: list = None) -> list: Validate the tags of a request.
+        _publish(): Build the snapshot of the current cache and swap it in.
+        _insert_frame(df: pd.DataFrame): Insert the columns of a retrieved DataFrame into the store.
+        _update_pyramid(start_time: datetime, end_time: datetime, tags: list): Recompute the buckets of the aggregation pyramid overlapping a time range.
+        _covered(snapshot: CacheSnapshot, tags: list, start_time: datetime, end_time: datetime, now: datetime) -> bool: Check whether a snapshot holds a time range.
+        _enforce_budget(now: datetime, protected: tuple = None): Evict cold time buckets beyond the byte budget.
+        _apply_retention(now: datetime): Remove data older than CACHE_STORAGE_DURATION_HOURS from the cache and compress data older than the hot tail.
 
     Attributes:
         base_url (str): The base URL of the OSI PI system.
         auth (requests.auth.HTTPBasicAuth): The authentication object for requests to the OSI PI system.
+        session (requests.Session): The pooled keep-alive session used for all requests to the OSI PI system.
         timezone (pytz.timezone): The timezone of the OSI PI system.
-        request_timeout_seconds (int): The timeout for requests to the OSI PI system in seconds.
+        request_timeout_seconds (float): The read timeout of requests to the OSI PI system in seconds.
+        request_retries (int): The number of retries of a failed request.
+        backoff_seconds (float): The maximum delay before the first retry.
+        circuit_breaker (CircuitBreaker): Rejects requests while the OSI PI system is unhealthy, reads are served from the cache meanwhile.
+        request_window (timedelta): The length of the time windows long time ranges are split into.
+        tags_per_request (int): The maximum number of WebIDs sent in a single request.
+        max_count (int): The maximum number of values per stream and request.
+        request_workers (int): The number of chunks requested concurrently.
         webid_mapping (dict): A mapping of object names to their corresponding WebIDs.
-        cached_data (pd.DataFrame): A Pandas DataFrame containing cached data from the OSI PI system.
+        store (TimeSeriesStore): The array-backed store containing cached data from the OSI PI system.
+        hot_tail (timedelta): The length of the live tail kept uncompressed if compression is enabled.
+        coverage (dict): A mapping of object names to the IntervalSet of time ranges the cache holds complete data for.
+        tile_cache (TileCache): The on-disk tile cache shared by all worker processes, None if disabled.
+        pyramid (AggregationPyramid): The pre-aggregated resolution levels of the cached data.
+        cache_policy (CachePolicy): The byte budget and eviction policy of the cache.
+        snapshot (CacheSnapshot): The immutable view of the cache all reads are served from, replaced after every change.
+        shared_segment (SharedSegment): The memory-mapped cache segment shared by all worker processes, None if disabled.
+        in_flight (InFlightRegistry): The intervals per tag currently fetched from the OSI PI system, shared by concurrent requests.
+        checkpoint (CacheCheckpoint): The file the cache is saved to and restored from, None if disabled.
+        local_history (LocalHistory): The readings ingested into the local database, None if disabled.
     """
-    def __init__(self, base_url: str, username: str, password: str, timezone: str = TIMEZONE, request_timeout_seconds: int = 120):
+    def __init__(self, base_url: str, username: str, password: str, timezone: str = TIMEZONE, request_timeout_seconds: float = OSI_PI_REQUEST_TIMEOUT_SECONDS, tile_cache_directory: str = OSI_PI_TILE_CACHE_DIRECTORY, pool_size: int = OSI_PI_CONNECTION_POOL_SIZE,
+                 request_window_hours: float = OSI_PI_REQUEST_WINDOW_HOURS, tags_per_request: int = OSI_PI_REQUEST_TAGS_PER_REQUEST, max_count: int = OSI_PI_REQUEST_MAX_COUNT, request_workers: int = OSI_PI_REQUEST_WORKERS,
+                 aggregation_levels: list = OSI_PI_AGGREGATION_LEVELS, shared_segment_directory: str = OSI_PI_SHARED_SEGMENT_DIRECTORY, shared_segment_writer: bool = OSI_PI_SHARED_SEGMENT_WRITER,
+                 byte_budget: int = OSI_PI_CACHE_BYTE_BUDGET, compression: str = OSI_PI_CACHE_COMPRESSION, checkpoint_path: str = OSI_PI_CACHE_CHECKPOINT_PATH,
+                 local_history: bool = OSI_PI_LOCAL_HISTORY_ENABLED, request_retries: int = OSI_PI_REQUEST_RETRIES, backoff_seconds: float = OSI_PI_REQUEST_BACKOFF_SECONDS,
+                 circuit_breaker_failures: int = OSI_PI_CIRCUIT_BREAKER_FAILURES, circuit_breaker_reset_seconds: float = OSI_PI_CIRCUIT_BREAKER_RESET_SECONDS):
 
         # Check that base_url, username and password are provided
         if not base_url or base_url == '':
@@ -63,30 +189,115 @@ class OSIPIConnector:
         self.auth = HTTPBasicAuth(username.encode('utf-8'), password.encode('utf-8'))
         self.timezone = pytz.timezone(TIMEZONE)
         self.request_timeout_seconds = request_timeout_seconds
+        self.request_retries = max(request_retries, 0)
+        self.backoff_seconds = backoff_seconds
+        self.circuit_breaker = CircuitBreaker(failure_threshold=circuit_breaker_failures, reset_timeout_seconds=circuit_breaker_reset_seconds)
+        self.request_window = timedelta(hours=request_window_hours)
+        self.tags_per_request = tags_per_request
+        self.max_count = max_count
+        self.request_workers = request_workers
         self.webid_mapping = OSI_PI_WEBID_MAPPING
+        self.local_history = LocalHistory() if local_history else None
+
+        # All requests share one session, so TLS connections are kept alive and reused, responses are gzip compressed
+        self._adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session = requests.Session()
+        self.session.auth = self.auth
+        self.session.headers.update({'Accept': 'application/json', 'Accept-Encoding': 'gzip'})
+        self.session.mount('https://', self._adapter)
+        self.session.mount('http://', self._adapter)
+        self._request_stats = {'requests': 0, 'retries': 0, 'failed_requests': 0, 'bytes_received': 0}
+        self._request_stats_lock = threading.Lock()
+
+        self.tile_cache = None
+        if tile_cache_directory:
+            self.tile_cache = TileCache(
+                directory=tile_cache_directory,
+                bucket_minutes=OSI_PI_TILE_CACHE_BUCKET_MINUTES,
+                retention_hours=CACHE_STORAGE_DURATION_HOURS,
+            )
+
+        # The cache starts empty or from the checkpoint, instantiation does no requests. Call warm_up to fill it with the current charge.
+        self.store = TimeSeriesStore(compression=compression or None)
+        self.hot_tail = timedelta(hours=OSI_PI_CACHE_HOT_TAIL_HOURS)
+        self.coverage = {object_name: IntervalSet() for object_name in OSI_PI_PARAMETERS_REQUESTED}
+        self.pyramid = AggregationPyramid(aggregation_levels)
+        self.cache_policy = CachePolicy(byte_budget=byte_budget)
+        # The writer lock, only the thread holding it changes store, coverage and pyramid and publishes the next snapshot.
+        # Readers use the current snapshot without locking. It is not held during requests, concurrent requests for the
+        # same missing intervals are coalesced through the registry of in-flight fetches instead
+        self._cache_lock = threading.RLock()
+        self.in_flight = InFlightRegistry()
+        self.shared_segment = SharedSegment(shared_segment_directory, writer=shared_segment_writer) if shared_segment_directory else None
+        self.shared_segment_max_staleness = timedelta(seconds=OSI_PI_SHARED_SEGMENT_MAX_STALENESS_SECONDS)
+        self._segment_lock = threading.Lock()
+        self._segment_version = 0
+        self._segment_published_at = None
+        self.snapshot = None
+        self._publish()
+
+        self.checkpoint = CacheCheckpoint(checkpoint_path) if checkpoint_path else None
+        self._checkpoint_version = 0
+        self._checkpoint_saved_at = time.monotonic()
+        if self.checkpoint is not None:
+            try:
+                self.restore_checkpoint()
+            except ValueError:
+                logger.exception('Restoring the cache checkpoint failed, starting with an empty cache')
 
-        # On instantiation, the current time is set as the start_timestamp
-        start_timestamp = datetime.now(self.timezone)
-        end_timestamp = self._generate_batch_start_timestamp()
-        self.cached_data = self._batch_retriev_data(
-            start_time=start_timestamp, 
-            end_time = end_timestamp,
+    def fetch_range(self, start_time: datetime, end_time: datetime, verify_cert: bool = False, streaming: bool = False, tags: list = None) -> pd.DataFrame:
+        """
+        Retrieves the tags within [start_time, end_time] without reading or filling the in-memory cache, so ranges beyond
+        its retention can be retrieved as well. An empty DataFrame without columns is returned if a request failed.
+        """
+        tags = self._requested_tags(tags)
+        start_time, end_time, _ = self._normalize_range(start_time, end_time)
+        return self._retrieve_data(start_time=start_time, end_time=end_time, verify_cert=verify_cert, streaming=streaming, tags=tags)
+
+    def warm_up(self, verify_cert: bool = False, tags: list = None):
+        """
+        Fill the cache from the start of the current charge till now, for all tags if tags is not provided.
+        """
+        self.get_data(
+            start_time=self._generate_batch_start_timestamp(),
+            end_time=datetime.now(self.timezone),
+            verify_cert=verify_cert,
+            tags=tags,
         )
 
-    def _convert_timestamps(self, timestamp: datetime) -> str:
+    def prefetch(self, start_time: datetime, end_time: datetime, verify_cert: bool = False, tags: list = None) -> bool:
+        """
+        Fetches the parts of a time range missing in the cache, e.g. a window a dashboard session is likely to view
+        next. Unlike get_data the range does not count as a read for the cache policy and nothing is requested while
+        the circuit breaker is open. Returns whether the range is cached afterwards.
+        """
+        tags = self._requested_tags(tags)
+        if self.circuit_breaker.is_open():
+            return self.is_cached(start_time, end_time, tags=tags)
+        start_time, end_time, now = self._update_cache(start_time, end_time, verify_cert=verify_cert, tags=tags)
+        return self._covered(self.snapshot, tags, start_time, end_time, now)
+
+    def is_cached(self, start_time: datetime, end_time: datetime, tags: list = None) -> bool:
+        """
+        Checks whether get_data serves the time range of the tags from the cache or the shared segment without requests.
+        """
+        tags = self._requested_tags(tags)
+        start_time, end_time, now = self._normalize_range(start_time, end_time)
+        return self._shared_snapshot(tags, start_time, end_time, now) is not None or self._covered(self.snapshot, tags, start_time, end_time, now)
+
+    def _convert_timestamps(self, timestamp: datetime, round_down: bool = False) -> str:
         """
-        Convert a timestamp to the correct format for the OSI PI system.
-        OSI-PI syntax is * equals now, *-1h equals one hour ago, *-1d equals one day ago, etc.
+        Convert a timestamp to the correct format for the OSI PI system, an absolute ISO 8601 UTC time in whole seconds,
+        e.g. 2023-10-01T06:00:00Z. By default the timestamp is rounded up to the next second, with round_down=True it is
+        rounded down, which is used for the start of a range, so the requested range always contains the given range.
         """
         # If the timestamp is naive, assume it is in the timezone of the OSI PI system
         if timestamp.tzinfo is None or timestamp.tzinfo.utcoffset(timestamp) is None:
-            timestamp = timestamp.replace(tzinfo=self.timezone)
+            timestamp = self.timezone.localize(timestamp)
 
-        # Calculate the difference in hours
-        now = datetime.now(self.timezone)
-        difference_in_hours = int((now - timestamp).total_seconds() / 3600)
-
-        return f'*-{difference_in_hours}h'
+        timestamp = pd.Timestamp(timestamp).tz_convert('UTC')
+        timestamp = timestamp.floor('s') if round_down else timestamp.ceil('s')
+        return timestamp.strftime('%Y-%m-%dT%H:%M:%SZ')
 
     def _generate_batch_start_timestamp(self, charge_hour_start: int = CHARGE_START_HOUR) -> datetime:
         """
@@ -97,101 +308,657 @@ class OSIPIConnector:
         timestamp = timestamp.replace(hour=charge_hour_start, minute=0, second=0, microsecond=0)
         return timestamp
 
-    def _batch_retriev_data(self, start_time: datetime, end_time: datetime, verify_cert: bool = False) -> pd.DataFrame:
+    def _batch_retriev_data(self, start_time: datetime, end_time: datetime, verify_cert: bool = False, streaming: bool = False, tags: list = None) -> pd.DataFrame:
         """
         Retrieve multiple data-ranges for same timespan and returns a Pandas DataFrame.
+        The time range is split into windows of request_window_hours and the tags into groups of tags_per_request,
+        the resulting chunks are requested concurrently and stitched into one DataFrame. Only the given tags are
+        requested, all OSI_PI_PARAMETERS_REQUESTED if tags is not provided.
+        If chunks failed, the result is partial: the tags of a failed chunk have no column, all other tags are complete.
+        An empty DataFrame without columns is returned if the chunks of all tags failed.
+        """
+        tags = tags or OSI_PI_PARAMETERS_REQUESTED
+
+        # Split the time range into windows and the tags into groups, every combination is one chunk
+        window_start, window_end = min(start_time, end_time), max(start_time, end_time)
+        windows = []
+        while window_start < window_end:
+            windows.append((window_start, min(window_start + self.request_window, window_end)))
+            window_start = windows[-1][1]
+        tag_groups = [tags[i:i + self.tags_per_request] for i in range(0, len(tags), self.tags_per_request)]
+        chunks = [(object_names, window) for window in windows for object_names in tag_groups]
+
+        # Fetch the chunks in a bounded thread pool
+        if len(chunks) > 1:
+            with ThreadPoolExecutor(max_workers=min(self.request_workers, len(chunks))) as executor:
+                chunk_results = list(executor.map(lambda chunk: self._retrieve_chunk(chunk[0], *chunk[1], verify_cert=verify_cert, streaming=streaming), chunks))
+        else:
+            chunk_results = [self._retrieve_chunk(object_names, *window, verify_cert=verify_cert, streaming=streaming) for object_names, window in chunks]
+
+        # The tags of a failed chunk are dropped from all windows, so every returned column is complete
+        failed_tags = {object_name for (object_names, _), chunk_result in zip(chunks, chunk_results) if chunk_result is None for object_name in object_names}
+        if failed_tags:
+            logger.warning('Requesting %s from %s till %s failed', ', '.join(sorted(failed_tags)), start_time.isoformat(), end_time.isoformat())
+        if failed_tags.issuperset(tags):
+            return pd.DataFrame() # Return empty DataFrame if all requests failed
+
+        # Stitch the parts of all chunks per tag
+        stream_parts = {}
+        for chunk_result in chunk_results:
+            for object_name, parts in (chunk_result or {}).items():
+                if object_name not in failed_tags:
+                    stream_parts.setdefault(object_name, []).extend(parts)
+
+        # Convert into Pandas DataFrame
+        return frame_from_arrays({object_name: merge_stream_arrays(parts) for object_name, parts in stream_parts.items()})
+
+    def _retrieve_chunk(self, object_names: list, start_time: datetime, end_time: datetime, verify_cert: bool = False, streaming: bool = False) -> dict:
+        """
+        Retrieve one chunk of tags and time range and returns a dict mapping the tag names to lists of (timestamps, values) parts.
+        Streams which were truncated at max_count are paged forward from their last returned timestamp.
+        Returns None if a request failed.
         """
-        # Create timestamps
-        start_time_converted = self._convert_timestamps(start_time)
+        start_time_converted = self._convert_timestamps(start_time, round_down=True)
         end_time_converted = self._convert_timestamps(end_time)
 
+        stream_arrays = self._request_recorded(object_names, start_time_converted, end_time_converted, verify_cert=verify_cert, streaming=streaming)
+        if stream_arrays is None:
+            return None
+
+        stream_parts = {}
+        for object_name, page in stream_arrays.items():
+            parts = stream_parts[object_name] = [page]
+            while len(page[0]) >= self.max_count:
+                last_timestamp = page[0][-1]
+                page_start = self._convert_timestamps(pd.Timestamp(int(last_timestamp), tz='UTC'), round_down=True)
+                page = self._request_recorded([object_name], page_start, end_time_converted, verify_cert=verify_cert, streaming=streaming)
+                if page is None:
+                    return None
+                page = page.get(object_name, (np.empty(0, dtype='int64'), np.empty(0, dtype='float64')))
+                # Stop if the page does not advance, e.g. when more than max_count values share a timestamp
+                if len(page[0]) and page[0][-1] == last_timestamp:
+                    break
+                parts.append(page)
+        return stream_parts
+
+    def _request_recorded(self, object_names: list, start_time_converted: str, end_time_converted: str, verify_cert: bool = False, streaming: bool = False) -> dict:
+        """
+        Send a single streamsets/recorded request and returns a dict mapping the tag names to (timestamps, values) arrays.
+        With streaming=True the response is decoded incrementally while it is received instead of building the complete
+        JSON tree first, which keeps the peak memory of large responses proportional to the resulting arrays.
+
+        Connection errors, timeouts and transient error responses are retried up to request_retries times after a
+        randomized, exponentially growing delay. No request is sent while the circuit breaker is open.
+        Returns None if the request failed, it never raises for errors of the OSI PI system.
+        """
         # Generate a list of tuples for the params of the request. the WebID field will have multiple values.
-        params = [(('webid', self.webid_mapping.get(object_name, None))) for object_name in OSI_PI_PARAMETERS_REQUESTED]
-        params.append(('startTime', start_time_converted,)) 
+        params = [(('webid', self.webid_mapping.get(object_name, None))) for object_name in object_names]
+        params.append(('startTime', start_time_converted,))
         params.append(('endTime', end_time_converted,))
+        params.append(('maxCount', self.max_count,))
+        params.append(('selectedFields', RECORDED_SELECTED_FIELDS,))
 
         # Construct and validate the URL
         url = f"{self.base_url}/piwebapi/streamsets/recorded"
 
         # Fetch data from API
-        response = requests.get(url, params=params, auth=self.auth, verify=verify_cert, timeout = self.request_timeout_seconds)
-        if response.status_code == 200:
-            response_object = response.json()
-
-            # Unpack the response into a dict and convert into pandas DataFrame
-            response_dict = {item.get('Name', None): {pd.Timestamp(entry.get('Timestamp',None)) : entry.get('Value',None) for entry in item.get('Items', [])} for item in response_object.get('Items', [])}
-
-            # Convert into Pandas DataFrame
-            df_request = pd.DataFrame(response_dict)
-            df_request.index = pd.to_datetime(df_request.index)
-            df_request.index = df_request.index.tz_convert(TIMEZONE)
-            return df_request
-        else:
-            return pd.DataFrame() # Return empty DataFrame if nothing was returned
+        for attempt in range(self.request_retries + 1):
+            if attempt:
+                # Concurrent failures may have opened the circuit meanwhile, then the remaining retries are skipped
+                if self.circuit_breaker.is_open():
+                    break
+                time.sleep(self._backoff_delay(attempt))
+                with self._request_stats_lock:
+                    self._request_stats['retries'] += 1
+            if not self.circuit_breaker.allow_request():
+                break
+            response = None
+            try:
+                response = self.session.get(url, params=params, verify=verify_cert, timeout=(OSI_PI_REQUEST_CONNECT_TIMEOUT_SECONDS, self.request_timeout_seconds), stream=streaming)
+                if response.status_code != 200:
+                    self._record_response(response)
+                    if response.status_code not in RETRYABLE_STATUS_CODES:
+                        # The OSI PI system is up but rejects the request, e.g. an unknown WebID, a retry would fail the same way
+                        self.circuit_breaker.record_success()
+                        logger.warning('Request to %s failed with status %d', url, response.status_code)
+                        break
+                    logger.warning('Request to %s failed with status %d (attempt %d)', url, response.status_code, attempt + 1)
+                    self.circuit_breaker.record_failure()
+                    continue
+                if streaming:
+                    # PI never returns more than maxCount values per stream, so the preallocated buffers do not need to grow
+                    stream_arrays = StreamingDecoder(initial_capacity=self.max_count).decode(response.iter_content(chunk_size=STREAMING_CHUNK_SIZE))
+                    self._record_response(response)
+                else:
+                    self._record_response(response)
+                    response_object = response.json()
+                    stream_arrays = {item.get('Name', None): parse_stream_items(item.get('Items', []))[:2] for item in response_object.get('Items', [])}
+            except (requests.RequestException, ValueError) as exception:
+                logger.warning('Request to %s failed: %r (attempt %d)', url, exception, attempt + 1)
+                self.circuit_breaker.record_failure()
+                continue
+            finally:
+                # A streamed body that failed part-way is not read to the end, closing releases its connection to the pool
+                if response is not None:
+                    response.close()
+            self.circuit_breaker.record_success()
+            return stream_arrays
+
+        with self._request_stats_lock:
+            self._request_stats['failed_requests'] += 1
+        return None
+
+    def _backoff_delay(self, retry: int) -> float:
+        """
+        Returns the delay before the given retry (starting at 1): exponential backoff with full jitter, a random delay
+        between 0 and backoff_seconds * 2 ** (retry - 1), at most OSI_PI_REQUEST_BACKOFF_MAX_SECONDS. The jitter spreads
+        the retries of concurrent requests and worker processes, so they do not hit a recovering server at once.
+        """
+        return random.uniform(0, min(self.backoff_seconds * 2 ** (retry - 1), OSI_PI_REQUEST_BACKOFF_MAX_SECONDS))
+
+    def _record_response(self, response: requests.Response):
+        """
+        Count a response and the bytes received on the wire, which are the compressed bytes for gzip encoded responses.
+        """
+        try:
+            bytes_received = response.raw.tell()
+        except AttributeError:
+            bytes_received = len(response.content)
+        with self._request_stats_lock:
+            self._request_stats['requests'] += 1
+            self._request_stats['bytes_received'] += bytes_received
+
+    def get_request_stats(self) -> dict:
+        """
+        Returns counters of the requests sent, the retries, the requests which failed after all retries, the bytes
+        received and the connections opened and reused by the session, and the stats of the circuit breaker.
+        """
+        pools = self._adapter.poolmanager.pools
+        connections_opened = sum(pools[key].num_connections for key in pools.keys())
+        with self._request_stats_lock:
+            request_stats = dict(self._request_stats)
+        request_stats['connections_opened'] = connections_opened
+        request_stats['connections_reused'] = max(request_stats['requests'] - connections_opened, 0)
+        request_stats['circuit_breaker'] = self.circuit_breaker.get_stats()
+        return request_stats
+
+    def save_checkpoint(self) -> int:
+        """
+        Saves the points and coverage of the current snapshot into the checkpoint file, returns the size of the file.
+        """
+        if self.checkpoint is None:
+            raise ValueError("No checkpoint_path configured")
+        snapshot = self.snapshot
+        size = self.checkpoint.save(snapshot, {object_name: self.webid_mapping[object_name] for object_name in OSI_PI_PARAMETERS_REQUESTED}, datetime.now(timezone.utc))
+        self._checkpoint_version, self._checkpoint_saved_at = snapshot.version, time.monotonic()
+        return size
+
+    def save_checkpoint_if_due(self, interval_seconds: float = OSI_PI_CACHE_CHECKPOINT_INTERVAL_SECONDS) -> bool:
+        """
+        Saves the checkpoint if the cache changed since the last checkpoint and that is older than interval_seconds,
+        returns whether it was saved. Readers of the shared segment leave the checkpoint to the writer.
+        """
+        if self.checkpoint is None or (self.shared_segment is not None and not self.shared_segment.writer):
+            return False
+        if self.snapshot.version == self._checkpoint_version or time.monotonic() - self._checkpoint_saved_at < interval_seconds:
+            return False
+        self.save_checkpoint()
+        return True
+
+    def restore_checkpoint(self) -> list:
+        """
+        Restores the points and coverage of the tags whose WebID did not change from the checkpoint file and returns
+        them. Data outside the retention is dropped, the gap since the checkpoint is fetched by the next request.
+        """
+        if self.checkpoint is None:
+            raise ValueError("No checkpoint_path configured")
+        checkpoint = self.checkpoint.load({object_name: self.webid_mapping[object_name] for object_name in OSI_PI_PARAMETERS_REQUESTED})
+        if checkpoint is None:
+            return []
+        saved_at, arrays, coverage = checkpoint
+        with self._cache_lock:
+            for object_name, (timestamps, values) in arrays.items():
+                self.store.insert(object_name, timestamps, values)
+            for object_name, interval_set in coverage.items():
+                for start_time, end_time in interval_set:
+                    self.coverage[object_name].add(start_time.astimezone(self.timezone), end_time.astimezone(self.timezone))
+            now = datetime.now(self.timezone)
+            self._apply_retention(now)
+            restored_tags = [object_name for object_name in coverage if self.coverage[object_name]]
+            for object_name in restored_tags:
+                intervals = self.coverage[object_name].intervals
+                self._update_pyramid(intervals[0][0], intervals[-1][1], [object_name])
+            self._publish()
+            self._checkpoint_version = self.snapshot.version
+        self.publish_shared_segment_if_due(interval_seconds=0)
+        logger.info('Restored %d tags from the cache checkpoint of %s', len(restored_tags), saved_at.isoformat())
+        return restored_tags
+
+    def publish_shared_segment_if_due(self, interval_seconds: float = OSI_PI_SHARED_SEGMENT_PUBLISH_INTERVAL_SECONDS) -> bool:
+        """
+        Writes the current snapshot into the shared segment if the cache changed since it was last written and that is
+        older than interval_seconds, returns whether it was written. Only the writer of the shared segment publishes.
+        The segment is written without holding the cache lock by one thread at a time, other threads do not wait for it.
+        """
+        if self.shared_segment is None or not self.shared_segment.writer or not self._segment_lock.acquire(blocking=False):
+            return False
+        try:
+            snapshot = self.snapshot
+            # The empty cache of a restarted writer does not replace the segment the readers are using
+            if snapshot.version in (0, self._segment_version):
+                return False
+            if self._segment_published_at is not None and time.monotonic() - self._segment_published_at < interval_seconds:
+                return False
+            self.shared_segment.write(snapshot)
+            self._segment_version, self._segment_published_at = snapshot.version, time.monotonic()
+            return True
+        finally:
+            self._segment_lock.release()
+
+    def close(self):
+        """
+        Closes all pooled connections to the OSI PI system, publishes the pending changes and releases the shared segment.
+        """
+        self.session.close()
+        if self.shared_segment is not None:
+            self.publish_shared_segment_if_due(interval_seconds=0)
+            self.shared_segment.close()
+
+    def _retrieve_data(self, start_time: datetime, end_time: datetime, verify_cert: bool = False, streaming: bool = False, tags: list = None) -> pd.DataFrame:
+        """
+        Retrieve data through the on-disk tile cache and returns a Pandas DataFrame.
+        Buckets which are complete on disk are memory-mapped, missing buckets are fetched while holding their file lock
+        so concurrent workers never request the same bucket twice. The part of the range that is not settled yet is always requested.
+        Like _batch_retriev_data the result is partial if requests failed, the tags of failed requests have no column,
+        and an empty DataFrame without columns is returned if the requests of all tags failed.
+        The part of the range held by the local history is read from the database, only the rest goes this way.
+        """
+        tags = tags or OSI_PI_PARAMETERS_REQUESTED
+        if self.local_history is not None:
+            local_start, local_end = self.local_history.covered_range(tags)
+            if local_start is not None and local_start <= start_time < local_end:
+                df_local = self.local_history.frame(tags, start_time, min(end_time, local_end))
+                if end_time <= local_end:
+                    return df_local
+                df_remote = self._retrieve_data(local_end.to_pydatetime(), end_time, verify_cert=verify_cert, streaming=streaming, tags=tags)
+                if len(df_remote.columns) == 0:
+                    return df_remote
+                df_response = pd.concat([df_local[df_remote.columns], df_remote])
+                return df_response[~df_response.index.duplicated(keep='last')]
+
+        if self.tile_cache is None:
+            return self._batch_retriev_data(start_time=start_time, end_time=end_time, verify_cert=verify_cert, streaming=streaming, tags=tags)
+
+        start_time, end_time = pd.Timestamp(min(start_time, end_time)), pd.Timestamp(max(start_time, end_time))
+        now = datetime.now(self.timezone)
+        settled_until = self.tile_cache.settled_until(now)
+        buckets = self.tile_cache.bucket_starts(start_time, min(end_time, settled_until))
+
+        # Fetch the missing buckets, checking again once the lock is held as another worker may just have written them
+        failed_tags = set()
+        missing_buckets = self.tile_cache.missing_buckets(buckets, tags)
+        if missing_buckets:
+            with self.tile_cache.locked(missing_buckets):
+                missing_buckets = self.tile_cache.missing_buckets(missing_buckets, tags)
+                for run in self._contiguous_bucket_runs(missing_buckets):
+                    df_run = self._batch_retriev_data(
+                        start_time=run[0],
+                        end_time=run[-1] + self.tile_cache.bucket_size,
+                        verify_cert=verify_cert,
+                        streaming=streaming,
+                        tags=tags,
+                    )
+                    # Only the tags with a column are complete, the buckets of the other tags are retried on the next call
+                    if len(df_run.columns) > 0:
+                        self.tile_cache.write(run, df_run)
+                    failed_tags.update(object_name for object_name in tags if object_name not in df_run.columns)
+            self.tile_cache.prune(now)
+
+        # Assemble the memory-mapped tiles into a DataFrame
+        tags = [object_name for object_name in tags if object_name not in failed_tags]
+        df_response = frame_from_arrays({
+            object_name: merge_stream_arrays([(tile['timestamp'], tile['value']) for tile in tiles])
+            for object_name, tiles in self.tile_cache.read(buckets, tags).items()
+        })
+
+        # Request the part of the range which is not settled yet directly from the OSI PI system
+        if end_time > settled_until:
+            df_open = self._batch_retriev_data(
+                start_time=max(start_time, settled_until),
+                end_time=end_time,
+                verify_cert=verify_cert,
+                streaming=streaming,
+                tags=tags,
+            )
+            failed_tags.update(object_name for object_name in tags if object_name not in df_open.columns)
+            tags = [object_name for object_name in tags if object_name not in failed_tags]
+            df_response = pd.concat([df_response[tags], df_open[tags]]).sort_index() if not df_response.empty else df_open[tags]
 
-    def get_data(self, start_time: datetime = None, end_time: datetime = None, verify_cert: bool = False) -> pd.DataFrame:
+        if not tags:
+            return pd.DataFrame()
+        if df_response.empty:
+            return df_response
+        return df_response[(df_response.index >= start_time) & (df_response.index <= end_time)]
+
+    def _contiguous_bucket_runs(self, buckets: list) -> list:
+        """
+        Group bucket starts into runs of adjacent buckets, so that every run is fetched with a single request.
+        """
+        runs = []
+        for bucket in sorted(buckets):
+            if runs and bucket - runs[-1][-1] == self.tile_cache.bucket_size:
+                runs[-1].append(bucket)
+            else:
+                runs.append([bucket])
+        return runs
+
+    def get_data(self, start_time: datetime = None, end_time: datetime = None, verify_cert: bool = False, streaming: bool = False, max_points: int = None, tags: list = None) -> pd.DataFrame:
         """
         Retrieves data from OSI PI system for a given time range.
+        Only the sub-intervals which are not covered by the cache are requested from the OSI PI system and merged into the cache.
+        If requests fail or the circuit breaker is open, the data cached so far is returned, i.e. the DataFrame may end
+        before end_time or miss the tags of failed requests. staleness_seconds tells how old the cached data is.
+        With the local history enabled, ranges older than the retention of the cache are read from the local database.
 
         Args:
             start_time (datetime): Start time of the time range. If not provided, the default start time is generated.
             end_time (datetime): End time of the time range. If not provided, the current time is used.
             verify_cert (bool): Whether to verify the SSL certificate of the PI server.
+            streaming (bool): Whether to decode the responses incrementally, which lowers the peak memory of long backfills.
+            max_points (int): If provided, the response is reduced to at most max_points rows with LTTB, shared by the columns, so the size of the response does not grow with the length of the time range.
+            tags (list): The tags to retrieve, only these are requested and returned. If not provided, all OSI_PI_PARAMETERS_REQUESTED.
 
         Returns:
             pd.DataFrame: A Pandas DataFrame containing the requested data.
         """
+        tags = self._requested_tags(tags)
+        start_time, end_time, now = self._normalize_range(start_time, end_time)
+
+        # Ranges older than the retention of the cache are served from the local history if it holds them completely
+        df_history = None
+        retention_start = now - timedelta(hours=CACHE_STORAGE_DURATION_HOURS)
+        if self.local_history is not None and start_time < retention_start:
+            history_end = min(end_time, retention_start)
+            local_start, local_end = self.local_history.covered_range(tags)
+            if local_start is not None and local_start <= start_time and history_end <= local_end:
+                df_history = self.local_history.frame(tags, start_time, history_end)
+                start_time = history_end
+
+        snapshot = self._shared_snapshot(tags, start_time, end_time, now)
+        self.cache_policy.record_access(tags, start_time, min(end_time, now), hit=snapshot is not None or self._covered(self.snapshot, tags, start_time, end_time, now))
+        if snapshot is None:
+            self._update_cache(start_time, end_time, verify_cert=verify_cert, streaming=streaming, tags=tags)
+            snapshot = self.snapshot
+        df_response = snapshot.store.frame(tags, start_time, end_time)
+        if df_history is not None:
+            df_response = pd.concat([df_history, df_response])
+            df_response = df_response[~df_response.index.duplicated(keep='last')]
+
+        if max_points:
+            df_response = downsample_frame(df_response, max_points)
+        return df_response
+
+    def get_aggregated_data(self, start_time: datetime = None, end_time: datetime = None, max_points: int = 1000, statistic: str = 'mean', verify_cert: bool = False, tags: list = None) -> pd.DataFrame:
+        """
+        Retrieves data for a given time range at the finest resolution with at most max_points points per tag.
+        The raw data is returned if it fits into the budget, otherwise one statistic of the finest fitting level of the
+        aggregation pyramid, indexed by the bucket starts. The cost does not depend on the length of the time range.
+
+        Args:
+            start_time (datetime): Start time of the time range. If not provided, the default start time is generated.
+            end_time (datetime): End time of the time range. If not provided, the current time is used.
+            max_points (int): The maximum number of points per tag.
+            statistic (str): One of 'min', 'max', 'mean', 'count' and 'last'.
+            verify_cert (bool): Whether to verify the SSL certificate of the PI server.
+            tags (list): The tags to retrieve. If not provided, all OSI_PI_PARAMETERS_REQUESTED.
+
+        Returns:
+            pd.DataFrame: A Pandas DataFrame containing the requested data.
+        """
+        if statistic not in AGGREGATE_STATISTICS:
+            raise ValueError(f"statistic must be one of {', '.join(AGGREGATE_STATISTICS)}")
+        tags = self._requested_tags(tags)
+        start_time, end_time, now = self._normalize_range(start_time, end_time)
+        self.cache_policy.record_access(tags, start_time, min(end_time, now), hit=self._covered(self.snapshot, tags, start_time, end_time, now))
+        self._update_cache(start_time, end_time, verify_cert=verify_cert, tags=tags)
+        snapshot = self.snapshot
+        raw_counts = {object_name: snapshot.store.count(object_name, start_time, end_time) for object_name in tags}
+        level = self.pyramid.select_level(tags, start_time, end_time, max_points, raw_counts, aggregates=snapshot.aggregates)
+        if level < 0:
+            return snapshot.store.frame(tags, start_time, end_time)
+        arrays = {}
+        for object_name in tags:
+            buckets = self.pyramid.query(object_name, level, start_time, end_time, aggregates=snapshot.aggregates)
+            if statistic == 'mean':
+                values = buckets['sum'] / buckets['count']
+            else:
+                values = buckets[statistic].astype('float64')
+            arrays[object_name] = (buckets['timestamp'], values)
+        return frame_from_arrays(arrays, timezone=TIMEZONE)
+
+    def update_tail(self, verify_cert: bool = False, tags: list = None):
+        """
+        Fetches only the data after the end of the cached window, or the current charge if nothing is cached yet.
+        Used by the TailPoller to keep the live window current, returns the timestamp the tags are cached until.
+        If tags is not provided, the tags already in use are updated, all tags as long as the cache is empty.
+        """
+        tags = self._requested_tags(tags) if tags is not None else (self.tags_in_use() or list(OSI_PI_PARAMETERS_REQUESTED))
+        start_time = self.cached_until(tags) or self._generate_batch_start_timestamp()
+        self._update_cache(start_time, datetime.now(self.timezone), verify_cert=verify_cert, tags=tags)
+        return self.cached_until(tags)
+
+    def tags_in_use(self) -> list:
+        """
+        Returns the tags which have been requested before and hold cached data.
+        """
+        return [object_name for object_name, interval_set in self.snapshot.coverage.items() if interval_set]
+
+    def cached_until(self, tags: list = None) -> datetime:
+        """
+        Returns the end of the most recent cached interval common to the tags (default: the tags in use), None if one
+        of the tags has no cached data or no tag is in use.
+        """
+        coverage = self.snapshot.coverage
+        tags = self.tags_in_use() if tags is None else tags
+        ends = [coverage[object_name].intervals[-1][1] for object_name in tags if coverage[object_name]]
+        if not ends or len(ends) < len(tags):
+            return None
+        return min(ends)
+
+    def staleness_seconds(self, tags: list = None) -> float:
+        """
+        Returns the age of the cached data in seconds, i.e. the time since the end of the cached window of the tags
+        (default: the tags in use), None if the cache is empty.
+        """
+        cached_until = self.cached_until(tags)
+        if cached_until is None:
+            return None
+        return (datetime.now(self.timezone) - cached_until).total_seconds()
+
+    def _requested_tags(self, tags: list = None) -> list:
+        """
+        Validates the tags of a request and returns them without duplicates, all OSI_PI_PARAMETERS_REQUESTED if not provided.
+        """
+        if tags is None:
+            return list(OSI_PI_PARAMETERS_REQUESTED)
+        unknown_tags = [object_name for object_name in tags if object_name not in self.coverage]
+        if unknown_tags:
+            raise ValueError(f"Unknown tags: {', '.join(unknown_tags)}")
+        return list(dict.fromkeys(tags))
+
+    def _normalize_range(self, start_time: datetime = None, end_time: datetime = None) -> tuple:
+        """
+        Returns the timezone aware (start_time, end_time, now), the start of the current charge and now if not provided.
+        """
+        now = datetime.now(self.timezone)
+        if start_time is None:
+            start_time = self._generate_batch_start_timestamp()
+        if end_time is None:
+            end_time = now
 
         # Make the start_time and end_time timezone aware
-        if start_time is not None and start_time.tzinfo is None:
-            start_time = start_time.replace(tzinfo=self.timezone)
-        if end_time is not None and end_time.tzinfo is None:
-            end_time = end_time.replace(tzinfo=self.timezone)
-
-        # Check if cache is initialized and fetch minimum and maximum timestamps
-        cache_has_data = False
-        if self.cached_data is not None and not self.cached_data.empty:
-            cache_timestamp_min = self.cached_data.index.min().to_pydatetime()
-            cache_timestamp_max = self.cached_data.index.max().to_pydatetime()
-            cache_has_data = True
-
-        # If cache has no data, initialize it with the current time
-        if not cache_has_data:
-            self.cached_data = self._batch_retriev_data(
-                start_time=start_time, 
-                end_time = end_time,
-                verify_cert=verify_cert,
-            )
-            df_response = self.cached_data
-        
-        # Fetch data that is not yet in the cache and merge it into the cache
-        elif cache_has_data:
-            # If older datat is requested than is in the cache, fetch it
-            if start_time < cache_timestamp_min:
-                self.cached_data = pd.concat([
-                    self._batch_retriev_data(
-                        start_time=start_time, 
-                        end_time = cache_timestamp_min,
-                        verify_cert=verify_cert,
-                    ),
-                    self.cached_data,
-                ]).sort_index()
-
-            # Fetch the latest data from last entry in the cache till the end_time
-            if end_time > cache_timestamp_max:
-                self.cached_data = pd.concat([
-                    self.cached_data,
-                    self._batch_retriev_data(
-                        start_time=cache_timestamp_max, 
-                        end_time = end_time,
-                        verify_cert=verify_cert,
-                    ),
-                ]).sort_index()
+        if start_time.tzinfo is None:
+            start_time = self.timezone.localize(start_time)
+        if end_time.tzinfo is None:
+            end_time = self.timezone.localize(end_time)
+        return start_time, end_time, now
+
+    def _covered(self, snapshot: CacheSnapshot, tags: list, start_time: datetime, end_time: datetime, now: datetime) -> bool:
+        """
+        Checks whether the snapshot holds the time range for all tags. Data after now can not exist yet.
+        """
+        if start_time >= min(end_time, now):
+            return True
+        return not any(snapshot.missing(object_name, start_time, min(end_time, now)) for object_name in tags)
+
+    def _shared_snapshot(self, tags: list, start_time: datetime, end_time: datetime, now: datetime) -> CacheSnapshot:
+        """
+        Returns the snapshot of the shared segment if it holds the time range for all tags, up to the maximum staleness
+        at the end of the range. Returns None in the writer process, if the segment is disabled or does not cover the range.
+        """
+        if self.shared_segment is None or self.shared_segment.writer:
+            return None
+        snapshot = self.shared_segment.read()
+        if snapshot is None:
+            return None
+        covered_end = max(start_time, min(end_time, now) - self.shared_segment_max_staleness)
+        if any(object_name not in snapshot.coverage or snapshot.missing(object_name, start_time, covered_end) for object_name in tags):
+            return None
+        return snapshot
+
+    def _update_cache(self, start_time: datetime = None, end_time: datetime = None, verify_cert: bool = False, streaming: bool = False, tags: list = None) -> tuple:
+        """
+        Fetches the sub-intervals of the time range which are not covered by the cache for the tags and merges them into
+        the cache and the aggregation pyramid. Returns the timezone aware (start_time, end_time, now).
+
+        Sub-intervals which are already being fetched by another thread are not requested again, the call waits for
+        these fetches instead, so concurrent calls with overlapping ranges send one request per missing interval.
+        If the current snapshot covers the time range, the call returns without taking the lock. The changes are written
+        into the shared segment after the lock was released, if that is due.
+        """
+        tags = tags if tags is not None else OSI_PI_PARAMETERS_REQUESTED
+        start_time, end_time, now = self._normalize_range(start_time, end_time)
+
+        if self._covered(self.snapshot, tags, start_time, end_time, now):
+            return start_time, end_time, now
+
+        # Group the tags by their missing sub-intervals nobody fetches yet, so tags with the same coverage share requests
+        missing_groups, pending_fetches, own_fetches = {}, set(), []
+        with self._cache_lock:
+            for object_name in tags:
+                missing_intervals, in_flight_fetches = self.in_flight.claim(object_name, self.coverage[object_name].missing(start_time, min(end_time, now)))
+                pending_fetches.update(in_flight_fetches)
+                if missing_intervals:
+                    missing_groups.setdefault(tuple(missing_intervals), []).append(object_name)
+            for missing_intervals, group_tags in missing_groups.items():
+                own_fetches.extend(self.in_flight.register(group_tags, missing_start, missing_end) for missing_start, missing_end in missing_intervals)
+
+        # Fetch the missing sub-intervals without holding the lock and merge them into the cache
+        try:
+            for fetch in own_fetches:
+                df_missing = self._retrieve_data(
+                    start_time=fetch.start_time,
+                    end_time=fetch.end_time,
+                    verify_cert=verify_cert,
+                    streaming=streaming,
+                    tags=fetch.object_names,
+                )
+                # Tags without column failed, their interval stays uncovered and is fetched again next time
+                fetched_tags = [object_name for object_name in fetch.object_names if object_name in df_missing.columns]
+                with self._cache_lock:
+                    if fetched_tags:
+                        self._insert_frame(df_missing[fetched_tags])
+                        for object_name in fetched_tags:
+                            self.coverage[object_name].add(fetch.start_time, fetch.end_time)
+                        self._update_pyramid(fetch.start_time, fetch.end_time, fetched_tags)
+                        self._apply_retention(now)
+                        self._enforce_budget(now, protected=(tags, start_time, end_time))
+                        self._publish()
+                    self.in_flight.complete(fetch, succeeded=len(fetched_tags) == len(fetch.object_names))
+        finally:
+            # Never leave waiting threads behind, e.g. if a request raised
+            with self._cache_lock:
+                for fetch in own_fetches:
+                    if fetch.succeeded is None:
+                        self.in_flight.complete(fetch, succeeded=False)
+        if own_fetches:
+            self.publish_shared_segment_if_due()
+
+        # Wait for the fetches of other threads this call depends on
+        for fetch in pending_fetches:
+            fetch.wait()
 
-            df_response = self.cached_data[(self.cached_data.index >= start_time) & (self.cached_data.index <= end_time)]
+        return start_time, end_time, now
 
-            # Clear the cache if it is older than CACHE_STORAGE_DURATION_HOURS
-            cache_cut_off_timestamp = datetime.now(self.timezone) - timedelta(hours=CACHE_STORAGE_DURATION_HOURS)
-            self.cached_data = self.cached_data[self.cached_data.index >= cache_cut_off_timestamp]
-        
-        return df_response
\ No newline at end of file
+    def _publish(self):
+        """
+        Builds the snapshot of the current cache and swaps it in, must be called by the writer holding the lock.
+        The shared segment is written by publish_shared_segment_if_due, after the lock was released.
+        """
+        self.snapshot = CacheSnapshot(
+            store=self.store.snapshot,
+            coverage={object_name: interval_set.copy() for object_name, interval_set in self.coverage.items()},
+            aggregates=self.pyramid.aggregates,
+            version=self.snapshot.version + 1 if self.snapshot is not None else 0,
+        )
+
+    def _insert_frame(self, df: pd.DataFrame):
+        """
+        Insert the columns of a retrieved DataFrame into the store, points already cached are dropped.
+        """
+        df = df.sort_index()
+        timestamps = df.index.as_unit('ns').asi8
+        for object_name in df.columns:
+            self.store.insert(object_name, timestamps, df[object_name].to_numpy(dtype='float64', na_value=np.nan))
+
+    def _update_pyramid(self, start_time: datetime, end_time: datetime, tags: list):
+        """
+        Recomputes the buckets of the aggregation pyramid of the tags overlapping [start_time, end_time] from the cached raw data.
+        """
+        span = self.pyramid.update_span(start_time, end_time)
+        for object_name in tags:
+            timestamps, values = self.store.range(object_name, span[0], span[1] - 1)
+            self.pyramid.update(object_name, timestamps, values, span)
+
+    def _enforce_budget(self, now: datetime, protected: tuple = None):
+        """
+        Evicts cold time buckets until the cached points fit into the byte budget, must be called by the writer holding
+        the lock. The buckets of a protected (tags, start_time, end_time) range, e.g. the request being served, are kept.
+        """
+        evictions = self.cache_policy.select_evictions(self.store.snapshot, now, protected)
+        if not evictions:
+            return
+        bytes_before = self.store.nbytes()
+        for object_name, bucket_start, bucket_end in evictions:
+            self.store.discard_range(object_name, bucket_start, bucket_end)
+            # The points at bucket_end are kept, the point at bucket_start is not covered anymore
+            bucket_start = pd.Timestamp(bucket_start, tz='UTC').to_pydatetime() - timedelta(microseconds=1)
+            self.coverage[object_name].discard(bucket_start, pd.Timestamp(bucket_end, tz='UTC').to_pydatetime())
+        self.cache_policy.record_evictions(evictions, bytes_before - self.store.nbytes())
+
+    def get_cache_stats(self) -> dict:
+        """
+        Returns the bytes of the cached points (in total and per tag) and of the allocated buffers, the number of cached
+        time buckets (entries) and points and the hits, misses and evictions of the cache policy.
+        """
+        store = self.snapshot.store
+        return {
+            'bytes': store.nbytes(),
+            'allocated_bytes': self.store.allocated_bytes(),
+            'bytes_per_tag': {object_name: store.nbytes(object_name) for object_name in store.object_names()},
+            'entries': self.cache_policy.entries(store),
+            'points': store.size(),
+            **self.cache_policy.get_stats(),
+        }
+
+    def _apply_retention(self, now: datetime):
+        """
+        Clear the cache if it is older than CACHE_STORAGE_DURATION_HOURS and compress the data older than the hot tail.
+        """
+        cache_cut_off_timestamp = now - timedelta(hours=CACHE_STORAGE_DURATION_HOURS)
+        self.store.discard_before(cache_cut_off_timestamp)
+        self.store.compress_before(now - self.hot_tail)
+        for interval_set in self.coverage.values():
+            interval_set.discard_before(cache_cut_off_timestamp)
+        self.pyramid.discard_before(cache_cut_off_timestamp)
+        self.cache_policy.discard_before(cache_cut_off_timestamp)
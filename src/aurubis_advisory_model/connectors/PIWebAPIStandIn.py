@@ -0,0 +1,346 @@
+# This file contains the PIWebAPIStandIn class, a local stand-in for the OSI PI Web API used for tests and benchmarks.
+
+# Library imports
+import re
+import sys
+import gzip
+import json
+import time
+import random
+import threading
+import numpy as np
+import pandas as pd
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qsl
+
+# Configuration imports
+from config import (
+    OSI_PI_WEBID_MAPPING,
+)
+
+# PI time syntax, * equals now, *-1h equals one hour ago, etc.
+PI_RELATIVE_TIME_PATTERN = re.compile(r'^\*(?:([+-])(\d+(?:\.\d+)?)([smhd]))?$')
+PI_TIME_UNITS_SECONDS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+# PI time span syntax of the interval parameter, e.g. 30s, 10m, 1h
+PI_TIME_SPAN_PATTERN = re.compile(r'^(\d+(?:\.\d+)?)\s*([smhd])$')
+# The streamsets endpoints served by the stand-in
+STAND_IN_ENDPOINTS = ('recorded', 'interpolated', 'plot')
+# The ways a successful response can be damaged and the counters of the damaged responses
+DAMAGE_COUNTERS = {'truncate': 'truncated', 'corrupt': 'corrupted'}
+
+
+def _select_fields(obj, selection: dict):
+    """
+    Apply a parsed selectedFields tree (e.g. {'Items': {'Name': {}}}) to a JSON object.
+    """
+    if isinstance(obj, list):
+        return [_select_fields(item, selection) for item in obj]
+    if isinstance(obj, dict) and selection:
+        return {key: _select_fields(value, selection[key]) for key, value in obj.items() if key in selection}
+    return obj
+
+
+class _StandInRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive, so connection reuse of the client can be observed
+
+    def setup(self):
+        super().setup()
+        self.server.stand_in._count('connections')
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        stand_in = self.server.stand_in
+        parsed_url = urlparse(self.path)
+        params = parse_qsl(parsed_url.query)
+
+        endpoint = parsed_url.path.rstrip('/').rpartition('/piwebapi/streamsets/')[2]
+        if endpoint not in STAND_IN_ENDPOINTS:
+            return self._send(404, {'Errors': [f'Unknown resource {parsed_url.path}']})
+
+        if stand_in.latency_seconds:
+            time.sleep(stand_in.latency_seconds)
+        if stand_in._inject_error(params):
+            stand_in._count('errors')
+            return self._send(stand_in.error_status, {'Errors': ['Injected error of the stand-in']})
+
+        try:
+            response_object, points = getattr(stand_in, endpoint)(params)
+        except ValueError as error:
+            return self._send(400, {'Errors': [str(error)]})
+
+        stand_in._count('requests')
+        stand_in._count('points_served', points)
+        self._send(200, response_object, damage=stand_in._inject_damage())
+
+    def _send(self, status: int, response_object: dict, damage: str = None):
+        body = json.dumps(response_object).encode('utf-8')
+        if damage == 'corrupt':
+            # The JSON document breaks off after half of the body, the rest is garbage of the same length
+            body = body[:len(body) // 2] + b'#' * (len(body) - len(body) // 2)
+        use_gzip = 'gzip' in self.headers.get('Accept-Encoding', '')
+        if use_gzip:
+            body = gzip.compress(body)
+        content_length = len(body)
+        if damage == 'truncate':
+            # The connection breaks after half of the body, the announced Content-Length is never reached
+            body = body[:content_length // 2]
+            self.close_connection = True
+        if damage is not None:
+            self.server.stand_in._count(DAMAGE_COUNTERS[damage])
+        self.server.stand_in._count('bytes_sent', len(body))
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(content_length))
+        if use_gzip:
+            self.send_header('Content-Encoding', 'gzip')
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients drop the connection of damaged responses, which is expected and not worth a traceback
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class PIWebAPIStandIn:
+    """
+    A local, self-contained stand-in for the OSI PI Web API serving deterministic synthetic data.
+
+    Every tag of the WebID mapping has one recorded value every interval_seconds, aligned to the unix epoch, so the
+    same request always returns the same points. The stand-in serves streamsets/recorded, streamsets/interpolated and
+    streamsets/plot, honours selectedFields, maxCount of recorded (default 1000 like PI Web API, streams are silently
+    truncated) and gzip transfer encoding and keeps connections alive, which allows to measure the traffic and
+    connection handling of the OSIPIConnector. Latency, failing requests and responses breaking off or turning into garbage
+    part-way through the body can be simulated.
+
+    Args:
+        webid_mapping (dict, optional): A mapping of object names to WebIDs. Defaults to OSI_PI_WEBID_MAPPING.
+        interval_seconds (int, optional): The time between two recorded values of a tag. Defaults to 60.
+        host (str, optional): The host to bind to. Defaults to '127.0.0.1'.
+        port (int, optional): The port to bind to, 0 selects a free port. Defaults to 0.
+        latency_seconds (float, optional): The delay before every response. Defaults to 0.
+        error_rate (float, optional): The fraction of requests answered with error_status. Defaults to 0.
+        error_status (int, optional): The HTTP status of failing requests. Defaults to 503.
+        max_returned_items (int, optional): Interpolated requests returning more values are rejected, like MaxReturnedItemsPerCall of PI Web API. Defaults to 150000.
+        seed (int, optional): The seed of the random choice of failing requests. Defaults to 0.
+        failing_object_names (list, optional): Requests for one of these tags are always answered with error_status, like a broken PI point. Defaults to none.
+        truncate_rate (float, optional): The fraction of successful responses whose connection breaks after half of the body. Defaults to 0.
+        corrupt_rate (float, optional): The fraction of successful responses whose JSON turns into garbage after half of the body. Defaults to 0.
+
+    Methods:
+        start() -> PIWebAPIStandIn: Starts serving in a background thread.
+        stop(): Stops the server.
+        recorded(params: list) -> tuple: Builds the response of streamsets/recorded and returns it with the number of points.
+        interpolated(params: list) -> tuple: Builds the response of streamsets/interpolated and returns it with the number of points.
+        plot(params: list) -> tuple: Builds the response of streamsets/plot and returns it with the number of points.
+        value(object_name: str, timestamp: pd.Timestamp) -> float: The deterministic value of a tag at a timestamp.
+
+    Attributes:
+        base_url (str): The base URL to pass to the OSIPIConnector.
+        stats (dict): Counters of connections, requests, errors, truncated and corrupted responses, points_served and bytes_sent.
+    """
+    def __init__(self, webid_mapping: dict = OSI_PI_WEBID_MAPPING, interval_seconds: int = 60, host: str = '127.0.0.1', port: int = 0,
+                 latency_seconds: float = 0, error_rate: float = 0, error_status: int = 503, max_returned_items: int = 150000, seed: int = 0,
+                 failing_object_names: list = None, truncate_rate: float = 0, corrupt_rate: float = 0):
+        self.webid_mapping = webid_mapping
+        self.object_names = {webid: object_name for object_name, webid in webid_mapping.items()}
+        self.interval = pd.Timedelta(seconds=interval_seconds)
+        self.latency_seconds = latency_seconds
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.failing_webids = {webid_mapping[object_name] for object_name in failing_object_names or []}
+        self.truncate_rate = truncate_rate
+        self.corrupt_rate = corrupt_rate
+        self.max_returned_items = max_returned_items
+        self.stats = {'connections': 0, 'requests': 0, 'errors': 0, 'truncated': 0, 'corrupted': 0, 'points_served': 0, 'bytes_sent': 0}
+        self._stats_lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._server = _StandInServer((host, port), _StandInRequestHandler)
+        self._server.stand_in = self
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _count(self, counter: str, amount: int = 1):
+        with self._stats_lock:
+            self.stats[counter] += amount
+
+    def _inject_error(self, params: list) -> bool:
+        if any(key.lower() == 'webid' and value in self.failing_webids for key, value in params):
+            return True
+        with self._stats_lock:
+            return self.error_rate > 0 and self._random.random() < self.error_rate
+
+    def _inject_damage(self) -> str:
+        """
+        Returns 'truncate' or 'corrupt' for a successful response to damage, otherwise None.
+        """
+        with self._stats_lock:
+            if self.truncate_rate > 0 and self._random.random() < self.truncate_rate:
+                return 'truncate'
+            if self.corrupt_rate > 0 and self._random.random() < self.corrupt_rate:
+                return 'corrupt'
+        return None
+
+    def _parse_time(self, value: str, now: pd.Timestamp) -> pd.Timestamp:
+        match = PI_RELATIVE_TIME_PATTERN.match(value.strip())
+        if match:
+            sign, amount, unit = match.groups()
+            if amount is None:
+                return now
+            offset = pd.Timedelta(seconds=float(amount) * PI_TIME_UNITS_SECONDS[unit])
+            return now - offset if sign == '-' else now + offset
+        try:
+            timestamp = pd.Timestamp(value)
+        except ValueError:
+            raise ValueError(f'Invalid time {value}')
+        return timestamp.tz_localize('UTC') if timestamp.tzinfo is None else timestamp.tz_convert('UTC')
+
+    def _parse_time_span(self, value: str) -> pd.Timedelta:
+        match = PI_TIME_SPAN_PATTERN.match(value.strip())
+        if not match:
+            raise ValueError(f'Invalid time span {value}')
+        interval = pd.Timedelta(seconds=float(match.group(1)) * PI_TIME_UNITS_SECONDS[match.group(2)])
+        if interval <= pd.Timedelta(0):
+            raise ValueError(f'Invalid time span {value}')
+        return interval
+
+    def _parse_query(self, params: list) -> tuple:
+        """
+        Returns the object names of the WebIDs, the query parameters with lower case keys and the time range capped at now.
+        """
+        now = pd.Timestamp(datetime.now(timezone.utc))
+        object_names = []
+        for key, value in params:
+            if key.lower() == 'webid':
+                if value not in self.object_names:
+                    raise ValueError(f'Unknown WebID {value}')
+                object_names.append(self.object_names[value])
+        query = {key.lower(): value for key, value in params}
+        start_time = self._parse_time(query.get('starttime', '*-1d'), now)
+        end_time = self._parse_time(query.get('endtime', '*'), now)
+        start_time, end_time = min(start_time, end_time), min(max(start_time, end_time), now)
+        return object_names, query, start_time, end_time
+
+    def _recorded_timestamps(self, start_time: pd.Timestamp, end_time: pd.Timestamp) -> pd.DatetimeIndex:
+        if start_time > end_time:
+            return pd.DatetimeIndex([], tz='UTC')
+        return pd.date_range(start_time.ceil(self.interval), end_time, freq=self.interval)
+
+    def _values(self, object_name: str, timestamps: pd.DatetimeIndex) -> np.ndarray:
+        offset = sum(ord(character) for character in object_name) % 100
+        return np.round(1000 + offset + 100 * np.sin(timestamps.as_unit('ns').asi8 / 3.6e12 + offset), 3)
+
+    def value(self, object_name: str, timestamp: pd.Timestamp) -> float:
+        return float(self._values(object_name, pd.DatetimeIndex([timestamp]))[0])
+
+    def _response(self, object_names: list, timestamps_per_tag: dict, query: dict) -> tuple:
+        """
+        Builds a streamsets response of the values of every tag at its timestamps and applies selectedFields.
+        """
+        items = []
+        points = 0
+        for object_name in object_names:
+            timestamps = timestamps_per_tag[object_name]
+            items.append({
+                'WebId': self.webid_mapping[object_name],
+                'Name': object_name,
+                'Path': f'\\\\AF\\STAND-IN|{object_name}',
+                'Items': [{
+                    'Timestamp': timestamp,
+                    'Value': value,
+                    'UnitsAbbreviation': '',
+                    'Good': True,
+                    'Questionable': False,
+                    'Substituted': False,
+                    'Annotated': False,
+                } for timestamp, value in zip(timestamps.strftime('%Y-%m-%dT%H:%M:%SZ'), self._values(object_name, timestamps).tolist())],
+                'UnitsAbbreviation': '',
+                'Links': {},
+            })
+            points += len(timestamps)
+
+        response_object = {'Links': {}, 'Items': items}
+        if query.get('selectedfields'):
+            selection = {}
+            for field in query['selectedfields'].split(';'):
+                node = selection
+                for key in field.strip().split('.'):
+                    node = node.setdefault(key, {})
+            response_object = _select_fields(response_object, selection)
+        return response_object, points
+
+    def recorded(self, params: list) -> tuple:
+        """
+        Builds the response of streamsets/recorded for the query parameters and returns it with the number of points.
+        """
+        object_names, query, start_time, end_time = self._parse_query(params)
+        max_count = int(query.get('maxcount', 1000))
+        # Like PI Web API, every stream is silently truncated at maxCount values
+        timestamps = self._recorded_timestamps(start_time, end_time)[:max_count]
+        return self._response(object_names, {object_name: timestamps for object_name in object_names}, query)
+
+    def interpolated(self, params: list) -> tuple:
+        """
+        Builds the response of streamsets/interpolated, the values every interval (default 1h) from startTime to
+        endTime, and returns it with the number of points.
+        """
+        object_names, query, start_time, end_time = self._parse_query(params)
+        interval = self._parse_time_span(query.get('interval', '1h'))
+        timestamps = pd.date_range(start_time, end_time, freq=interval) if start_time <= end_time else pd.DatetimeIndex([], tz='UTC')
+        if len(timestamps) * len(object_names) > self.max_returned_items:
+            raise ValueError(f'The request would return more than {self.max_returned_items} items')
+        return self._response(object_names, {object_name: timestamps for object_name in object_names}, query)
+
+    def plot(self, params: list) -> tuple:
+        """
+        Builds the response of streamsets/plot and returns it with the number of points. Like PI Web API, the time range
+        is divided into intervals (default 24) and the first, last, minimum and maximum recorded value of every interval
+        is returned, so the response keeps the shape of the data with at most 4 values per interval.
+        """
+        object_names, query, start_time, end_time = self._parse_query(params)
+        intervals = int(query.get('intervals', 24))
+        if intervals <= 0:
+            raise ValueError('intervals must be positive')
+        recorded_timestamps = self._recorded_timestamps(start_time, end_time)
+        timestamps_per_tag = {}
+        for object_name in object_names:
+            if len(recorded_timestamps) == 0:
+                timestamps_per_tag[object_name] = recorded_timestamps
+                continue
+            values = self._values(object_name, recorded_timestamps)
+            interval_numbers = np.minimum((recorded_timestamps.asi8 - start_time.value) * intervals // max(end_time.value - start_time.value, 1), intervals - 1)
+            first = np.flatnonzero(np.r_[True, interval_numbers[1:] != interval_numbers[:-1]])
+            last = np.r_[first[1:], len(values)]
+            selected = set()
+            for interval_first, interval_end in zip(first, last):
+                interval_values = values[interval_first:interval_end]
+                selected.update((interval_first, interval_end - 1, interval_first + int(np.argmin(interval_values)), interval_first + int(np.argmax(interval_values))))
+            timestamps_per_tag[object_name] = recorded_timestamps[sorted(selected)]
+        return self._response(object_names, timestamps_per_tag, query)
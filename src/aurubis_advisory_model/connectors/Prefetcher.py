@@ -0,0 +1,217 @@
+# This file contains the Prefetcher class which fetches the time windows a dashboard session is likely to view next.
+
+# Library imports
+import time
+import logging
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+
+# Configuration imports
+from config import (
+    CACHE_STORAGE_DURATION_HOURS,
+    OSI_PI_PREFETCH_BUDGET_PER_MINUTE,
+    OSI_PI_PREFETCH_MAX_PENDING,
+    OSI_PI_PREFETCH_MAX_WINDOW_HOURS,
+    OSI_PI_PREFETCH_MAX_SESSIONS,
+)
+
+logger = logging.getLogger(__name__)
+
+# Charges start every day at CHARGE_START_HOUR, the same window of the previous charge is one charge length earlier
+CHARGE_DURATION = timedelta(days=1)
+# Shorter windows, e.g. the part of a window after now, are not worth a request
+MIN_WINDOW = timedelta(minutes=1)
+
+
+class Prefetcher:
+    """
+    Predicts the time windows a dashboard session views next and fetches them into the connector cache in a
+    background thread, so paging through the date picker is served from memory.
+
+    Every read of a session is recorded with record_access. From the last step of the session the adjacent windows of
+    the same length are predicted, the continuation of the step first, then the window on the other side, the same
+    window one day (i.e. one charge) earlier and one day later. Windows already cached, in the future, beyond the
+    retention of the cache or longer than max_window_hours are skipped. The predictions of the latest access are fetched first, the pending queue holds at
+    most max_pending windows and drops the oldest predictions beyond. At most budget_per_minute windows are fetched
+    per minute (token bucket), a prefetch never runs while the circuit breaker of the connector is open.
+
+    Args:
+        connector (OSIPIConnector or LazyConnector): The connector whose cache is filled.
+        budget_per_minute (float, optional): The maximum number of windows fetched per minute. Defaults to OSI_PI_PREFETCH_BUDGET_PER_MINUTE.
+        max_pending (int, optional): The maximum number of windows waiting to be fetched. Defaults to OSI_PI_PREFETCH_MAX_PENDING.
+        max_window_hours (float, optional): Longer windows are not prefetched. Defaults to OSI_PI_PREFETCH_MAX_WINDOW_HOURS.
+        max_sessions (int, optional): The number of sessions whose last access is remembered, the least recent are forgotten. Defaults to OSI_PI_PREFETCH_MAX_SESSIONS.
+
+    Methods:
+        record_access(session_id: str, tags: list, start_time: datetime, end_time: datetime) -> list: Records a read of a session and queues the predicted windows, returns them.
+        predict(previous: tuple, start_time: datetime, end_time: datetime) -> list: Returns the windows likely viewed after [start_time, end_time].
+        prefetch_pending(wait: bool = False) -> int: Fetches the pending windows in the calling thread as far as the budget allows, returns the number fetched.
+        start() -> Prefetcher: Starts the prefetching thread, does nothing if it is already running.
+        stop(timeout: float = None): Stops the prefetching thread and waits for the current prefetch to finish.
+        is_running() -> bool: Checks whether the prefetching thread is running.
+        get_stats() -> dict: Returns counters of the accesses, the prefetched windows and the accesses served by them.
+    """
+    def __init__(self, connector, budget_per_minute: float = OSI_PI_PREFETCH_BUDGET_PER_MINUTE, max_pending: int = OSI_PI_PREFETCH_MAX_PENDING,
+                 max_window_hours: float = OSI_PI_PREFETCH_MAX_WINDOW_HOURS, max_sessions: int = OSI_PI_PREFETCH_MAX_SESSIONS):
+        if budget_per_minute <= 0:
+            raise ValueError("budget_per_minute must be positive")
+        if max_pending <= 0:
+            raise ValueError("max_pending must be positive")
+        self.connector = connector
+        self.budget_per_minute = budget_per_minute
+        self.max_pending = max_pending
+        self.max_window = timedelta(hours=max_window_hours)
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._pending = deque()
+        self._prefetched = deque(maxlen=4 * max_pending)
+        self._tokens = budget_per_minute
+        self._tokens_updated_at = time.monotonic()
+        self._condition = threading.Condition()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._stats = {'accesses': 0, 'scheduled': 0, 'prefetched': 0, 'failed': 0, 'dropped': 0, 'served': 0}
+
+    def record_access(self, session_id: str, tags: list, start_time, end_time) -> list:
+        """
+        Records that the session read [start_time, end_time] of the tags and queues the predicted windows which are not
+        cached yet in front of the pending ones.
+        """
+        tags = list(tags)
+        with self._condition:
+            self._stats['accesses'] += 1
+            if any(set(tags).issubset(prefetched_tags) and prefetched_start <= start_time and end_time <= prefetched_end for prefetched_tags, prefetched_start, prefetched_end in self._prefetched):
+                self._stats['served'] += 1
+            previous = self._sessions.pop(session_id, None)
+            self._sessions[session_id] = (start_time, end_time)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+        windows = [
+            (window_start, window_end) for window_start, window_end in self.predict(previous, start_time, end_time)
+            if not self.connector.is_cached(window_start, window_end, tags=tags)
+        ]
+        with self._condition:
+            # Windows already pending move to the front, the predictions of the latest access are the most relevant
+            for window_start, window_end in reversed(windows):
+                pending = (tags, window_start, window_end)
+                if pending in self._pending:
+                    self._pending.remove(pending)
+                else:
+                    self._stats['scheduled'] += 1
+                self._pending.appendleft(pending)
+            while len(self._pending) > self.max_pending:
+                self._pending.pop()
+                self._stats['dropped'] += 1
+            self._condition.notify()
+        return windows
+
+    def predict(self, previous: tuple, start_time, end_time) -> list:
+        """
+        Returns the windows likely viewed after [start_time, end_time], most likely first. previous is the window the
+        session viewed before or None.
+        """
+        span = end_time - start_time
+        if span <= timedelta(0) or span > self.max_window:
+            return []
+        # A session paging with windows of the same length continues in the direction and by the step of its last move
+        step = span
+        if previous is not None and previous[1] - previous[0] == span and timedelta(0) < abs(start_time - previous[0]) <= self.max_window:
+            step = start_time - previous[0]
+        candidates = [step, -step, -CHARGE_DURATION, CHARGE_DURATION]
+
+        # Windows end at the latest now, data after now can not be fetched yet, data beyond the retention would be discarded right away
+        now = datetime.now(start_time.tzinfo)
+        retention_start = now - timedelta(hours=CACHE_STORAGE_DURATION_HOURS)
+        windows = []
+        for shift in candidates:
+            window = (start_time + shift, min(end_time + shift, now))
+            if window[1] - window[0] >= MIN_WINDOW and window[0] >= retention_start and window not in windows:
+                windows.append(window)
+        return windows
+
+    def prefetch_pending(self, wait: bool = False) -> int:
+        """
+        Fetches pending windows until the queue is empty or the budget is used up, with wait=True it waits for the
+        budget instead. Returns the number of windows fetched.
+        """
+        prefetched = 0
+        while not self._stop_event.is_set():
+            with self._condition:
+                if not self._pending:
+                    break
+                delay = self._take_token()
+                if delay == 0:
+                    tags, start_time, end_time = self._pending.popleft()
+            if delay > 0:
+                if not wait:
+                    break
+                self._stop_event.wait(delay)
+                continue
+
+            try:
+                cached = self.connector.prefetch(start_time, end_time, tags=tags)
+            except Exception:
+                logger.exception('Prefetching %s till %s failed', start_time.isoformat(), end_time.isoformat())
+                cached = False
+            with self._condition:
+                if cached:
+                    self._prefetched.append((set(tags), start_time, end_time))
+                    self._stats['prefetched'] += 1
+                else:
+                    self._stats['failed'] += 1
+            prefetched += cached
+        return prefetched
+
+    def start(self):
+        with self._condition:
+            if self.is_running():
+                return self
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name='osi-pi-prefetcher', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: float = None):
+        with self._condition:
+            self._stop_event.set()
+            thread, self._thread = self._thread, None
+            self._condition.notify_all()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def get_stats(self) -> dict:
+        """
+        Returns the number of accesses, of scheduled, prefetched, failed and dropped windows and of accesses served by
+        a prefetched window, and the number of pending windows.
+        """
+        with self._condition:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._pending)
+        stats['running'] = self.is_running()
+        return stats
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            with self._condition:
+                while not self._pending and not self._stop_event.is_set():
+                    self._condition.wait()
+            self.prefetch_pending(wait=True)
+
+    def _take_token(self) -> float:
+        """
+        Takes a token of the budget and returns 0, or returns the seconds until the next token is available.
+        Must be called holding the condition.
+        """
+        now = time.monotonic()
+        rate = self.budget_per_minute / 60
+        self._tokens = min(self._tokens + (now - self._tokens_updated_at) * rate, self.budget_per_minute)
+        self._tokens_updated_at = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0
+        return (1 - self._tokens) / rate
@@ -0,0 +1,173 @@
+# This file contains the compressed encoding of cold segments of the cached OSI-PI time series.
+
+# Library imports
+import json
+import zlib
+import struct
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Value encodings of a compressed segment
+VALUE_ENCODINGS = ('lossless', 'float32')
+# Decimal scaled values are only used up to this number of decimals, beyond the values are XOR encoded
+MAX_DECIMALS = 6
+# Finite values beyond this magnitude would turn into infinity as float32
+FLOAT32_MAX = float(np.finfo('float32').max)
+# A serialized segment starts with the lengths of its JSON header and of its encoded timestamps
+SERIALIZED_HEADER = struct.Struct('<II')
+
+
+def _smallest_int_dtype(values: np.ndarray) -> np.dtype:
+    if len(values) == 0:
+        return np.dtype('int8')
+    low, high = int(values.min()), int(values.max())
+    for dtype in ('int8', 'int16', 'int32'):
+        if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype('int64')
+
+
+def _pack(array: np.ndarray) -> bytes:
+    """
+    Byte-shuffles an array, i.e. stores the first bytes of all elements, then the second bytes, etc., and compresses it.
+    Small integers and XORed floats have mostly zero high bytes, which become long runs zlib compresses well.
+    """
+    shuffled = np.ascontiguousarray(array).view('uint8').reshape(len(array), array.itemsize).T
+    return zlib.compress(shuffled.tobytes(), 1)
+
+
+def _unpack(data: bytes, dtype: np.dtype, count: int) -> np.ndarray:
+    dtype = np.dtype(dtype)
+    shuffled = np.frombuffer(zlib.decompress(data), dtype='uint8').reshape(dtype.itemsize, count)
+    return np.ascontiguousarray(shuffled.T).view(dtype).reshape(count)
+
+
+def _encode_integers(integers: np.ndarray) -> tuple:
+    """
+    Delta-of-delta encoding of an int64 series, returns (first value, first delta, dtype name, packed bytes). Regularly
+    sampled timestamps only have zero delta-of-deltas, which are not stored at all, slowly changing decimal values have
+    small ones.
+    """
+    deltas = np.diff(integers)
+    delta_of_deltas = np.diff(deltas)
+    first, step = int(integers[0]) if len(integers) else 0, int(deltas[0]) if len(deltas) else 0
+    if not delta_of_deltas.any():
+        return first, step, None, b''
+    dtype = _smallest_int_dtype(delta_of_deltas)
+    return first, step, dtype.name, _pack(delta_of_deltas.astype(dtype))
+
+
+def _decode_integers(first: int, step: int, dtype: str, data: bytes, count: int) -> np.ndarray:
+    if dtype is None:
+        return first + step * np.arange(count, dtype='int64')
+    integers = np.empty(count, dtype='int64')
+    integers[0], integers[1] = first, step
+    np.cumsum(_unpack(data, dtype, count - 2), dtype='int64', out=integers[2:])
+    integers[2:] += step
+    np.cumsum(integers, out=integers)
+    return integers
+
+
+def _decimals(values: np.ndarray) -> int:
+    """
+    Returns the smallest number of decimals all values can be restored from exactly, None if more than MAX_DECIMALS are needed.
+    """
+    if not np.isfinite(values).all():
+        return None
+    for decimals in range(MAX_DECIMALS + 1):
+        scale = 10.0 ** decimals
+        scaled = np.round(values * scale)
+        if np.abs(scaled).max(initial=0) >= 2 ** 53:
+            return None
+        if np.array_equal(scaled / scale, values):
+            return decimals
+    return None
+
+
+class CompressedSegment:
+    """
+    An immutable, compressed segment of a time series, e.g. one time bucket of a tag.
+
+    Timestamps are delta-of-delta encoded, regularly sampled timestamps only need their first value and step. Values are encoded losslessly, either as delta-of-delta of the values scaled
+    to integers if they have at most MAX_DECIMALS decimals, or XOR encoded like in Gorilla: every value is XORed with its
+    predecessor, so the bits which did not change become zeros. Values exactly representable as float32 (like those of
+    float32 PI points) are XORed as 32 bits. With 'float32' all values are quantised to float32 first, which loses
+    precision beyond about 7 significant digits.
+    All encoded arrays are byte-shuffled and zlib compressed, decoding is vectorized.
+
+    Methods:
+        encode(timestamps: np.ndarray, values: np.ndarray, value_encoding: str = 'lossless') -> CompressedSegment: Encodes sorted points.
+        timestamps() -> np.ndarray: Decodes the timestamps only.
+        decode() -> tuple: Decodes the timestamps and values.
+        to_bytes() -> bytes: Serializes the encoded segment, e.g. to persist it.
+        from_bytes(data: bytes) -> CompressedSegment: Restores a serialized segment.
+
+    Attributes:
+        count (int): The number of points.
+        first (int): The first timestamp in UTC nanoseconds.
+        last (int): The last timestamp in UTC nanoseconds.
+        nbytes (int): The size of the encoded data in bytes.
+    """
+    __slots__ = ('count', 'first', 'last', '_timestamps', '_values', 'nbytes')
+
+    def __init__(self, count: int, first: int, last: int, timestamps: tuple, values: tuple):
+        self.count = count
+        self.first = first
+        self.last = last
+        self._timestamps = timestamps
+        self._values = values
+        self.nbytes = len(timestamps[-1]) + len(values[-1])
+
+    @classmethod
+    def encode(cls, timestamps: np.ndarray, values: np.ndarray, value_encoding: str = 'lossless'):
+        if value_encoding not in VALUE_ENCODINGS:
+            raise ValueError(f"value_encoding must be one of {', '.join(VALUE_ENCODINGS)}")
+        if len(timestamps) == 0:
+            raise ValueError("A segment must contain points")
+        timestamps = np.asarray(timestamps, dtype='int64')
+        values = np.asarray(values, dtype='float64')
+
+        decimals = _decimals(values) if value_encoding == 'lossless' else None
+        if decimals is not None:
+            encoded_values = ('decimal', decimals, *_encode_integers(np.round(values * 10.0 ** decimals).astype('int64')))
+        else:
+            # PI stores most tags as float32, their values are restored exactly from 32 bits. Values beyond the float32
+            # range are kept as float64, as float32 they would be infinite.
+            if np.any(np.isfinite(values) & (np.abs(values) > FLOAT32_MAX)):
+                if value_encoding == 'float32':
+                    logger.warning('Values beyond the float32 range, the segment is stored as float64 instead')
+                bits = values.view('uint64')
+            else:
+                single = values.astype('float32')
+                bits = single.view('uint32') if value_encoding == 'float32' or np.array_equal(single, values, equal_nan=True) else values.view('uint64')
+            encoded_values = ('xor', bits.dtype.name, _pack(np.bitwise_xor(bits, np.concatenate([bits[:1] * 0, bits[:-1]]))))
+        return cls(len(timestamps), int(timestamps[0]), int(timestamps[-1]), _encode_integers(timestamps), encoded_values)
+
+    def timestamps(self) -> np.ndarray:
+        return _decode_integers(*self._timestamps, self.count)
+
+    def decode(self) -> tuple:
+        if self._values[0] == 'decimal':
+            _, decimals, *encoded = self._values
+            values = _decode_integers(*encoded, self.count) / 10.0 ** decimals
+        else:
+            _, dtype, data = self._values
+            values = np.bitwise_xor.accumulate(_unpack(data, dtype, self.count)).view(dtype.replace('uint', 'float')).astype('float64')
+        return self.timestamps(), values
+
+    def to_bytes(self) -> bytes:
+        header = json.dumps([self.count, self.first, self.last, self._timestamps[:-1], self._values[:-1]]).encode('utf-8')
+        return SERIALIZED_HEADER.pack(len(header), len(self._timestamps[-1])) + header + self._timestamps[-1] + self._values[-1]
+
+    @classmethod
+    def from_bytes(cls, data: bytes):
+        header_length, timestamps_length = SERIALIZED_HEADER.unpack_from(data)
+        data = bytes(data[SERIALIZED_HEADER.size:])
+        count, first, last, timestamps, values = json.loads(data[:header_length])
+        timestamps_data, values_data = data[header_length:header_length + timestamps_length], data[header_length + timestamps_length:]
+        return cls(count, first, last, (*timestamps, timestamps_data), (*values, values_data))
+
+    def __repr__(self):
+        return f'CompressedSegment(count={self.count}, nbytes={self.nbytes})'
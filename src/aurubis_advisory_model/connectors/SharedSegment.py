@@ -0,0 +1,175 @@
+# This file contains the SharedSegment class which shares the connector cache between worker processes via memory-mapped files.
+
+# Library imports
+import os
+import json
+import mmap
+import struct
+import tempfile
+import numpy as np
+import pandas as pd
+
+# Module imports
+from connectors.CacheSnapshot import CacheSnapshot
+from connectors.IntervalSet import IntervalSet
+from connectors.TimeSeriesStore import StoreSnapshot
+
+# Layout of a segment file: magic, format version, sequence number and length of the JSON directory, followed by the
+# directory and the 8 byte aligned timestamp and value arrays of every tag
+SEGMENT_MAGIC = b'OSIPISEG'
+SEGMENT_FORMAT_VERSION = 1
+SEGMENT_HEADER = struct.Struct('<8sIQI')
+# The sequence file holds the sequence number of the current segment file as little endian uint64
+SEQUENCE = struct.Struct('<Q')
+# Number of segment files kept besides the current one, for readers which have just read an older sequence number
+SEGMENT_GENERATIONS_KEPT = 2
+
+
+def _aligned(offset: int) -> int:
+    return offset + (-offset) % 8
+
+
+class SharedSegment:
+    """
+    A cache segment in memory-mapped files, written by one designated process and mapped read-only by all other
+    worker processes on the host, so the cached data exists only once in memory however many workers are running.
+
+    The writer stores every published CacheSnapshot (points and coverage of all tags) as a new immutable segment file
+    and then increments the sequence number in a small sequence file. Readers map the sequence file and compare the
+    sequence number on every read, which costs no system call. Only if it changed, the new segment file is mapped.
+    All arrays returned are zero-copy, read-only numpy views of the mapped file, the pages are shared with all other
+    processes through the page cache. Place the directory on a tmpfs like /dev/shm to keep the segment off the disk.
+
+    Old segment files are removed after SEGMENT_GENERATIONS_KEPT newer ones were written. On POSIX, readers still
+    mapping a removed file keep a valid mapping until they switch to the new one.
+
+    Args:
+        directory (str): The directory of the segment files. It is created if it does not exist.
+        writer (bool, optional): Whether this process writes the segment. Defaults to False.
+
+    Methods:
+        write(snapshot: CacheSnapshot) -> int: Writes the snapshot as new segment and returns its sequence number (writer only).
+        sequence() -> int: Returns the sequence number of the current segment, 0 if nothing was written yet.
+        read() -> CacheSnapshot: Returns the current segment as CacheSnapshot with zero-copy views, None if nothing was written yet.
+        close(): Releases the mapped files.
+    """
+    def __init__(self, directory: str, writer: bool = False):
+        if not directory:
+            raise ValueError("directory must be provided")
+        self.directory = directory
+        self.writer = writer
+        self._sequence_path = os.path.join(directory, 'sequence')
+        self._sequence_map = None
+        self._snapshot = None
+        os.makedirs(directory, exist_ok=True)
+        if writer and not os.path.exists(self._sequence_path):
+            self._replace(self._sequence_path, SEQUENCE.pack(0))
+
+    def _segment_path(self, sequence: int) -> str:
+        return os.path.join(self.directory, f'segment-{sequence:012d}.bin')
+
+    def _replace(self, path: str, data: bytes):
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(file_descriptor, 'wb') as temporary_file:
+            temporary_file.write(data)
+        os.replace(temporary_path, path)
+
+    def _map_sequence(self):
+        if self._sequence_map is None and os.path.exists(self._sequence_path):
+            with open(self._sequence_path, 'r+b' if self.writer else 'rb') as sequence_file:
+                self._sequence_map = mmap.mmap(sequence_file.fileno(), SEQUENCE.size, access=mmap.ACCESS_WRITE if self.writer else mmap.ACCESS_READ)
+        return self._sequence_map
+
+    def sequence(self) -> int:
+        sequence_map = self._map_sequence()
+        return SEQUENCE.unpack_from(sequence_map)[0] if sequence_map is not None else 0
+
+    def write(self, snapshot: CacheSnapshot) -> int:
+        """
+        Writes the points and coverage of the snapshot into a new segment file, then publishes it by incrementing the
+        sequence number. The previous segment files stay readable until they are pruned.
+        """
+        if not self.writer:
+            raise ValueError("Only the writer can write the shared segment")
+        sequence = self.sequence() + 1
+
+        directory, arrays, offset = {}, [], 0
+        for object_name, interval_set in snapshot.coverage.items():
+            timestamps, values = snapshot.store.range(object_name, np.iinfo('int64').min, np.iinfo('int64').max)
+            directory[object_name] = {
+                'offset': offset,
+                'count': len(timestamps),
+                'coverage': [[pd.Timestamp(start).value, pd.Timestamp(end).value] for start, end in interval_set],
+            }
+            arrays.extend([timestamps, values])
+            offset += timestamps.nbytes + values.nbytes
+        directory_bytes = json.dumps(directory).encode('utf-8')
+        data_start = _aligned(SEGMENT_HEADER.size + len(directory_bytes))
+
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(file_descriptor, 'wb') as segment_file:
+                segment_file.write(SEGMENT_HEADER.pack(SEGMENT_MAGIC, SEGMENT_FORMAT_VERSION, sequence, len(directory_bytes)))
+                segment_file.write(directory_bytes)
+                segment_file.write(b'\0' * (data_start - SEGMENT_HEADER.size - len(directory_bytes)))
+                for array in arrays:
+                    segment_file.write(np.ascontiguousarray(array).tobytes())
+            os.replace(temporary_path, self._segment_path(sequence))
+        except BaseException:
+            os.remove(temporary_path)
+            raise
+
+        # Publish the new segment, an aligned 8 byte store is never seen half-written by the readers
+        sequence_map = self._map_sequence()
+        SEQUENCE.pack_into(sequence_map, 0, sequence)
+        self._prune(sequence)
+        return sequence
+
+    def _prune(self, sequence: int):
+        for file_name in os.listdir(self.directory):
+            if file_name.startswith('segment-') and file_name.endswith('.bin') and int(file_name[8:-4]) < sequence - SEGMENT_GENERATIONS_KEPT:
+                try:
+                    os.remove(os.path.join(self.directory, file_name))
+                except OSError:
+                    pass  # Still mapped by another process (Windows), it is retried on the next write
+
+    def read(self) -> CacheSnapshot:
+        """
+        Returns the current segment as CacheSnapshot whose version is the sequence number. The snapshot is only rebuilt
+        if the sequence number changed since the last call.
+        """
+        sequence = self.sequence()
+        if sequence == 0:
+            return None
+        if self._snapshot is not None and self._snapshot.version == sequence:
+            return self._snapshot
+        try:
+            segment = np.memmap(self._segment_path(sequence), dtype='uint8', mode='r')
+        except FileNotFoundError:
+            # Pruned after the sequence number was read, a newer segment exists
+            return self.read()
+
+        magic, format_version, segment_sequence, directory_length = SEGMENT_HEADER.unpack_from(segment)
+        if magic != SEGMENT_MAGIC or format_version != SEGMENT_FORMAT_VERSION or segment_sequence != sequence:
+            raise ValueError(f"Invalid shared segment {self._segment_path(sequence)}")
+        directory = json.loads(segment[SEGMENT_HEADER.size:SEGMENT_HEADER.size + directory_length].tobytes())
+        data_start = _aligned(SEGMENT_HEADER.size + directory_length)
+
+        arrays, coverage = {}, {}
+        for object_name, entry in directory.items():
+            start, count = data_start + entry['offset'], entry['count']
+            timestamps = segment[start:start + 8 * count].view('<i8')
+            values = segment[start + 8 * count:start + 16 * count].view('<f8')
+            arrays[object_name] = (timestamps, values)
+            coverage[object_name] = IntervalSet(
+                (pd.Timestamp(interval_start, tz='UTC').to_pydatetime(), pd.Timestamp(interval_end, tz='UTC').to_pydatetime())
+                for interval_start, interval_end in entry['coverage']
+            )
+        self._snapshot = CacheSnapshot(StoreSnapshot(arrays), coverage, aggregates={}, version=sequence)
+        return self._snapshot
+
+    def close(self):
+        if self._sequence_map is not None:
+            self._sequence_map.close()
+            self._sequence_map = None
+        self._snapshot = None
@@ -0,0 +1,78 @@
+# This file contains the functions converting OSI-PI stream items into numpy arrays and Pandas DataFrames.
+
+# Library imports
+import numpy as np
+import pandas as pd
+
+# Configuration imports
+from config import (
+    TIMEZONE,
+)
+
+
+def parse_stream_items(items: list) -> tuple:
+    """
+    Convert the recorded items of one stream into flat numpy arrays.
+    The ISO timestamps are parsed in one vectorized call. Only int and float values are numbers, all others, e.g. digital
+    states like {'Name': 'Shutdown', 'Value': 254}, bools and strings, are masked and stored as NaN.
+
+    Returns:
+        tuple: (timestamps as int64 UTC nanoseconds, values as float64, mask of numeric values)
+    """
+    if not items:
+        return np.empty(0, dtype='int64'), np.empty(0, dtype='float64'), np.empty(0, dtype=bool)
+
+    raw_timestamps = [item.get('Timestamp') for item in items]
+    if all(timestamp.endswith('Z') for timestamp in raw_timestamps):
+        # PI Web API returns UTC timestamps, numpy parses them considerably faster than pandas once the 'Z' is removed
+        timestamps = np.array([timestamp[:-1] for timestamp in raw_timestamps], dtype='datetime64[ns]').view('int64')
+    else:
+        timestamps = pd.to_datetime(raw_timestamps, utc=True, format='ISO8601').as_unit('ns').asi8
+    raw_values = [item.get('Value') for item in items]
+    # The types are checked before converting, so a value is masked the same way whatever else its batch contains
+    mask = np.fromiter((type(value) in (int, float) for value in raw_values), dtype=bool, count=len(raw_values))
+    if mask.all():
+        values = np.array(raw_values, dtype='float64')
+    else:
+        values = np.full(len(raw_values), np.nan)
+        values[mask] = [value for value, is_number in zip(raw_values, mask) if is_number]
+    mask &= ~np.isnan(values)
+    return timestamps, values, mask
+
+
+def merge_stream_arrays(parts: list) -> tuple:
+    """
+    Concatenate several (timestamps, values) parts of one stream, sort them and drop duplicate timestamps which occur on
+    window and page boundaries.
+    """
+    if not parts:
+        return np.empty(0, dtype='int64'), np.empty(0, dtype='float64')
+    timestamps = np.concatenate([part[0] for part in parts])
+    values = np.concatenate([part[1] for part in parts])
+    if len(parts) > 1 or (len(timestamps) > 1 and np.any(timestamps[1:] <= timestamps[:-1])):
+        order = np.argsort(timestamps, kind='stable')
+        timestamps, values = timestamps[order], values[order]
+        unique = np.empty(len(timestamps), dtype=bool)
+        unique[:1] = True
+        np.not_equal(timestamps[1:], timestamps[:-1], out=unique[1:])
+        timestamps, values = timestamps[unique], values[unique]
+    return timestamps, values
+
+
+def frame_from_arrays(arrays: dict, timezone: str = TIMEZONE, dtype: str = 'float64') -> pd.DataFrame:
+    """
+    Assemble a wide DataFrame from a dict mapping tag names to sorted (timestamps, values) arrays.
+    The index is the union of all timestamps, every column is allocated once and filled by position.
+    """
+    if not arrays:
+        return pd.DataFrame(index=pd.DatetimeIndex([], tz=timezone))
+
+    all_timestamps = np.unique(np.concatenate([timestamps for timestamps, values in arrays.values()]))
+    columns = {}
+    for object_name, (timestamps, values) in arrays.items():
+        column = np.full(len(all_timestamps), np.nan, dtype=dtype)
+        column[np.searchsorted(all_timestamps, timestamps)] = values
+        columns[object_name] = column
+
+    index = pd.DatetimeIndex(all_timestamps.view('datetime64[ns]')).tz_localize('UTC').tz_convert(timezone)
+    return pd.DataFrame(columns, index=index)
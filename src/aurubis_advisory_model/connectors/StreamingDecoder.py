@@ -0,0 +1,202 @@
+# This file contains the StreamingDecoder class which incrementally decodes streamsets responses into numpy arrays.
+
+# Library imports
+import re
+import json
+import codecs
+import numpy as np
+
+# Module imports
+from connectors.StreamParsing import parse_stream_items
+
+_WHITESPACE = re.compile(r'\s*')
+# A JSON object without nested objects or arrays, e.g. {"Timestamp": "2023-10-01T06:00:00Z", "Value": 1.5}
+_STRING = r'"[^"\\]*(?:\\.[^"\\]*)*"'
+_FLAT_OBJECT = r'\{[^{}\[\]"]*(?:' + _STRING + r'[^{}\[\]"]*)*\}'
+# A comma separated run of flat objects, decoded with a single call of the C JSON decoder
+_FLAT_OBJECT_RUN = re.compile(_FLAT_OBJECT + r'(?:\s*,\s*' + _FLAT_OBJECT + r')*')
+
+
+class _GrowingArrays:
+    """
+    Preallocated timestamp and value buffers of one stream which double their capacity when full.
+    """
+    def __init__(self, capacity: int):
+        self.timestamps = np.empty(max(capacity, 1), dtype='int64')
+        self.values = np.empty(max(capacity, 1), dtype='float64')
+        self.size = 0
+
+    def append(self, timestamps: np.ndarray, values: np.ndarray):
+        required = self.size + len(timestamps)
+        if required > len(self.timestamps):
+            capacity = max(required, 2 * len(self.timestamps))
+            for name in ('timestamps', 'values'):
+                grown = np.empty(capacity, dtype=getattr(self, name).dtype)
+                grown[:self.size] = getattr(self, name)[:self.size]
+                setattr(self, name, grown)
+        self.timestamps[self.size:required] = timestamps
+        self.values[self.size:required] = values
+        self.size = required
+
+    def arrays(self) -> tuple:
+        # Release the unused capacity if more than half of the buffer is empty
+        if self.size < len(self.timestamps) // 2:
+            return self.timestamps[:self.size].copy(), self.values[:self.size].copy()
+        return self.timestamps[:self.size], self.values[:self.size]
+
+
+class StreamingDecoder:
+    """
+    Incrementally decodes a streamsets response, e.g. of streamsets/recorded, from an iterable of byte chunks.
+
+    Only the Items[].Items[] arrays are materialised, batch by batch, and appended into growing numpy buffers per stream,
+    all other members are decoded and discarded on the fly. The peak memory is therefore proportional to the resulting
+    arrays and one chunk of the response instead of the complete JSON tree of Python objects.
+
+    Args:
+        initial_capacity (int, optional): The number of points preallocated per stream, e.g. the maxCount of the request. Defaults to 4096.
+        batch_size (int, optional): The number of decoded points converted into arrays at once. Defaults to 8192.
+
+    Methods:
+        decode(chunks: iterable) -> dict: Decodes the response and returns a dict mapping the stream names to (timestamps, values) arrays.
+    """
+    def __init__(self, initial_capacity: int = 4096, batch_size: int = 8192):
+        self.initial_capacity = initial_capacity
+        self.batch_size = batch_size
+        self._json_decoder = json.JSONDecoder()
+
+    def decode(self, chunks) -> dict:
+        """
+        Decodes the response and returns a dict mapping the stream names to (timestamps as int64 UTC nanoseconds, values as float64).
+        Raises a ValueError if the response is not valid JSON.
+        """
+        self._chunks = iter(chunks)
+        self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self._text = ''
+        self._pos = 0
+        self._eof = False
+        self.streams = {}
+
+        for key in self._members():
+            if key == 'Items':
+                for _ in self._elements():
+                    self._decode_stream()
+            else:
+                self._value()
+        streams, self.streams, self._text = self.streams, None, ''
+        return streams
+
+    def _decode_stream(self):
+        name, arrays = None, None
+        for key in self._members():
+            if key == 'Name':
+                name = self._value()
+            elif key == 'Items':
+                arrays = self._decode_points()
+            else:
+                self._value()
+        if arrays is None:
+            arrays = np.empty(0, dtype='int64'), np.empty(0, dtype='float64')
+        self.streams[name] = arrays
+
+    def _decode_points(self) -> tuple:
+        buffer = _GrowingArrays(self.initial_capacity)
+        pending = []
+        for _ in self._elements():
+            match = _FLAT_OBJECT_RUN.match(self._text, self._pos)
+            if match:
+                pending.extend(json.loads('[' + match.group() + ']'))
+                self._pos = match.end()
+            else:
+                # Nested values like digital states or a point cut off at the end of the buffer
+                pending.append(self._value())
+            if len(pending) >= self.batch_size:
+                buffer.append(*parse_stream_items(pending)[:2])
+                pending = []
+        if pending:
+            buffer.append(*parse_stream_items(pending)[:2])
+        return buffer.arrays()
+
+    def _fill(self) -> bool:
+        """
+        Appends the next chunk to the buffer, dropping the consumed text. Returns False at the end of the response.
+        """
+        if self._eof:
+            return False
+        self._text = self._text[self._pos:]
+        self._pos = 0
+        for chunk in self._chunks:
+            text = self._text_decoder.decode(chunk)
+            if text:
+                self._text += text
+                return True
+        self._text += self._text_decoder.decode(b'', final=True)
+        self._eof = True
+        return False
+
+    def _peek(self) -> str:
+        while True:
+            self._pos = _WHITESPACE.match(self._text, self._pos).end()
+            if self._pos < len(self._text):
+                return self._text[self._pos]
+            if not self._fill():
+                raise ValueError('Unexpected end of the response')
+
+    def _expect(self, character: str):
+        if self._peek() != character:
+            raise ValueError(f'Expected {character!r} at position {self._pos} of the buffer')
+        self._pos += 1
+
+    def _value(self):
+        """
+        Decodes one complete JSON value, reading further chunks until it is complete.
+        """
+        self._peek()
+        while True:
+            try:
+                value, end = self._json_decoder.raw_decode(self._text, self._pos)
+                # A number at the end of the buffer may continue in the next chunk
+                if end < len(self._text) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError as error:
+                if self._eof:
+                    raise ValueError(f'Invalid JSON in the response: {error}')
+            self._fill()
+
+    def _members(self):
+        """
+        Iterates over the keys of an object, the caller has to consume the value of every key.
+        """
+        self._expect('{')
+        if self._peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            key = self._value()
+            self._expect(':')
+            yield key
+            separator = self._peek()
+            self._pos += 1
+            if separator == '}':
+                return
+            if separator != ',':
+                raise ValueError(f'Expected \',\' or \'}}\' at position {self._pos - 1} of the buffer')
+
+    def _elements(self):
+        """
+        Iterates over the elements of an array, the caller has to consume every element. Yields after skipping whitespace.
+        """
+        self._expect('[')
+        if self._peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            self._peek()
+            yield
+            separator = self._peek()
+            self._pos += 1
+            if separator == ']':
+                return
+            if separator != ',':
+                raise ValueError(f'Expected \',\' or \']\' at position {self._pos - 1} of the buffer')
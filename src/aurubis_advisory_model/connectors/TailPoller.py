@@ -0,0 +1,108 @@
+# This file contains the TailPoller class which keeps the live window of the connector cache current in the background.
+
+# Library imports
+import time
+import random
+import logging
+import threading
+
+# Configuration imports
+from config import (
+    OSI_PI_TAIL_POLL_INTERVAL_SECONDS,
+    OSI_PI_TAIL_POLL_JITTER_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class TailPoller:
+    """
+    Polls the new tail of the tags in use in a background thread, so dashboard reads are served from memory.
+
+    Every poll calls update_tail of the connector, which requests only the data after the end of the cached window.
+    The polls happen every interval_seconds with a random jitter of up to jitter_seconds, so several worker processes
+    do not hit the OSI PI system at the same time. Errors are logged and counted, the next poll is attempted as usual.
+    After a poll the changes are published to the shared segment and the cache checkpoint is saved, if they are due.
+
+    Args:
+        connector (OSIPIConnector or LazyConnector): The connector whose cache is kept current.
+        interval_seconds (float, optional): The time between two polls. Defaults to OSI_PI_TAIL_POLL_INTERVAL_SECONDS.
+        jitter_seconds (float, optional): The maximum random deviation from interval_seconds. Defaults to OSI_PI_TAIL_POLL_JITTER_SECONDS.
+
+    Methods:
+        start() -> TailPoller: Starts the polling thread, does nothing if it is already running.
+        stop(timeout: float = None): Stops the polling thread and waits for the current poll to finish.
+        is_running() -> bool: Checks whether the polling thread is running.
+        poll_once() -> bool: Polls the tail once in the calling thread, returns whether the poll succeeded.
+        get_stats() -> dict: Returns counters of the polls and the staleness of the cached data in seconds.
+    """
+    def __init__(self, connector, interval_seconds: float = OSI_PI_TAIL_POLL_INTERVAL_SECONDS, jitter_seconds: float = OSI_PI_TAIL_POLL_JITTER_SECONDS):
+        if interval_seconds <= 0:
+            raise ValueError("interval_seconds must be positive")
+        self.connector = connector
+        self.interval_seconds = interval_seconds
+        self.jitter_seconds = min(max(jitter_seconds, 0), interval_seconds)
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {'polls': 0, 'failures': 0, 'last_poll_duration_seconds': None, 'last_error': None}
+
+    def start(self):
+        with self._lock:
+            if self.is_running():
+                return self
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name='osi-pi-tail-poller', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: float = None):
+        with self._lock:
+            self._stop_event.set()
+            thread, self._thread = self._thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _next_delay(self) -> float:
+        return self.interval_seconds + random.uniform(-self.jitter_seconds, self.jitter_seconds)
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self.poll_once()
+            self._stop_event.wait(self._next_delay())
+
+    def poll_once(self) -> bool:
+        started = time.monotonic()
+        try:
+            self.connector.update_tail()
+            self.connector.publish_shared_segment_if_due()
+            self.connector.save_checkpoint_if_due()
+            error = None
+        except Exception as exception:
+            logger.exception('Polling the tail of the OSI PI data failed')
+            error = repr(exception)
+        with self._lock:
+            self._stats['polls'] += 1
+            self._stats['failures'] += error is not None
+            self._stats['last_poll_duration_seconds'] = time.monotonic() - started
+            self._stats['last_error'] = error
+        return error is None
+
+    def get_stats(self) -> dict:
+        """
+        Returns the number of polls and failures, the duration and error of the last poll and the staleness, i.e. the
+        age of the cached data in seconds (None as long as nothing is cached).
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        stats['running'] = self.is_running()
+        stats['staleness_seconds'] = self.connector.staleness_seconds() if self._connector_initialized() else None
+        return stats
+
+    def _connector_initialized(self) -> bool:
+        # A LazyConnector is not constructed just to report the staleness
+        is_initialized = getattr(type(self.connector), 'is_initialized', None)
+        return is_initialized is None or self.connector.is_initialized()
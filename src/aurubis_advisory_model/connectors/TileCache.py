@@ -0,0 +1,221 @@
+# This file contains the TileCache class which persists OSI-PI data on disk so it can be shared between worker processes.
+
+# Library imports
+import os
+import json
+import tempfile
+import numpy as np
+import pandas as pd
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Structured dtype of a single tile, timestamps are stored as UTC nanoseconds
+TILE_DTYPE = np.dtype([('timestamp', '<i8'), ('value', '<f8')])
+
+
+class _FileLock:
+    """
+    An exclusive, inter-process lock backed by a lock-file (fcntl on POSIX, msvcrt on Windows).
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._handle = None
+
+    def acquire(self):
+        self._handle = open(self.path, 'a+b')
+        if fcntl is not None:
+            fcntl.flock(self._handle.fileno(), fcntl.LOCK_EX)
+        else:
+            self._handle.seek(0)
+            msvcrt.locking(self._handle.fileno(), msvcrt.LK_LOCK, 1)
+
+    def release(self):
+        if self._handle is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self._handle.fileno(), fcntl.LOCK_UN)
+        else:
+            self._handle.seek(0)
+            msvcrt.locking(self._handle.fileno(), msvcrt.LK_UNLCK, 1)
+        self._handle.close()
+        self._handle = None
+
+
+class TileCache:
+    """
+    A disk-backed cache storing OSI-PI data as immutable per-tag, per-time-bucket tiles.
+
+    Every tile is a numpy structured array (timestamp, value) saved as .npy file and memory-mapped on read,
+    so all worker processes on a host share the same pages. An index file keeps track of which buckets are complete
+    for which tags. Only buckets that lie entirely in the past (plus a settle time for late arriving data) are ever
+    written, which makes tiles immutable once they exist.
+
+    Args:
+        directory (str): The directory the tiles are stored in. It is created if it does not exist.
+        bucket_minutes (int, optional): The size of a time-bucket in minutes. Defaults to 60.
+        retention_hours (int, optional): Tiles older than this are removed from disk. Defaults to None (keep forever).
+        settle_seconds (int, optional): A bucket is only considered final this many seconds after it ended. Defaults to 300.
+
+    Methods:
+        settled_until(now: datetime) -> pd.Timestamp: Returns the end of the last bucket that may be persisted.
+        bucket_starts(start_time: datetime, end_time: datetime) -> list: Returns the starts of all buckets overlapping the time range.
+        missing_buckets(buckets: list, tags: list) -> list: Returns the buckets that are not complete for all given tags.
+        locked(buckets: list): Context manager holding the inter-process write lock of the given buckets.
+        write(buckets: list, df: pd.DataFrame): Splits a DataFrame into tiles and marks the buckets as complete.
+        read(buckets: list, tags: list) -> dict: Returns the memory-mapped tiles per tag.
+        prune(now: datetime): Removes tiles older than the retention time.
+    """
+    def __init__(self, directory: str, bucket_minutes: int = 60, retention_hours: int = None, settle_seconds: int = 300):
+        if not directory:
+            raise ValueError("directory must be provided")
+        if bucket_minutes <= 0:
+            raise ValueError("bucket_minutes must be positive")
+
+        self.directory = directory
+        self.bucket_size = pd.Timedelta(minutes=bucket_minutes)
+        self.retention = pd.Timedelta(hours=retention_hours) if retention_hours else None
+        self.settle_time = pd.Timedelta(seconds=settle_seconds)
+        self._index_path = os.path.join(directory, 'index.json')
+        self._lock_directory = os.path.join(directory, 'locks')
+        os.makedirs(self._lock_directory, exist_ok=True)
+
+    def _bucket_key(self, bucket: pd.Timestamp) -> str:
+        return bucket.strftime('%Y%m%dT%H%MZ')
+
+    def _tile_path(self, tag: str, bucket: pd.Timestamp) -> str:
+        return os.path.join(self.directory, tag, f'{self._bucket_key(bucket)}.npy')
+
+    def _load_index(self) -> dict:
+        """
+        Load the index of complete buckets. The index is replaced atomically so it can be read without a lock.
+        """
+        try:
+            with open(self._index_path, 'r') as index_file:
+                return json.load(index_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _store_index(self, index: dict):
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(file_descriptor, 'w') as index_file:
+            json.dump(index, index_file)
+        os.replace(temporary_path, self._index_path)
+
+    @contextmanager
+    def _index_lock(self):
+        lock = _FileLock(os.path.join(self._lock_directory, 'index.lock'))
+        lock.acquire()
+        try:
+            yield
+        finally:
+            lock.release()
+
+    def settled_until(self, now: datetime) -> pd.Timestamp:
+        """
+        Returns the end of the last bucket which ended more than settle_seconds before now.
+        """
+        return (pd.Timestamp(now).tz_convert('UTC') - self.settle_time).floor(self.bucket_size)
+
+    def bucket_starts(self, start_time: datetime, end_time: datetime) -> list:
+        """
+        Returns the start timestamps (UTC) of all buckets overlapping the time range [start_time, end_time).
+        """
+        start = pd.Timestamp(start_time).tz_convert('UTC').floor(self.bucket_size)
+        end = pd.Timestamp(end_time).tz_convert('UTC')
+        if end <= start:
+            return []
+        return list(pd.date_range(start, end - pd.Timedelta(1, 'ns'), freq=self.bucket_size))
+
+    def missing_buckets(self, buckets: list, tags: list) -> list:
+        """
+        Returns the buckets which are not complete for every tag in tags.
+        """
+        complete = self._load_index()
+        return [bucket for bucket in buckets if not set(tags).issubset(complete.get(self._bucket_key(bucket), []))]
+
+    @contextmanager
+    def locked(self, buckets: list):
+        """
+        Holds the write lock of every bucket. Locks are taken in chronological order so concurrent writers can not deadlock.
+        """
+        locks = [_FileLock(os.path.join(self._lock_directory, f'{self._bucket_key(bucket)}.lock')) for bucket in sorted(buckets)]
+        acquired = []
+        try:
+            for lock in locks:
+                lock.acquire()
+                acquired.append(lock)
+            yield
+        finally:
+            for lock in reversed(acquired):
+                lock.release()
+
+    def write(self, buckets: list, df: pd.DataFrame):
+        """
+        Splits a DataFrame fetched for the given buckets into one tile per tag and bucket and marks the buckets complete.
+        The caller must hold the lock of the buckets.
+        """
+        index_utc = df.index.tz_convert('UTC')
+        timestamps = index_utc.as_unit('ns').asi8
+        for tag in df.columns:
+            values = pd.to_numeric(df[tag], errors='coerce').to_numpy(dtype='float64')
+            for bucket in buckets:
+                mask = (index_utc >= bucket) & (index_utc < bucket + self.bucket_size) & ~np.isnan(values)
+                tile = np.empty(int(mask.sum()), dtype=TILE_DTYPE)
+                tile['timestamp'] = timestamps[mask]
+                tile['value'] = values[mask]
+
+                # Write to a temporary file first so readers never see a partially written tile
+                tile_path = self._tile_path(tag, bucket)
+                os.makedirs(os.path.dirname(tile_path), exist_ok=True)
+                file_descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(tile_path), suffix='.tmp')
+                with os.fdopen(file_descriptor, 'wb') as tile_file:
+                    np.save(tile_file, tile)
+                os.replace(temporary_path, tile_path)
+
+        with self._index_lock():
+            index = self._load_index()
+            for bucket in buckets:
+                key = self._bucket_key(bucket)
+                index[key] = sorted(set(index.get(key, [])) | set(df.columns))
+            self._store_index(index)
+
+    def read(self, buckets: list, tags: list) -> dict:
+        """
+        Returns a dict mapping every tag to a list of memory-mapped tiles of the given buckets.
+        """
+        tiles = {}
+        for tag in tags:
+            tiles[tag] = []
+            for bucket in buckets:
+                tile_path = self._tile_path(tag, bucket)
+                if os.path.exists(tile_path):
+                    tiles[tag].append(np.load(tile_path, mmap_mode='r'))
+        return tiles
+
+    def prune(self, now: datetime):
+        """
+        Removes tiles and index entries of buckets older than the retention time.
+        The lock files are kept, another worker may hold or wait for the lock of an expired bucket and removing the file
+        would let a worker opening a new one take the same lock.
+        """
+        if self.retention is None:
+            return
+        cut_off_key = self._bucket_key((pd.Timestamp(now).tz_convert('UTC') - self.retention).floor(self.bucket_size))
+        with self._index_lock():
+            index = self._load_index()
+            expired = [key for key in index if key < cut_off_key]
+            if not expired:
+                return
+            for key in expired:
+                for tag in index.pop(key):
+                    try:
+                        os.remove(os.path.join(self.directory, tag, f'{key}.npy'))
+                    except OSError:
+                        pass  # The tile may still be mapped by another process (Windows), it is retried on the next prune
+            self._store_index(index)
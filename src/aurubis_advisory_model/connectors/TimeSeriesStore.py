@@ -0,0 +1,412 @@
+# This file contains the TimeSeriesStore class, the array-backed in-memory store of the cached OSI-PI data.
+
+# Library imports
+import numpy as np
+import pandas as pd
+
+# Module imports
+from connectors.StreamParsing import frame_from_arrays
+from connectors.SeriesCompression import CompressedSegment, VALUE_ENCODINGS
+
+# Configuration imports
+from config import (
+    TIMEZONE,
+    OSI_PI_CACHE_BUCKET_MINUTES,
+)
+
+
+def _nanoseconds(timestamp) -> int:
+    if isinstance(timestamp, (int, np.integer)):
+        return int(timestamp)
+    return pd.Timestamp(timestamp).value
+
+
+def _read_only(*arrays) -> tuple:
+    for array in arrays:
+        array.flags.writeable = False
+    return arrays
+
+
+class _TagBuffer:
+    """
+    The preallocated timestamp and value arrays of one tag, the live data is stored in [head, tail).
+    """
+    def __init__(self, capacity: int):
+        self.timestamps = np.empty(capacity, dtype='int64')
+        self.values = np.empty(capacity, dtype='float64')
+        self.head = 0
+        self.tail = 0
+
+    def live(self) -> tuple:
+        return self.timestamps[self.head:self.tail], self.values[self.head:self.tail]
+
+    def reserve(self, count: int, minimum_capacity: int):
+        """
+        Makes room for count more points at the tail. If the arrays are full, the live data is moved into newly
+        allocated arrays of twice the required size, the old arrays stay untouched so views handed out remain valid.
+        """
+        if self.tail + count <= len(self.timestamps):
+            return
+        size = self.tail - self.head
+        capacity = max(minimum_capacity, 2 * (size + count))
+        timestamps, values = np.empty(capacity, dtype='int64'), np.empty(capacity, dtype='float64')
+        timestamps[:size], values[:size] = self.live()
+        self.timestamps, self.values, self.head, self.tail = timestamps, values, 0, size
+
+
+class StoreSnapshot:
+    """
+    An immutable view of the points of all tags at one moment, published by the TimeSeriesStore after every change.
+
+    The snapshot only references read-only views of buffer memory which the store never writes again and immutable
+    compressed segments, so it can be read from any thread without locking and does not change while it is read.
+    The compressed segments overlapping a read are decoded on demand, the hot tail is returned as views.
+
+    Methods:
+        range(object_name: str, start_time, end_time) -> tuple: Returns the timestamps and values within [start_time, end_time].
+        count(object_name: str, start_time, end_time) -> int: Returns the number of points within [start_time, end_time].
+        frame(object_names: list, start_time, end_time, timezone: str = TIMEZONE) -> pd.DataFrame: Returns the points of several tags as wide DataFrame.
+        size() -> int: Returns the number of points of all tags.
+        nbytes(object_name: str = None) -> int: Returns the bytes of the points of a tag or of all tags, compressed segments count with their encoded size.
+        bucket_bytes(object_name: str, bucket_size: int) -> dict: Returns the bytes of the points of a tag per time bucket.
+        object_names() -> list: Returns the tags holding points.
+    """
+    __slots__ = ('_arrays', '_segments')
+
+    def __init__(self, arrays: dict = None, segments: dict = None):
+        self._arrays = dict(arrays or {})
+        # object_name -> tuple of the CompressedSegments in time order, all before the first point of the arrays
+        self._segments = dict(segments or {})
+
+    def _positions(self, object_name: str, start_time, end_time) -> tuple:
+        timestamps = self._arrays[object_name][0]
+        first = np.searchsorted(timestamps, _nanoseconds(start_time), side='left')
+        last = np.searchsorted(timestamps, _nanoseconds(end_time), side='right')
+        return first, last
+
+    def _overlapping_segments(self, object_name: str, start: int, end: int) -> list:
+        return [segment for segment in self._segments.get(object_name, ()) if segment.first <= end and segment.last >= start]
+
+    def range(self, object_name: str, start_time, end_time) -> tuple:
+        """
+        Returns read-only arrays of the timestamps and values of a tag within [start_time, end_time], views of the
+        buffers if the range does not overlap compressed segments.
+        """
+        start, end = _nanoseconds(start_time), _nanoseconds(end_time)
+        parts = []
+        for segment in self._overlapping_segments(object_name, start, end):
+            timestamps, values = segment.decode()
+            if start > segment.first or segment.last > end:
+                inside = (timestamps >= start) & (timestamps <= end)
+                timestamps, values = timestamps[inside], values[inside]
+            parts.append((timestamps, values))
+        if object_name in self._arrays:
+            first, last = self._positions(object_name, start, end)
+            timestamps, values = self._arrays[object_name]
+            parts.append((timestamps[first:last], values[first:last]))
+        if not parts:
+            return np.empty(0, dtype='int64'), np.empty(0, dtype='float64')
+        if len(parts) == 1:
+            return parts[0]
+        return _read_only(np.concatenate([timestamps for timestamps, _ in parts]), np.concatenate([values for _, values in parts]))
+
+    def count(self, object_name: str, start_time, end_time) -> int:
+        start, end = _nanoseconds(start_time), _nanoseconds(end_time)
+        count = 0
+        for segment in self._overlapping_segments(object_name, start, end):
+            if start <= segment.first and segment.last <= end:
+                count += segment.count
+            else:
+                timestamps = segment.timestamps()
+                count += int(np.count_nonzero((timestamps >= start) & (timestamps <= end)))
+        if object_name in self._arrays:
+            first, last = self._positions(object_name, start, end)
+            count += int(last - first)
+        return count
+
+    def frame(self, object_names: list, start_time, end_time, timezone: str = TIMEZONE) -> pd.DataFrame:
+        """
+        Returns the points of the tags within [start_time, end_time] as DataFrame indexed by the union of their timestamps.
+        """
+        return frame_from_arrays({object_name: self.range(object_name, start_time, end_time) for object_name in object_names}, timezone=timezone)
+
+    def size(self) -> int:
+        return sum(len(timestamps) for timestamps, _ in self._arrays.values()) + sum(segment.count for segments in self._segments.values() for segment in segments)
+
+    def nbytes(self, object_name: str = None) -> int:
+        if object_name is not None:
+            return sum(array.nbytes for array in self._arrays.get(object_name, ())) + sum(segment.nbytes for segment in self._segments.get(object_name, ()))
+        return sum(self.nbytes(object_name) for object_name in self.object_names())
+
+    def bucket_bytes(self, object_name: str, bucket_size: int) -> dict:
+        """
+        Returns the bytes of the points of a tag per time bucket of bucket_size nanoseconds aligned to the unix epoch,
+        a compressed segment is accounted to the bucket of its first point.
+        """
+        bucket_bytes = {}
+        for segment in self._segments.get(object_name, ()):
+            bucket_start = segment.first - segment.first % bucket_size
+            bucket_bytes[bucket_start] = bucket_bytes.get(bucket_start, 0) + segment.nbytes
+        if object_name in self._arrays:
+            timestamps, values = self._arrays[object_name]
+            bucket_starts, counts = np.unique(timestamps - timestamps % bucket_size, return_counts=True)
+            point_bytes = timestamps.itemsize + values.itemsize
+            for bucket_start, count in zip(bucket_starts.tolist(), counts.tolist()):
+                bucket_bytes[bucket_start] = bucket_bytes.get(bucket_start, 0) + point_bytes * count
+        return bucket_bytes
+
+    def object_names(self) -> list:
+        return list(dict.fromkeys([*self._segments, *self._arrays]))
+
+
+class TimeSeriesStore:
+    """
+    An append-only, array-backed store of the cached time series with one preallocated buffer per tag.
+
+    Appending at the tail is amortized O(1), range reads are binary searches returning views of the buffers and
+    eviction of expired data only moves the head of the buffers. Data inserted out of order (e.g. a backfilled gap)
+    is merged into newly allocated arrays. Memory that was handed out as a view is never written again, so views
+    stay valid and unchanged after later inserts and evictions.
+
+    With compression enabled, compress_before moves the cold points before a cut-off out of the buffers into one
+    CompressedSegment per tag and time bucket of bucket_minutes, the hot tail stays uncompressed. Segments are decoded
+    on demand by reads and re-encoded if points are inserted into or removed from their bucket.
+
+    Every change publishes a new StoreSnapshot by swapping the snapshot attribute, all reads go through the current
+    snapshot. So a single writer (holding the lock of the connector) can change the store while any number of readers
+    read it without locking.
+
+    Points whose timestamp already exists in the store are dropped on insert, which removes the duplicates on the
+    boundaries of adjacent request windows. Missing values (NaN) are not stored.
+
+    Args:
+        initial_capacity (int, optional): The number of points preallocated per tag. Defaults to 4096.
+        compression (str, optional): The value encoding of compressed segments, 'lossless' or 'float32'. Defaults to None, which disables compression.
+        bucket_minutes (int, optional): The time span of a compressed segment in minutes. Defaults to OSI_PI_CACHE_BUCKET_MINUTES.
+
+    Methods:
+        insert(object_name: str, timestamps: np.ndarray, values: np.ndarray): Inserts sorted points of a tag.
+        range(object_name: str, start_time, end_time) -> tuple: Returns the timestamps and values within [start_time, end_time].
+        count(object_name: str, start_time, end_time) -> int: Returns the number of points within [start_time, end_time].
+        frame(object_names: list, start_time, end_time, timezone: str = TIMEZONE) -> pd.DataFrame: Returns the points of several tags as wide DataFrame.
+        compress_before(timestamp): Compresses the points of the buckets ending before timestamp.
+        discard_before(timestamp): Removes all points before timestamp.
+        discard_range(object_name: str, start_time, end_time): Removes the points of a tag within [start_time, end_time).
+        size() -> int: Returns the number of points of all tags.
+        nbytes(object_name: str = None) -> int: Returns the bytes of the points of a tag or of all tags.
+        allocated_bytes() -> int: Returns the bytes allocated for the buffers and compressed segments of all tags.
+
+    Attributes:
+        snapshot (StoreSnapshot): The immutable view of the current points of all tags.
+
+    Timestamps are int64 UTC nanoseconds, the time arguments accept anything pd.Timestamp accepts as well.
+    """
+    def __init__(self, initial_capacity: int = 4096, compression: str = None, bucket_minutes: int = OSI_PI_CACHE_BUCKET_MINUTES):
+        if compression is not None and compression not in VALUE_ENCODINGS:
+            raise ValueError(f"compression must be one of {', '.join(VALUE_ENCODINGS)}")
+        self.initial_capacity = initial_capacity
+        self.compression = compression
+        self.bucket_size = pd.Timedelta(minutes=bucket_minutes).value
+        self._buffers = {}
+        # object_name -> {bucket start: CompressedSegment}, all points before the compressed_until of the tag
+        self._segments = {}
+        self._compressed_until = {}
+        self.snapshot = StoreSnapshot()
+
+    def _publish(self, object_names):
+        """
+        Publishes a new snapshot with the current live data of the tags, the other tags are shared with the previous snapshot.
+        """
+        arrays, segments = dict(self.snapshot._arrays), dict(self.snapshot._segments)
+        for object_name in object_names:
+            if object_name in self._buffers:
+                arrays[object_name] = _read_only(*self._buffers[object_name].live())
+            if self._segments.get(object_name):
+                segments[object_name] = tuple(self._segments[object_name][bucket_start] for bucket_start in sorted(self._segments[object_name]))
+            else:
+                segments.pop(object_name, None)
+        self.snapshot = StoreSnapshot(arrays, segments)
+
+    def _buckets(self, timestamps: np.ndarray, values: np.ndarray):
+        """
+        Splits sorted points into the buckets they fall into, yields (bucket start, timestamps, values).
+        """
+        bucket_starts = timestamps - timestamps % self.bucket_size
+        boundaries = np.flatnonzero(np.diff(bucket_starts)) + 1
+        for bucket_timestamps, bucket_values in zip(np.split(timestamps, boundaries), np.split(values, boundaries)):
+            yield int(bucket_timestamps[0] - bucket_timestamps[0] % self.bucket_size), bucket_timestamps, bucket_values
+
+    def _replace_segment(self, object_name: str, bucket_start: int, timestamps: np.ndarray, values: np.ndarray):
+        segments = self._segments.setdefault(object_name, {})
+        if len(timestamps):
+            segments[bucket_start] = CompressedSegment.encode(timestamps, values, self.compression)
+        else:
+            segments.pop(bucket_start, None)
+
+    def _insert_compressed(self, object_name: str, timestamps: np.ndarray, values: np.ndarray):
+        """
+        Merges sorted points into the compressed segments of a tag, points already cached are dropped.
+        """
+        segments = self._segments.setdefault(object_name, {})
+        for bucket_start, bucket_timestamps, bucket_values in self._buckets(timestamps, values):
+            if bucket_start in segments:
+                cached_timestamps, cached_values = segments[bucket_start].decode()
+                new = ~np.isin(bucket_timestamps, cached_timestamps)
+                merged_timestamps = np.concatenate([cached_timestamps, bucket_timestamps[new]])
+                order = np.argsort(merged_timestamps, kind='stable')
+                bucket_timestamps, bucket_values = merged_timestamps[order], np.concatenate([cached_values, bucket_values[new]])[order]
+            self._replace_segment(object_name, bucket_start, bucket_timestamps, bucket_values)
+
+    def insert(self, object_name: str, timestamps: np.ndarray, values: np.ndarray):
+        """
+        Inserts points of a tag, timestamps are int64 UTC nanoseconds in ascending order without duplicates.
+        """
+        valid = ~np.isnan(values)
+        timestamps, values = np.asarray(timestamps, dtype='int64')[valid], np.asarray(values, dtype='float64')[valid]
+        if len(timestamps) == 0:
+            return
+
+        # Points in the compressed part of the tag go into its segments
+        compressed = np.searchsorted(timestamps, self._compressed_until.get(object_name, np.iinfo('int64').min), side='left')
+        if compressed:
+            self._insert_compressed(object_name, timestamps[:compressed], values[:compressed])
+            timestamps, values = timestamps[compressed:], values[compressed:]
+            if len(timestamps) == 0:
+                self._publish([object_name])
+                return
+
+        buffer = self._buffers.get(object_name)
+        if buffer is None:
+            buffer = self._buffers[object_name] = _TagBuffer(max(self.initial_capacity, len(timestamps)))
+        live_timestamps, live_values = buffer.live()
+
+        # Drop the points which already exist, usually a single point on the boundary to the previous request
+        if len(live_timestamps) and timestamps[0] <= live_timestamps[-1]:
+            positions = np.searchsorted(live_timestamps, timestamps)
+            exists = positions < len(live_timestamps)
+            exists[exists] = live_timestamps[positions[exists]] == timestamps[exists]
+            timestamps, values = timestamps[~exists], values[~exists]
+            if len(timestamps) == 0:
+                self._publish([object_name])
+                return
+
+        if len(live_timestamps) == 0 or timestamps[0] > live_timestamps[-1]:
+            buffer.reserve(len(timestamps), self.initial_capacity)
+            buffer.timestamps[buffer.tail:buffer.tail + len(timestamps)] = timestamps
+            buffer.values[buffer.tail:buffer.tail + len(timestamps)] = values
+            buffer.tail += len(timestamps)
+            self._publish([object_name])
+            return
+
+        # Out of order points are merged into new arrays
+        merged_timestamps = np.concatenate([live_timestamps, timestamps])
+        order = np.argsort(merged_timestamps, kind='stable')
+        merged = _TagBuffer(max(self.initial_capacity, 2 * len(order)))
+        merged.timestamps[:len(order)] = merged_timestamps[order]
+        merged.values[:len(order)] = np.concatenate([live_values, values])[order]
+        merged.tail = len(order)
+        self._buffers[object_name] = merged
+        self._publish([object_name])
+
+    def range(self, object_name: str, start_time, end_time) -> tuple:
+        """
+        Returns read-only arrays of the timestamps and values of a tag within [start_time, end_time].
+        """
+        return self.snapshot.range(object_name, start_time, end_time)
+
+    def count(self, object_name: str, start_time, end_time) -> int:
+        return self.snapshot.count(object_name, start_time, end_time)
+
+    def frame(self, object_names: list, start_time, end_time, timezone: str = TIMEZONE) -> pd.DataFrame:
+        """
+        Returns the points of the tags within [start_time, end_time] as DataFrame indexed by the union of their timestamps.
+        """
+        return self.snapshot.frame(object_names, start_time, end_time, timezone=timezone)
+
+    def compress_before(self, timestamp):
+        """
+        Moves the points of all buckets ending at or before timestamp out of the buffers into compressed segments. The
+        remaining hot points are copied into newly allocated arrays, so the memory of the buffers is released once no
+        snapshot references it anymore. Does nothing if compression is disabled.
+        """
+        if self.compression is None:
+            return
+        cut_off = _nanoseconds(timestamp)
+        cut_off -= cut_off % self.bucket_size
+        changed = []
+        for object_name, buffer in self._buffers.items():
+            live_timestamps, live_values = buffer.live()
+            cold = np.searchsorted(live_timestamps, cut_off, side='left')
+            if cold == 0:
+                continue
+            self._insert_compressed(object_name, live_timestamps[:cold], live_values[:cold])
+            self._compressed_until[object_name] = cut_off
+            hot = len(live_timestamps) - cold
+            reduced = _TagBuffer(max(self.initial_capacity, hot))
+            reduced.timestamps[:hot], reduced.values[:hot] = live_timestamps[cold:], live_values[cold:]
+            reduced.tail = hot
+            self._buffers[object_name] = reduced
+            changed.append(object_name)
+        if changed:
+            self._publish(changed)
+
+    def _discard_from_segments(self, object_name: str, start: int, end: int):
+        """
+        Removes the points of a tag within [start, end) from its compressed segments, partially affected segments are re-encoded.
+        """
+        segments = self._segments.get(object_name, {})
+        for bucket_start, segment in list(segments.items()):
+            if segment.last < start or segment.first >= end:
+                continue
+            if start <= segment.first and segment.last < end:
+                del segments[bucket_start]
+                continue
+            timestamps, values = segment.decode()
+            keep = (timestamps < start) | (timestamps >= end)
+            self._replace_segment(object_name, bucket_start, timestamps[keep], values[keep])
+
+    def discard_before(self, timestamp):
+        """
+        Removes all points before timestamp by moving the head of the buffers, the memory is reused once the buffers are reallocated.
+        """
+        cut_off = _nanoseconds(timestamp)
+        for object_name in self._segments:
+            self._discard_from_segments(object_name, np.iinfo('int64').min, cut_off)
+        for buffer in self._buffers.values():
+            buffer.head += np.searchsorted(buffer.timestamps[buffer.head:buffer.tail], cut_off, side='left')
+        self._publish([*self._buffers, *self._segments])
+
+    def discard_range(self, object_name: str, start_time, end_time):
+        """
+        Removes the points of a tag within [start_time, end_time). The remaining points are copied into newly allocated
+        arrays, so views handed out stay unchanged.
+        """
+        start, end = _nanoseconds(start_time), _nanoseconds(end_time)
+        if object_name in self._segments:
+            self._discard_from_segments(object_name, start, end)
+            self._publish([object_name])
+        buffer = self._buffers.get(object_name)
+        if buffer is None:
+            return
+        live_timestamps, live_values = buffer.live()
+        first = np.searchsorted(live_timestamps, start, side='left')
+        last = np.searchsorted(live_timestamps, end, side='left')
+        if first == last:
+            return
+        remaining = len(live_timestamps) - (last - first)
+        reduced = _TagBuffer(max(self.initial_capacity, remaining))
+        reduced.timestamps[:first], reduced.timestamps[first:remaining] = live_timestamps[:first], live_timestamps[last:]
+        reduced.values[:first], reduced.values[first:remaining] = live_values[:first], live_values[last:]
+        reduced.tail = remaining
+        self._buffers[object_name] = reduced
+        self._publish([object_name])
+
+    def size(self) -> int:
+        return self.snapshot.size()
+
+    def nbytes(self, object_name: str = None) -> int:
+        return self.snapshot.nbytes(object_name)
+
+    def allocated_bytes(self) -> int:
+        buffer_bytes = sum(buffer.timestamps.nbytes + buffer.values.nbytes for buffer in self._buffers.values())
+        return buffer_bytes + sum(segment.nbytes for segments in self._segments.values() for segment in segments.values())
@@ -1,4 +1,7 @@
 from connectors.OSIPIConnector import OSIPIConnector
+from connectors.LazyConnector import LazyConnector
+from connectors.TailPoller import TailPoller
+from connectors.Prefetcher import Prefetcher
 
 from config import (
     OSI_PI_BASE_URL,
@@ -6,5 +9,11 @@ from config import (
     OSI_PI_PASSWORD,
 )
 
-# Instatiate the connector for other modules to use
-instantiated_osipiconnector = OSIPIConnector(OSI_PI_BASE_URL, OSI_PI_USERNAME, OSI_PI_PASSWORD)
\ No newline at end of file
+# Instatiate the connector for other modules to use, it is constructed on first use so importing does no I/O
+instantiated_osipiconnector = LazyConnector(lambda: OSIPIConnector(OSI_PI_BASE_URL, OSI_PI_USERNAME, OSI_PI_PASSWORD))
+
+# The poller keeping the cache of the connector current, it is started by the dashboard app if enabled
+tail_poller = TailPoller(instantiated_osipiconnector)
+
+# The prefetcher of the windows the dashboard sessions are likely to view next, it is started by the dashboard app if enabled
+prefetcher = Prefetcher(instantiated_osipiconnector)
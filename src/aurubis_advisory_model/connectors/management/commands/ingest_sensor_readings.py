@@ -0,0 +1,96 @@
+# This file contains the ingest_sensor_readings command which copies the OSI-PI data into the local SensorReading table.
+
+# Library imports
+import time
+import logging
+from datetime import datetime, timedelta, timezone
+from django.core.management.base import BaseCommand
+
+# Module imports
+from connectors.LocalHistory import LocalHistory
+from connectors.OSIPIConnector import OSIPIConnector
+
+# Configuration imports
+from config import (
+    OSI_PI_BASE_URL,
+    OSI_PI_USERNAME,
+    OSI_PI_PASSWORD,
+    OSI_PI_PARAMETERS_REQUESTED,
+    OSI_PI_LOCAL_HISTORY_RETENTION_DAYS,
+    OSI_PI_INGESTION_INTERVAL_SECONDS,
+    OSI_PI_INGESTION_BATCH_SIZE,
+    OSI_PI_INGESTION_WINDOW_HOURS,
+    OSI_PI_INGESTION_BACKFILL_DAYS,
+    OSI_PI_INGESTION_SETTLE_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        'Ingests the recorded values of the OSI-PI tags into the SensorReading table, continuing every tag from the end of '
+        'its covered range, and deletes readings older than the retention. Runs until interrupted unless --once is given.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Ingest once and exit instead of running continuously.')
+        parser.add_argument('--interval', type=float, default=OSI_PI_INGESTION_INTERVAL_SECONDS, help='Seconds between two ingestion runs.')
+        parser.add_argument('--window-hours', type=float, default=OSI_PI_INGESTION_WINDOW_HOURS, help='Length of the windows requested and written at once.')
+        parser.add_argument('--backfill-days', type=float, default=OSI_PI_INGESTION_BACKFILL_DAYS, help='History ingested for tags without readings.')
+        parser.add_argument('--retention-days', type=float, default=OSI_PI_LOCAL_HISTORY_RETENTION_DAYS, help='Readings older than this are deleted.')
+        parser.add_argument('--settle-seconds', type=float, default=OSI_PI_INGESTION_SETTLE_SECONDS, help='Only data older than this is ingested.')
+        parser.add_argument('--batch-size', type=int, default=OSI_PI_INGESTION_BATCH_SIZE, help='Readings per INSERT statement.')
+        parser.add_argument('--verify-cert', action='store_true', help='Verify the SSL certificate of the PI server.')
+
+    def handle(self, *args, **options):
+        # The ingestion neither serves reads nor shares its cache, it only fetches ranges
+        connector = OSIPIConnector(OSI_PI_BASE_URL, OSI_PI_USERNAME, OSI_PI_PASSWORD, shared_segment_directory='', checkpoint_path='', local_history=False)
+        history = LocalHistory(batch_size=options['batch_size'])
+        try:
+            while True:
+                started = time.monotonic()
+                written, deleted = self.ingest(connector, history, options)
+                self.stdout.write(f'{written} readings written, {deleted} readings pruned in {time.monotonic() - started:.1f} s')
+                if options['once']:
+                    break
+                time.sleep(max(options['interval'] - (time.monotonic() - started), 0))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            connector.close()
+
+    def ingest(self, connector: OSIPIConnector, history: LocalHistory, options: dict) -> tuple:
+        """
+        Fetches every tag from the end of its covered range (or the backfill start) till the settled end in windows and
+        writes them, then prunes the readings beyond the retention. Returns the number of readings written and deleted.
+        """
+        now = datetime.now(timezone.utc)
+        end_time = now - timedelta(seconds=options['settle_seconds'])
+        backfill_start = now - timedelta(days=options['backfill_days'])
+        window = timedelta(hours=options['window_hours'])
+
+        # Tags covered until the same time are requested together
+        coverage = history.coverage(OSI_PI_PARAMETERS_REQUESTED)
+        groups = {}
+        for object_name in OSI_PI_PARAMETERS_REQUESTED:
+            start_time = max(coverage[object_name][1].to_pydatetime(), backfill_start) if object_name in coverage else backfill_start
+            groups.setdefault(start_time, []).append(object_name)
+
+        written = 0
+        for start_time, tags in groups.items():
+            while start_time < end_time:
+                window_end = min(start_time + window, end_time)
+                df = connector.fetch_range(start_time, window_end, verify_cert=options['verify_cert'], tags=tags)
+                # Tags without column failed, they continue from here on the next run while the others go on
+                failed_tags = [object_name for object_name in tags if object_name not in df.columns]
+                if failed_tags:
+                    logger.error('Ingesting %s from %s till %s failed', ', '.join(failed_tags), start_time.isoformat(), window_end.isoformat())
+                tags = [object_name for object_name in tags if object_name in df.columns]
+                if not tags:
+                    break
+                written += history.write(df[tags], start_time, window_end, tags=tags)
+                start_time = window_end
+
+        deleted = history.prune_before(now - timedelta(days=options['retention_days']))
+        return written, deleted
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.6 on 2026-10-18 14:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SensorCoverage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tag', models.CharField(max_length=100, unique=True)),
+                ('start', models.BigIntegerField(help_text='UTC nanoseconds since the unix epoch')),
+                ('end', models.BigIntegerField(help_text='UTC nanoseconds since the unix epoch')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SensorReading',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tag', models.CharField(max_length=100)),
+                ('ts', models.BigIntegerField(help_text='UTC nanoseconds since the unix epoch')),
+                ('value', models.FloatField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ts'], name='sensor_reading_ts')],
+                'constraints': [models.UniqueConstraint(fields=('tag', 'ts'), name='unique_sensor_reading_tag_ts')],
+            },
+        ),
+    ]
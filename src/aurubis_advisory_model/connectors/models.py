@@ -0,0 +1,37 @@
+from django.db import models
+
+
+class SensorReading(models.Model):
+    """
+    One recorded value of an OSI-PI tag, ingested into the local database by the ingest_sensor_readings command.
+    The timestamp is stored as int64 UTC nanoseconds like in the TimeSeriesStore, so reads need no date parsing.
+    """
+    tag = models.CharField(max_length=100)
+    ts = models.BigIntegerField(help_text='UTC nanoseconds since the unix epoch')
+    value = models.FloatField()
+
+    class Meta:
+        constraints = [
+            # Backed by the composite (tag, ts) index all range reads use, and the conflict target of the upserts
+            models.UniqueConstraint(fields=['tag', 'ts'], name='unique_sensor_reading_tag_ts'),
+        ]
+        indexes = [
+            # Retention pruning deletes by time over all tags
+            models.Index(fields=['ts'], name='sensor_reading_ts'),
+        ]
+
+    def __str__(self):
+        return f'{self.tag} {self.ts} {self.value}'
+
+
+class SensorCoverage(models.Model):
+    """
+    The time range [start, end] of a tag the SensorReading table holds the complete recorded data for. Slowly changing
+    tags may have no readings for a long time, so the range is tracked separately from the readings.
+    """
+    tag = models.CharField(max_length=100, unique=True)
+    start = models.BigIntegerField(help_text='UTC nanoseconds since the unix epoch')
+    end = models.BigIntegerField(help_text='UTC nanoseconds since the unix epoch')
+
+    def __str__(self):
+        return f'{self.tag} {self.start} - {self.end}'
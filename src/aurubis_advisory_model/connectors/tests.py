@@ -0,0 +1,1389 @@
+import os
+import sys
+import json
+import time
+import tempfile
+import warnings
+import threading
+import subprocess
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytz
+import requests
+from django.test import SimpleTestCase, TestCase
+
+from connectors.AggregationPyramid import AggregationPyramid
+from connectors.CacheCheckpoint import CacheCheckpoint
+from connectors.CircuitBreaker import CircuitBreaker
+from connectors.InFlightRegistry import InFlightRegistry
+from connectors.IntervalSet import IntervalSet
+from connectors.LazyConnector import LazyConnector
+from connectors.LocalHistory import LocalHistory
+from connectors.OSIPIConnector import OSIPIConnector
+from connectors.PIWebAPIStandIn import PIWebAPIStandIn
+from connectors.Prefetcher import Prefetcher
+from connectors.SeriesCompression import CompressedSegment
+from connectors.SharedSegment import SharedSegment
+from connectors.StreamParsing import parse_stream_items, merge_stream_arrays, frame_from_arrays
+from connectors.StreamingDecoder import StreamingDecoder
+from connectors.TailPoller import TailPoller
+from connectors.TileCache import TileCache
+from connectors.TimeSeriesStore import TimeSeriesStore
+from connectors.management.commands.ingest_sensor_readings import Command as IngestSensorReadingsCommand
+from utils.Downsampling import lttb_indices, downsample_frame
+from config import TIMEZONE, OSI_PI_PARAMETERS_REQUESTED, OSI_PI_WEBID_MAPPING
+
+timezone = pytz.timezone(TIMEZONE)
+
+
+class RecordingOSIPIConnector(OSIPIConnector):
+    """
+    Connector answering every request with one synthetic point per minute and recording the requested ranges.
+    Requests overlapping failing_ranges return an empty DataFrame, like a failed request to the OSI PI system.
+    """
+    def __init__(self, *args, **kwargs):
+        self.requested_ranges = []
+        self.requested_tags = []
+        self.failing_ranges = []
+        super().__init__('https://pi.example.com', 'user', 'password', *args, tile_cache_directory='', **kwargs)
+
+    def _batch_retriev_data(self, start_time, end_time, verify_cert=False, streaming=False, tags=None):
+        tags = tags or OSI_PI_PARAMETERS_REQUESTED
+        self.requested_ranges.append((start_time, end_time))
+        self.requested_tags.append(list(tags))
+        if any(start_time < failing_end and end_time > failing_start for failing_start, failing_end in self.failing_ranges):
+            return pd.DataFrame()
+        index = pd.date_range(pd.Timestamp(start_time).ceil('1min'), end_time, freq='1min').tz_convert(TIMEZONE)
+        values = (index.asi8 // 60_000_000_000 % 1000).astype(float)
+        return pd.DataFrame({object_name: values for object_name in tags}, index=index)
+
+
+class TileCacheStorageTest(SimpleTestCase):
+    """
+    Two tile caches on one directory, like two worker processes on a host.
+    """
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.tile_caches = [TileCache(self.directory.name, bucket_minutes=60, retention_hours=24) for _ in range(2)]
+        self.buckets = [pd.Timestamp('2024-01-10T09:00:00Z'), pd.Timestamp('2024-01-10T10:00:00Z')]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def frame(self, tags: list) -> pd.DataFrame:
+        """
+        Returns one point every 5 minutes over the buckets, the value is the minute of the hour.
+        """
+        index = pd.date_range(self.buckets[0], self.buckets[-1] + pd.Timedelta(hours=1), freq='5min', inclusive='left').tz_convert(TIMEZONE)
+        return pd.DataFrame({tag: index.minute.to_numpy(dtype='float64') for tag in tags}, index=index)
+
+    def test_tiles_of_one_worker_are_read_by_the_other(self):
+        writer, reader = self.tile_caches
+        self.assertEqual(reader.missing_buckets(self.buckets, ['TAG_A']), self.buckets)
+        with writer.locked(self.buckets):
+            writer.write(self.buckets, self.frame(['TAG_A', 'TAG_B']))
+
+        self.assertEqual(reader.missing_buckets(self.buckets, ['TAG_A', 'TAG_B']), [])
+        # A tag which was not fetched for the buckets makes them missing
+        self.assertEqual(reader.missing_buckets(self.buckets, ['TAG_A', 'TAG_C']), self.buckets)
+        tiles = reader.read(self.buckets, ['TAG_A'])['TAG_A']
+        self.assertEqual([len(tile) for tile in tiles], [12, 12])
+        self.assertIsInstance(tiles[0], np.memmap)
+        self.assertEqual(tiles[1]['timestamp'][0], self.buckets[1].value)
+        self.assertEqual(list(tiles[0]['value'][:3]), [0.0, 5.0, 10.0])
+
+    def test_corrupt_or_missing_index_marks_the_buckets_missing(self):
+        writer, reader = self.tile_caches
+        writer.write(self.buckets, self.frame(['TAG_A']))
+        index_path = os.path.join(self.directory.name, 'index.json')
+
+        with open(index_path, 'w') as index_file:
+            index_file.write('{"20240110T0900Z": [')
+        self.assertEqual(reader.missing_buckets(self.buckets, ['TAG_A']), self.buckets)
+        os.remove(index_path)
+        self.assertEqual(reader.missing_buckets(self.buckets, ['TAG_A']), self.buckets)
+
+        # Writing the buckets again restores a valid index
+        reader.write(self.buckets, self.frame(['TAG_A']))
+        self.assertEqual(writer.missing_buckets(self.buckets, ['TAG_A']), [])
+
+    def test_only_settled_buckets_are_persisted(self):
+        tile_cache = self.tile_caches[0]
+        self.assertEqual(tile_cache.settled_until(pd.Timestamp('2024-01-10T12:04:00Z')), pd.Timestamp('2024-01-10T11:00:00Z'))
+        self.assertEqual(tile_cache.settled_until(pd.Timestamp('2024-01-10T12:06:00Z')), pd.Timestamp('2024-01-10T12:00:00Z'))
+        self.assertEqual(tile_cache.bucket_starts(pd.Timestamp('2024-01-10T09:30:00Z'), pd.Timestamp('2024-01-10T11:00:00Z')), self.buckets)
+
+    def test_prune_removes_expired_tiles(self):
+        tile_cache = TileCache(self.directory.name, bucket_minutes=60, retention_hours=24)
+        now = pd.Timestamp('2024-01-10T12:00:00Z')
+        buckets = [now - pd.Timedelta(hours=30), now - pd.Timedelta(hours=2)]
+        index = pd.DatetimeIndex([bucket + pd.Timedelta(minutes=5) for bucket in buckets])
+        tile_cache.write(buckets, pd.DataFrame({'TAG': [1.0, 2.0]}, index=index))
+        expired_path = tile_cache._tile_path('TAG', buckets[0])
+        self.assertTrue(os.path.exists(expired_path))
+
+        tile_cache.prune(now)
+        self.assertFalse(os.path.exists(expired_path))
+        self.assertTrue(os.path.exists(tile_cache._tile_path('TAG', buckets[1])))
+        self.assertEqual(tile_cache.missing_buckets(buckets, ['TAG']), [buckets[0]])
+        self.assertEqual(len(tile_cache.read(buckets, ['TAG'])['TAG']), 1)
+
+    def test_prune_keeps_the_lock_of_a_held_bucket(self):
+        writer, other = self.tile_caches
+        writer.write(self.buckets, self.frame(['TAG_A']))
+        acquired = threading.Event()
+
+        def write():
+            with other.locked(self.buckets[:1]):
+                acquired.set()
+
+        # The bucket expires while a worker holds its lock, the lock still excludes the other workers
+        with writer.locked(self.buckets[:1]):
+            writer.prune(pd.Timestamp('2024-01-12T12:00:00Z'))
+            self.assertEqual(other.missing_buckets(self.buckets, ['TAG_A']), self.buckets)
+            thread = threading.Thread(target=write)
+            thread.start()
+            self.assertFalse(acquired.wait(0.2))
+        self.assertTrue(acquired.wait(5))
+        thread.join()
+
+    def test_bucket_lock_excludes_other_writers(self):
+        tile_cache = TileCache(self.directory.name)
+        bucket = pd.Timestamp('2024-01-10T12:00:00Z')
+        acquired = threading.Event()
+
+        def write():
+            with tile_cache.locked([bucket]):
+                acquired.set()
+
+        with tile_cache.locked([bucket]):
+            thread = threading.Thread(target=write)
+            thread.start()
+            self.assertFalse(acquired.wait(0.2))
+        self.assertTrue(acquired.wait(5))
+        thread.join()
+
+
+class IntervalSetTest(SimpleTestCase):
+    def test_add_merges_overlapping_and_touching_intervals(self):
+        interval_set = IntervalSet([(1, 3), (5, 7), (9, 10)])
+        interval_set.add(3, 5)
+        self.assertEqual(interval_set.intervals, [(1, 7), (9, 10)])
+        interval_set.add(0, 20)
+        self.assertEqual(interval_set.intervals, [(0, 20)])
+
+    def test_missing_returns_exact_gaps(self):
+        interval_set = IntervalSet([(2, 4), (6, 8)])
+        self.assertEqual(interval_set.missing(0, 10), [(0, 2), (4, 6), (8, 10)])
+        self.assertEqual(interval_set.missing(3, 7), [(4, 6)])
+        self.assertEqual(interval_set.missing(2, 4), [])
+        self.assertTrue(interval_set.covers(6, 7))
+
+    def test_discard_before_cuts_spanning_interval(self):
+        interval_set = IntervalSet([(1, 3), (5, 9)])
+        interval_set.discard_before(6)
+        self.assertEqual(interval_set.intervals, [(6, 9)])
+
+    def test_discard_splits_intervals_and_keeps_bounds(self):
+        interval_set = IntervalSet([(0, 10), (12, 14), (20, 30)])
+        interval_set.discard(5, 22)
+        self.assertEqual(interval_set.intervals, [(0, 5), (22, 30)])
+        interval_set.discard(30, 40)
+        self.assertEqual(interval_set.intervals, [(0, 5), (22, 30)])
+
+
+class StreamParsingTest(SimpleTestCase):
+    def test_digital_states_are_masked_and_offsets_parsed(self):
+        items = [
+            {'Timestamp': '2024-01-01T00:00:00Z', 'Value': 1.5},
+            {'Timestamp': '2024-01-01T00:01:00.5Z', 'Value': {'Name': 'Shutdown', 'Value': 254}},
+            {'Timestamp': '2024-01-01T00:02:00Z', 'Value': 3},
+        ]
+        timestamps, values, mask = parse_stream_items(items)
+        self.assertEqual(timestamps[1], pd.Timestamp('2024-01-01T00:01:00.5Z').value)
+        self.assertEqual(mask.tolist(), [True, False, True])
+        self.assertEqual(values[2], 3.0)
+        self.assertTrue(np.isnan(values[1]))
+
+        offset_timestamps, _, _ = parse_stream_items([{'Timestamp': '2024-01-01T01:00:00+01:00', 'Value': 1.0}])
+        self.assertEqual(offset_timestamps[0], timestamps[0])
+
+    def test_bools_and_strings_are_masked_in_every_batch(self):
+        items = [
+            {'Timestamp': '2024-01-01T00:00:00Z', 'Value': True},
+            {'Timestamp': '2024-01-01T00:01:00Z', 'Value': '2.5'},
+            {'Timestamp': '2024-01-01T00:02:00Z', 'Value': 1.0},
+        ]
+        digital_state = {'Timestamp': '2024-01-01T00:03:00Z', 'Value': {'Name': 'Shutdown', 'Value': 254}}
+        for batch, expected_mask in ((items, [False, False, True]), (items + [digital_state], [False, False, True, False])):
+            _, values, mask = parse_stream_items(batch)
+            self.assertEqual(mask.tolist(), expected_mask)
+            self.assertEqual(np.isnan(values).tolist(), [not is_number for is_number in expected_mask])
+            self.assertEqual(values[2], 1.0)
+
+    def test_parts_are_merged_and_aligned_by_timestamp(self):
+        first = (np.array([1, 2, 3]), np.array([1.0, 2.0, 3.0]))
+        second = (np.array([3, 4]), np.array([3.0, 4.0]))
+        timestamps, values = merge_stream_arrays([second, first])
+        self.assertEqual(timestamps.tolist(), [1, 2, 3, 4])
+
+        df = frame_from_arrays({'A': (timestamps, values), 'B': (np.array([2, 5]), np.array([20.0, 50.0]))})
+        self.assertEqual(len(df), 5)
+        self.assertEqual(df['B'].isna().tolist(), [True, False, True, True, False])
+
+
+class StreamingDecoderTest(SimpleTestCase):
+    def test_chunked_response_is_decoded_like_the_json_tree(self):
+        response_object = {'Links': {'Self': 'https://pi.example.com'}, 'Items': [
+            {'Name': 'A', 'Path': '\\\\AF|A {"]', 'Items': [{'Timestamp': f'2024-01-01T00:0{i}:00Z', 'Value': i * 1.5} for i in range(8)]},
+            {'Items': [
+                {'Timestamp': '2024-01-01T00:00:00Z', 'Value': {'Name': 'Shutdown', 'Value': 254}},
+                {'Timestamp': '2024-01-01T00:01:00Z', 'Value': 12345678},
+            ], 'Name': 'B'},
+            {'Name': 'C', 'Items': []},
+        ]}
+        body = json.dumps(response_object, indent=2).encode('utf-8')
+        streams = StreamingDecoder(initial_capacity=2, batch_size=3).decode(body[i:i + 5] for i in range(0, len(body), 5))
+
+        self.assertEqual(list(streams), ['A', 'B', 'C'])
+        for item in response_object['Items']:
+            timestamps, values, mask = parse_stream_items(item['Items'])
+            np.testing.assert_array_equal(streams[item['Name']][0], timestamps)
+            np.testing.assert_array_equal(streams[item['Name']][1], values)
+
+    def test_truncated_response_raises(self):
+        with self.assertRaises(ValueError):
+            StreamingDecoder().decode([b'{"Items": [{"Name": "A", "Items": [{"Timestamp": "2024-01-01T00:00:00Z"'])
+
+
+class DownsamplingTest(SimpleTestCase):
+    def test_lttb_keeps_end_points_and_spikes(self):
+        x = np.arange(10_000, dtype='int64') * 60_000_000_000
+        y = np.sin(np.arange(10_000) / 500)
+        y[4321] = 50.0
+        indices = lttb_indices(x, y, 200)
+        self.assertEqual(len(indices), 200)
+        self.assertEqual((indices[0], indices[-1]), (0, 9_999))
+        self.assertIn(4321, indices)
+        self.assertTrue((np.diff(indices) > 0).all())
+
+    def test_response_size_does_not_depend_on_the_range(self):
+        connector = RecordingOSIPIConnector()
+        now = datetime.now(timezone)
+        short_range = connector.get_data(now - timedelta(hours=30), now - timedelta(hours=20), max_points=100)
+        long_range = connector.get_data(now - timedelta(hours=100), now - timedelta(hours=20), max_points=100)
+        self.assertLessEqual(len(short_range), 100)
+        self.assertEqual(len(long_range), len(short_range))
+
+    def test_all_columns_share_the_point_budget(self):
+        index = pd.date_range('2024-01-01', periods=10_000, freq='1min', tz=TIMEZONE)
+        df = pd.DataFrame({f'TAG_{column}': np.sin(np.arange(10_000) / (100 + 50 * column)) for column in range(3)}, index=index)
+        df.iloc[1234, 0], df.iloc[5678, 2] = 50.0, -50.0
+        df.iloc[::7, 1] = np.nan
+        downsampled = downsample_frame(df, 300)
+        # Every line of the graph gets at most 300 points, the spikes of every column survive
+        self.assertLessEqual(len(downsampled), 300)
+        self.assertGreater(len(downsampled), 200)
+        self.assertIn(index[1234], downsampled.index)
+        self.assertIn(index[5678], downsampled.index)
+
+
+class AggregationPyramidTest(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.index = pd.date_range('2024-01-01', periods=3 * 3600, freq='1s', tz='UTC')
+        self.values = rng.normal(100, 10, len(self.index))
+        self.values[::97] = np.nan
+        self.timestamps = self.index.as_unit('ns').asi8
+
+    def test_levels_match_resampling_of_the_raw_data(self):
+        pyramid = AggregationPyramid(['10s', '1min', '15min', '1h'])
+        span = pyramid.update_span(self.index[0], self.index[-1])
+        pyramid.update('A', self.timestamps, self.values, span)
+
+        series = pd.Series(self.values, index=self.index).dropna()
+        for level, frequency in enumerate(['10s', '1min', '15min', '1h']):
+            buckets = pyramid.aggregates['A'][level]
+            expected = series.resample(frequency).agg(['min', 'max', 'mean', 'count', 'last'])
+            np.testing.assert_array_equal(buckets['timestamp'], expected.index.as_unit('ns').asi8)
+            np.testing.assert_allclose(buckets['sum'] / buckets['count'], expected['mean'])
+            for statistic in ('min', 'max', 'count', 'last'):
+                np.testing.assert_array_equal(buckets[statistic], expected[statistic])
+
+    def test_incremental_updates_equal_a_full_rebuild(self):
+        full = AggregationPyramid(['10s', '1min', '15min', '1h'])
+        full.update('A', self.timestamps, self.values, full.update_span(self.index[0], self.index[-1]))
+
+        incremental = AggregationPyramid(['10s', '1min', '15min', '1h'])
+        received = np.zeros(len(self.index), dtype=bool)
+        for first, last in [(5000, 7000), (0, 5001), (7000, len(self.index))]:
+            # Like the connector, all cached raw points of the span are passed, i.e. everything received so far
+            received[first:last] = True
+            span = incremental.update_span(self.index[first], self.index[last - 1])
+            cached = received & (self.timestamps >= span[0]) & (self.timestamps < span[1])
+            incremental.update('A', self.timestamps[cached], self.values[cached], span)
+
+        for level in range(4):
+            np.testing.assert_array_equal(incremental.aggregates['A'][level], full.aggregates['A'][level])
+
+    def test_query_selects_the_finest_level_within_the_budget(self):
+        connector = RecordingOSIPIConnector()
+        now = datetime.now(timezone)
+        start_time, end_time = now - timedelta(hours=90), now - timedelta(hours=20)
+
+        # 4200 raw points per tag, 70 hourly and 280 quarter-hourly buckets
+        df = connector.get_aggregated_data(start_time, end_time, max_points=300, statistic='max')
+        self.assertLessEqual(len(df), 300)
+        self.assertGreater(len(df), 200)
+        self.assertEqual((df.index[1:] - df.index[:-1]).min(), pd.Timedelta('15min'))
+
+        df_raw = connector.get_aggregated_data(end_time - timedelta(minutes=50), end_time, max_points=300)
+        pd.testing.assert_frame_equal(df_raw, connector.get_data(end_time - timedelta(minutes=50), end_time))
+        with self.assertRaises(ValueError):
+            connector.get_aggregated_data(start_time, end_time, statistic='median')
+
+
+class TimeSeriesStoreTest(SimpleTestCase):
+    def test_boundary_duplicates_are_dropped_and_gaps_merged(self):
+        store = TimeSeriesStore(initial_capacity=4)
+        store.insert('A', np.array([10, 20, 30]), np.array([1.0, 2.0, 3.0]))
+        store.insert('A', np.array([30, 40, 50]), np.array([3.5, 4.0, 5.0]))
+        store.insert('A', np.array([0, 5, 10]), np.array([0.0, 0.5, np.nan]))
+        store.insert('A', np.array([25]), np.array([2.5]))
+
+        timestamps, values = store.range('A', 0, 50)
+        self.assertEqual(timestamps.tolist(), [0, 5, 10, 20, 25, 30, 40, 50])
+        self.assertEqual(values.tolist(), [0.0, 0.5, 1.0, 2.0, 2.5, 3.0, 4.0, 5.0])
+        self.assertEqual(store.count('A', 20, 40), 4)
+        self.assertEqual(store.count('B', 20, 40), 0)
+
+    def test_views_stay_valid_after_appends_and_eviction(self):
+        store = TimeSeriesStore(initial_capacity=8)
+        store.insert('A', np.arange(8), np.arange(8.0))
+        timestamps, values = store.range('A', 2, 5)
+        self.assertFalse(values.flags.owndata)
+
+        for start in range(8, 1000, 8):
+            store.insert('A', np.arange(start, start + 8), np.arange(start, start + 8.0))
+            store.discard_before(start - 16)
+        self.assertEqual(timestamps.tolist(), [2, 3, 4, 5])
+        self.assertEqual(values.tolist(), [2.0, 3.0, 4.0, 5.0])
+        self.assertEqual(store.size(), 24)
+        self.assertEqual(store.range('A', 0, 10_000)[0][0], 976)
+        with self.assertRaises(ValueError):
+            values[0] = 1.0
+
+    def test_discard_range_removes_half_open_range(self):
+        store = TimeSeriesStore()
+        store.insert('A', np.arange(0, 100, 10), np.arange(10.0))
+        timestamps, _ = store.range('A', 0, 100)
+        store.discard_range('A', 30, 60)
+        self.assertEqual(store.range('A', 0, 100)[0].tolist(), [0, 10, 20, 60, 70, 80, 90])
+        self.assertEqual(store.nbytes('A'), 7 * 16)
+        self.assertEqual(len(timestamps), 10)
+
+    def test_snapshot_does_not_change_after_writes(self):
+        store = TimeSeriesStore(initial_capacity=4)
+        store.insert('A', np.array([10, 20, 30]), np.array([1.0, 2.0, 3.0]))
+        snapshot = store.snapshot
+        store.insert('A', np.array([40, 50, 60]), np.array([4.0, 5.0, 6.0]))
+        store.insert('A', np.array([15]), np.array([1.5]))
+        store.insert('B', np.array([10]), np.array([1.0]))
+        store.discard_before(20)
+
+        self.assertEqual(snapshot.range('A', 0, 100)[0].tolist(), [10, 20, 30])
+        self.assertEqual(snapshot.size(), 3)
+        self.assertEqual(store.range('A', 0, 100)[0].tolist(), [20, 30, 40, 50, 60])
+        self.assertEqual(store.size(), 5)
+
+
+class SeriesCompressionTest(SimpleTestCase):
+    def test_lossless_round_trip(self):
+        timestamps = 1_700_000_000_000_000_000 + np.cumsum(np.random.default_rng(0).integers(1, 120, 500)) * 1_000_000_000
+        for values in (np.round(np.linspace(800.0, 820.0, 500), 2), np.random.default_rng(1).normal(1000, 50, 500), np.full(500, 3.0), np.array([np.inf, -0.0, 1e300] * 166 + [5e-324, 1.5])):
+            segment = CompressedSegment.encode(timestamps, values)
+            decoded_timestamps, decoded_values = segment.decode()
+            self.assertEqual(decoded_timestamps.tolist(), timestamps.tolist())
+            np.testing.assert_array_equal(decoded_values.view('uint64'), values.view('uint64'))
+            self.assertEqual(segment.count, 500)
+
+    def test_float32_is_compact_and_close(self):
+        timestamps = 1_700_000_000_000_000_000 + np.arange(3600, dtype='int64') * 1_000_000_000
+        values = 1000 + np.cumsum(np.random.default_rng(0).normal(0, 0.01, 3600))
+        segment = CompressedSegment.encode(timestamps, values, 'float32')
+        np.testing.assert_allclose(segment.decode()[1], values, rtol=1e-6)
+        self.assertLess(segment.nbytes, 3600 * 16 / 3)
+        with self.assertRaises(ValueError):
+            CompressedSegment.encode(timestamps, values, 'float16')
+
+    def test_values_beyond_float32_stay_finite(self):
+        timestamps = 1_700_000_000_000_000_000 + np.arange(4, dtype='int64') * 1_000_000_000
+        values = np.array([1e39, -1e300, np.nan, 2.5])
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            segment = CompressedSegment.encode(timestamps, values)
+        np.testing.assert_array_equal(segment.decode()[1], values)
+
+        with self.assertLogs('connectors.SeriesCompression', 'WARNING'):
+            segment = CompressedSegment.encode(timestamps, values, 'float32')
+        np.testing.assert_array_equal(segment.decode()[1], values)
+
+
+class CompressedTimeSeriesStoreTest(SimpleTestCase):
+    minute = 60_000_000_000
+
+    def setUp(self):
+        self.timestamps = np.arange(0, 600 * self.minute, self.minute)
+        self.values = np.round(np.sin(np.arange(600) / 50) * 100, 2)
+        self.plain = TimeSeriesStore()
+        self.compressed = TimeSeriesStore(compression='lossless', bucket_minutes=60)
+        for store in (self.plain, self.compressed):
+            store.insert('A', self.timestamps, self.values)
+
+    def assertStoresEqual(self, start, end):
+        for plain, compressed in zip(self.plain.range('A', start, end), self.compressed.range('A', start, end)):
+            self.assertEqual(plain.tolist(), compressed.tolist())
+        self.assertEqual(self.plain.count('A', start, end), self.compressed.count('A', start, end))
+
+    def test_cold_buckets_are_compressed_and_reads_are_unchanged(self):
+        self.compressed.compress_before(490 * self.minute)
+        self.assertEqual(len(self.compressed.snapshot._segments['A']), 8)
+        self.assertEqual(len(self.compressed.snapshot._arrays['A'][0]), 120)
+        self.assertLess(self.compressed.nbytes(), self.plain.nbytes() / 3)
+        self.assertEqual(self.compressed.size(), 600)
+        for start, end in ((0, 10**15), (90 * self.minute, 150 * self.minute), (470 * self.minute + 1, 500 * self.minute), (-5, -1)):
+            self.assertStoresEqual(start, end)
+        self.assertFalse(self.compressed.range('A', 0, 10**15)[1].flags.writeable)
+
+    def test_inserts_and_discards_reach_compressed_buckets(self):
+        self.compressed.compress_before(300 * self.minute)
+        snapshot = self.compressed.snapshot
+        for store in (self.plain, self.compressed):
+            store.insert('A', np.array([30 * self.minute, 30 * self.minute + 1, 400 * self.minute]), np.array([0.0, 7.5, 0.0]))
+            store.discard_range('A', 100 * self.minute, 130 * self.minute)
+            store.discard_before(50 * self.minute + 1)
+        self.assertStoresEqual(0, 10**15)
+        self.assertEqual(self.compressed.range('A', 0, 10**15)[0][0], 51 * self.minute)
+        self.assertEqual(snapshot.count('A', 0, 10**15), 600)
+
+    def test_connector_serves_compressed_data(self):
+        now = datetime.now(timezone).replace(second=0, microsecond=0)
+        plain, compressed = RecordingOSIPIConnector(), RecordingOSIPIConnector(compression='lossless')
+        for connector in (plain, compressed):
+            connector.get_data(now - timedelta(hours=30), now - timedelta(hours=1))
+        self.assertTrue(compressed.snapshot.store._segments)
+        self.assertLess(compressed.get_cache_stats()['bytes'], plain.get_cache_stats()['bytes'])
+        pd.testing.assert_frame_equal(compressed.get_data(now - timedelta(hours=20), now - timedelta(hours=2)), plain.get_data(now - timedelta(hours=20), now - timedelta(hours=2)))
+
+
+class CacheCheckpointTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = f'{self.directory.name}/cache/checkpoint.bin'
+        self.now = datetime.now(timezone).replace(second=0, microsecond=0)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_restart_restores_the_cache_and_fetches_only_the_gap(self):
+        connector = RecordingOSIPIConnector(checkpoint_path=self.path)
+        connector.get_data(self.now - timedelta(days=4), self.now - timedelta(hours=1))
+        self.assertFalse(connector.save_checkpoint_if_due(interval_seconds=3600))
+        self.assertTrue(connector.save_checkpoint_if_due(interval_seconds=0))
+        self.assertFalse(connector.save_checkpoint_if_due(interval_seconds=0))
+        df_before = connector.get_data(self.now - timedelta(days=4), self.now - timedelta(hours=1))
+
+        restarted = RecordingOSIPIConnector(checkpoint_path=self.path)
+        df_after = restarted.get_data(self.now - timedelta(days=4), self.now - timedelta(hours=1))
+        self.assertEqual(restarted.requested_ranges, [])
+        pd.testing.assert_frame_equal(df_after, df_before)
+        self.assertEqual(len(restarted.get_aggregated_data(self.now - timedelta(days=4), self.now - timedelta(hours=1), max_points=200)), 96)
+
+        restarted.update_tail()
+        self.assertEqual(len(restarted.requested_ranges), 1)
+        self.assertEqual(restarted.requested_ranges[0][0], connector.cached_until())
+
+    def test_tags_with_changed_webid_are_not_restored(self):
+        connector = RecordingOSIPIConnector(checkpoint_path=self.path)
+        connector.get_data(self.now - timedelta(hours=3), self.now - timedelta(hours=1))
+        connector.save_checkpoint()
+
+        changed_tag, unchanged_tag = OSI_PI_PARAMETERS_REQUESTED[:2]
+        webid_mapping = dict(OSI_PI_WEBID_MAPPING, **{changed_tag: 'F1DP-CHANGED'})
+        saved_at, arrays, coverage = CacheCheckpoint(self.path).load(webid_mapping)
+        self.assertNotIn(changed_tag, coverage)
+        self.assertEqual(arrays[unchanged_tag][0].tolist(), connector.store.range(unchanged_tag, 0, 2**62)[0].tolist())
+        self.assertEqual(list(coverage[unchanged_tag]), list(connector.coverage[unchanged_tag]))
+        self.assertLessEqual(saved_at, pd.Timestamp.now(tz='UTC'))
+
+    def test_invalid_checkpoint_starts_empty(self):
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, 'wb') as checkpoint_file:
+            checkpoint_file.write(b'not a checkpoint')
+        with self.assertRaises(ValueError):
+            CacheCheckpoint(self.path).load(OSI_PI_WEBID_MAPPING)
+        with self.assertLogs('connectors.OSIPIConnector', 'ERROR'):
+            connector = RecordingOSIPIConnector(checkpoint_path=self.path)
+        self.assertEqual(connector.store.size(), 0)
+
+    def test_truncated_or_corrupted_checkpoint_starts_empty(self):
+        connector = RecordingOSIPIConnector(checkpoint_path=self.path)
+        connector.get_data(self.now - timedelta(hours=3), self.now - timedelta(hours=1))
+        connector.save_checkpoint()
+        with open(self.path, 'rb') as checkpoint_file:
+            data = checkpoint_file.read()
+
+        # The last segment cut short by 10 bytes, and the compressed bytes of the last segment overwritten
+        for damaged in (data[:-10], data[:-40] + bytes(40)):
+            with open(self.path, 'wb') as checkpoint_file:
+                checkpoint_file.write(damaged)
+            with self.assertRaisesRegex(ValueError, 'Invalid cache checkpoint'):
+                CacheCheckpoint(self.path).load(OSI_PI_WEBID_MAPPING)
+            with self.assertLogs('connectors.OSIPIConnector', 'ERROR'):
+                restarted = RecordingOSIPIConnector(checkpoint_path=self.path)
+            self.assertEqual(restarted.store.size(), 0)
+            self.assertEqual(len(restarted.get_data(self.now - timedelta(hours=3), self.now - timedelta(hours=1))), 121)
+
+
+class LazyConnectorTest(SimpleTestCase):
+    def test_connector_is_constructed_once_on_first_use(self):
+        constructed = []
+
+        def factory():
+            constructed.append(RecordingOSIPIConnector())
+            return constructed[-1]
+
+        connector = LazyConnector(factory)
+        self.assertFalse(connector.is_initialized())
+        self.assertEqual(constructed, [])
+
+        connector.warm_up()
+        connector.get_data()
+        self.assertEqual(len(constructed), 1)
+        self.assertTrue(constructed[0].coverage[OSI_PI_PARAMETERS_REQUESTED[0]])
+
+    def test_construction_does_no_io(self):
+        connector = RecordingOSIPIConnector()
+        self.assertEqual(connector.requested_ranges, [])
+        self.assertEqual(connector.store.size(), 0)
+
+    def test_tests_import_without_credentials(self):
+        # The connector tests must run without a PI server, so importing them and the modules using the shared
+        # connector may not construct it
+        script = (
+            "import django; django.setup(); import connectors.tests, dashboard, algorithmus, connectors; "
+            "assert not connectors.instantiated_osipiconnector.is_initialized()"
+        )
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE='aurubis_advisory_model.settings', OSI_PI_BASE_URL='', OSI_PI_USERNAME='', OSI_PI_PASSWORD='')
+        result = subprocess.run([sys.executable, '-c', script], cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), env=env, capture_output=True, text=True, timeout=120)
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+
+class OSIPIConnectorCoverageTest(SimpleTestCase):
+    def setUp(self):
+        self.connector = RecordingOSIPIConnector()
+        self.connector.requested_ranges.clear()
+        self.now = datetime.now(timezone).replace(second=0, microsecond=0)
+
+    def test_cached_range_is_not_requested_again(self):
+        start_time = self.now - timedelta(hours=6)
+        self.connector.get_data(start_time, self.now - timedelta(hours=5))
+        self.connector.requested_ranges.clear()
+
+        df = self.connector.get_data(start_time + timedelta(minutes=10), self.now - timedelta(hours=5))
+        self.assertEqual(self.connector.requested_ranges, [])
+        self.assertEqual(len(df), 51)
+
+    def test_only_missing_sub_intervals_are_requested(self):
+        self.connector.coverage = {object_name: IntervalSet() for object_name in OSI_PI_PARAMETERS_REQUESTED}
+        self.connector.store = TimeSeriesStore()
+        first_start, first_end = self.now - timedelta(hours=50), self.now - timedelta(hours=49)
+        second_start, second_end = self.now - timedelta(hours=47), self.now - timedelta(hours=46)
+        self.connector.get_data(first_start, first_end)
+        self.connector.get_data(second_start, second_end)
+        self.connector.requested_ranges.clear()
+
+        # Only the hole between both ranges and the part before the first range are requested
+        self.connector.get_data(first_start - timedelta(hours=1), second_end)
+        self.assertEqual(self.connector.requested_ranges, [
+            (first_start - timedelta(hours=1), first_start),
+            (first_end, second_start),
+        ])
+
+    def test_failed_request_leaves_a_hole_which_is_refetched(self):
+        start_time, end_time = self.now - timedelta(hours=60), self.now - timedelta(hours=59)
+        self.connector.failing_ranges = [(start_time, end_time)]
+        self.assertTrue(self.connector.get_data(start_time, end_time).empty)
+        self.assertFalse(self.connector.coverage[OSI_PI_PARAMETERS_REQUESTED[0]].covers(start_time, end_time))
+
+        self.connector.failing_ranges = []
+        self.connector.requested_ranges.clear()
+        df = self.connector.get_data(start_time, end_time)
+        self.assertEqual(self.connector.requested_ranges, [(start_time, end_time)])
+        self.assertEqual(len(df), 61)
+        self.assertTrue(np.isfinite(df.to_numpy(dtype=float)).all())
+
+    def test_only_the_requested_tags_are_fetched_and_returned(self):
+        object_name, other_name = OSI_PI_PARAMETERS_REQUESTED[0], OSI_PI_PARAMETERS_REQUESTED[1]
+        start_time, end_time = self.now - timedelta(hours=40), self.now - timedelta(hours=39)
+        df = self.connector.get_data(start_time, end_time, tags=[object_name])
+        self.assertEqual(list(df.columns), [object_name])
+        self.assertEqual(self.connector.requested_tags[-1], [object_name])
+        self.assertFalse(self.connector.coverage[other_name])
+
+        # The other tags are fetched lazily on their first use, the cached tag is not requested again
+        self.connector.requested_tags.clear()
+        df = self.connector.get_data(start_time, end_time)
+        self.assertEqual(list(df.columns), OSI_PI_PARAMETERS_REQUESTED)
+        self.assertEqual(self.connector.requested_tags, [[name for name in OSI_PI_PARAMETERS_REQUESTED if name != object_name]])
+
+    def test_unknown_tags_are_rejected(self):
+        with self.assertRaises(ValueError):
+            self.connector.get_data(tags=['NOT_A_TAG'])
+
+
+class OSIPIConnectorSessionTest(SimpleTestCase):
+    def setUp(self):
+        self.stand_in = PIWebAPIStandIn(interval_seconds=300).start()
+        # A single chunk per call, so every get_data sends exactly one request
+        self.connector = OSIPIConnector(
+            self.stand_in.base_url, 'user', 'password', tile_cache_directory='',
+            request_window_hours=24 * 7, tags_per_request=len(OSI_PI_PARAMETERS_REQUESTED),
+        )
+
+    def tearDown(self):
+        self.connector.close()
+        self.stand_in.stop()
+
+    def test_connection_is_reused_and_bytes_are_counted(self):
+        now = datetime.now(timezone)
+        self.connector.get_data(now - timedelta(days=3), now - timedelta(days=2))
+        self.connector.get_data(now - timedelta(days=4), now - timedelta(days=3))
+
+        request_stats = self.connector.get_request_stats()
+        self.assertEqual(request_stats['requests'], 2)
+        self.assertEqual(request_stats['connections_opened'], 1)
+        self.assertEqual(request_stats['connections_reused'], 1)
+        self.assertEqual(self.stand_in.stats['connections'], 1)
+        self.assertEqual(request_stats['bytes_received'], self.stand_in.stats['bytes_sent'])
+
+    def test_response_is_compressed_and_trimmed(self):
+        now = datetime.now(timezone)
+        bytes_before = self.connector.get_request_stats()['bytes_received']
+        df = self.connector.get_data(now - timedelta(days=3), now - timedelta(days=2))
+        bytes_received = self.connector.get_request_stats()['bytes_received'] - bytes_before
+
+        params = [('webid', webid) for webid in self.stand_in.webid_mapping.values()]
+        params += [('startTime', (now - timedelta(days=3)).isoformat()), ('endTime', (now - timedelta(days=2)).isoformat())]
+        full_response, points = self.stand_in.recorded(params)
+        self.assertEqual(df.count().sum(), points)
+        self.assertLess(bytes_received * 10, len(json.dumps(full_response)))
+
+    def test_streaming_decoding_returns_the_same_data(self):
+        now = datetime.now(timezone)
+        start_time, end_time = now - timedelta(days=3), now - timedelta(days=2)
+        df_streamed = self.connector._retrieve_data(start_time, end_time, streaming=True)
+        df_parsed = self.connector._retrieve_data(start_time, end_time)
+
+        pd.testing.assert_frame_equal(df_streamed, df_parsed)
+        self.assertEqual(len(self.connector.get_data(start_time, end_time, streaming=True)), 288)
+        request_stats = self.connector.get_request_stats()
+        self.assertEqual(request_stats['connections_opened'], 1)
+        self.assertEqual(request_stats['bytes_received'], self.stand_in.stats['bytes_sent'])
+
+
+class OSIPIConnectorChunkingTest(SimpleTestCase):
+    def setUp(self):
+        self.stand_in = PIWebAPIStandIn(interval_seconds=300).start()
+
+    def tearDown(self):
+        self.stand_in.stop()
+
+    def test_truncated_streams_are_paged_and_chunks_stitched(self):
+        connector = OSIPIConnector(
+            self.stand_in.base_url, 'user', 'password', tile_cache_directory='',
+            request_window_hours=24, tags_per_request=5, max_count=100, request_workers=4,
+        )
+        now = datetime.now(timezone)
+        start_time, end_time = now - timedelta(days=4, hours=12), now - timedelta(days=2)
+        requests_before = self.stand_in.stats['requests']
+        df = connector.get_data(start_time, end_time)
+        connector.close()
+
+        # 60 hours are split into 3 windows and 22 tags into 5 groups, each stream holds 720 values and needs 8 pages
+        expected_index = pd.date_range(pd.Timestamp(start_time).ceil('300s'), end_time, freq='300s')
+        self.assertEqual(len(df), len(expected_index))
+        self.assertTrue(df.index.equals(expected_index.tz_convert(TIMEZONE)))
+        self.assertFalse(df.isna().any().any())
+        self.assertGreater(self.stand_in.stats['requests'] - requests_before, 3 * 5)
+        self.assertAlmostEqual(df[OSI_PI_PARAMETERS_REQUESTED[0]].iloc[-1], self.stand_in.value(OSI_PI_PARAMETERS_REQUESTED[0], expected_index[-1]))
+
+
+class TailPollerTest(SimpleTestCase):
+    def test_poll_requests_only_the_new_tail(self):
+        connector = RecordingOSIPIConnector()
+        poller = TailPoller(connector, interval_seconds=60)
+        self.assertIsNone(poller.get_stats()['staleness_seconds'])
+
+        self.assertTrue(poller.poll_once())
+        cached_until = connector.cached_until()
+        connector.requested_ranges.clear()
+
+        self.assertTrue(poller.poll_once())
+        self.assertEqual(len(connector.requested_ranges), 1)
+        self.assertEqual(connector.requested_ranges[0][0], cached_until)
+        stats = poller.get_stats()
+        self.assertEqual((stats['polls'], stats['failures']), (2, 0))
+        self.assertLess(stats['staleness_seconds'], 5)
+
+    def test_failed_polls_are_counted_and_staleness_grows(self):
+        connector = RecordingOSIPIConnector()
+        poller = TailPoller(connector, interval_seconds=60)
+        poller.poll_once()
+        connector.failing_ranges = [(connector.cached_until(), datetime.now(timezone) + timedelta(days=1))]
+
+        staleness_before = poller.get_stats()['staleness_seconds']
+        poller.poll_once()
+        stats = poller.get_stats()
+        self.assertEqual(stats['failures'], 0)  # A failed request is no exception, the window just stays behind
+        self.assertGreaterEqual(stats['staleness_seconds'], staleness_before)
+
+        connector.update_tail = lambda: 1 / 0
+        with self.assertLogs('connectors.TailPoller', level='ERROR'):
+            self.assertFalse(poller.poll_once())
+        self.assertEqual(poller.get_stats()['failures'], 1)
+        self.assertIn('ZeroDivisionError', poller.get_stats()['last_error'])
+
+    def test_thread_polls_until_stopped(self):
+        connector = RecordingOSIPIConnector()
+        poller = TailPoller(connector, interval_seconds=0.05, jitter_seconds=0.01).start()
+        self.assertIs(poller.start(), poller)
+        deadline = datetime.now() + timedelta(seconds=5)
+        while poller.get_stats()['polls'] < 3 and datetime.now() < deadline:
+            time.sleep(0.01)
+        poller.stop(timeout=5)
+        self.assertFalse(poller.is_running())
+        self.assertGreaterEqual(poller.get_stats()['polls'], 3)
+
+
+class PrefetcherTest(SimpleTestCase):
+    def setUp(self):
+        self.connector = RecordingOSIPIConnector()
+        self.tags = [OSI_PI_PARAMETERS_REQUESTED[0]]
+        self.day = datetime.now(timezone).replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=3)
+
+    def read(self, prefetcher: Prefetcher, start_time: datetime, end_time: datetime, session_id: str = 'session') -> list:
+        self.connector.get_data(start_time, end_time, tags=self.tags)
+        return prefetcher.record_access(session_id, self.tags, start_time, end_time)
+
+    def test_paging_day_by_day_is_served_from_the_prefetched_windows(self):
+        prefetcher = Prefetcher(self.connector, budget_per_minute=60)
+        windows = self.read(prefetcher, self.day, self.day + timedelta(days=1))
+        self.assertEqual(windows, [(self.day + timedelta(days=1), self.day + timedelta(days=2)), (self.day - timedelta(days=1), self.day)])
+        cache_stats = self.connector.get_cache_stats()
+        self.assertEqual(prefetcher.prefetch_pending(), 2)
+        self.assertEqual(self.connector.get_cache_stats()['misses'], cache_stats['misses'])
+
+        # The next day is served from the cache, the one after it is prefetched as the continuation of the step
+        self.connector.requested_ranges.clear()
+        windows = self.read(prefetcher, self.day + timedelta(days=1), self.day + timedelta(days=2))
+        self.assertEqual(self.connector.requested_ranges, [])
+        self.assertEqual(windows, [(self.day + timedelta(days=2), self.day + timedelta(days=3))])
+        stats = prefetcher.get_stats()
+        self.assertEqual((stats['accesses'], stats['prefetched'], stats['served']), (2, 2, 1))
+
+    def test_predictions_follow_the_last_step_of_the_session(self):
+        prefetcher = Prefetcher(self.connector)
+        hours, day = timedelta(hours=8), self.day + timedelta(days=1)
+        shift = day - hours
+        self.assertEqual(prefetcher.predict((day, day + hours), shift, shift + hours), [
+            (shift - hours, shift),
+            (shift + hours, shift + 2 * hours),
+            (shift - timedelta(days=1), shift - timedelta(days=1) + hours),
+            (shift + timedelta(days=1), shift + timedelta(days=1) + hours),
+        ])
+        # Windows end at the latest now, windows beyond the retention and longer than max_window_hours are not predicted
+        now = datetime.now(timezone)
+        self.assertEqual(prefetcher.predict(None, now - hours, now)[0], (now - 2 * hours, now - hours))
+        self.assertEqual(prefetcher.predict(None, self.day - timedelta(days=3), self.day), [])
+        self.assertEqual(prefetcher.predict(None, now - timedelta(days=4, hours=20), now - timedelta(days=4, hours=12)), [
+            (now - timedelta(days=4, hours=12), now - timedelta(days=4, hours=4)),
+            (now - timedelta(days=3, hours=20), now - timedelta(days=3, hours=12)),
+        ])
+
+    def test_queue_and_budget_are_bounded(self):
+        prefetcher = Prefetcher(self.connector, budget_per_minute=1, max_pending=3)
+        for session_id in ('first', 'second'):
+            self.read(prefetcher, self.day, self.day + timedelta(hours=6), session_id=session_id)
+        self.read(prefetcher, self.day + timedelta(days=1), self.day + timedelta(days=1, hours=6), session_id='third')
+        stats = prefetcher.get_stats()
+        self.assertEqual(stats['pending'], 3)
+        self.assertEqual(stats['dropped'], stats['scheduled'] - 3)
+
+        self.connector.requested_ranges.clear()
+        self.assertEqual(prefetcher.prefetch_pending(), 1)
+        self.assertEqual(self.connector.requested_ranges, [(self.day + timedelta(days=1, hours=6), self.day + timedelta(days=1, hours=12))])
+        self.assertEqual(prefetcher.get_stats()['pending'], 2)
+
+    def test_thread_prefetches_until_stopped(self):
+        prefetcher = Prefetcher(self.connector, budget_per_minute=60).start()
+        self.read(prefetcher, self.day, self.day + timedelta(days=1))
+        deadline = time.monotonic() + 5
+        while prefetcher.get_stats()['prefetched'] < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        prefetcher.stop(timeout=5)
+        self.assertFalse(prefetcher.is_running())
+        self.assertTrue(self.connector.is_cached(self.day - timedelta(days=1), self.day + timedelta(days=2), tags=self.tags))
+
+
+class IncrementalPollTest(SimpleTestCase):
+    """
+    Counts the points the local stand-in transfers per incremental request, only genuinely new points are expected.
+    """
+    def setUp(self):
+        self.stand_in = PIWebAPIStandIn(interval_seconds=60).start()
+        self.connector = OSIPIConnector(
+            self.stand_in.base_url, 'user', 'password', tile_cache_directory='',
+            request_window_hours=24 * 7, tags_per_request=len(OSI_PI_PARAMETERS_REQUESTED),
+        )
+
+    def tearDown(self):
+        self.connector.close()
+        self.stand_in.stop()
+
+    def points_transferred(self, function, *args, **kwargs) -> int:
+        points_before = self.stand_in.stats['points_served']
+        function(*args, **kwargs)
+        return self.stand_in.stats['points_served'] - points_before
+
+    def expected_points(self, start_time: datetime, end_time: datetime) -> int:
+        # The requested range is widened to whole seconds, the stand-in records one value per tag and minute
+        start_time, end_time = pd.Timestamp(start_time).floor('s'), pd.Timestamp(end_time).ceil('s')
+        return len(pd.date_range(start_time.ceil('60s'), end_time, freq='60s')) * len(OSI_PI_PARAMETERS_REQUESTED)
+
+    def test_extending_the_cached_range_transfers_only_new_points(self):
+        now = datetime.now(timezone)
+        start_time, end_time = now - timedelta(hours=5, seconds=17), now - timedelta(hours=3, seconds=17)
+        self.assertEqual(self.points_transferred(self.connector.get_data, start_time, end_time), self.expected_points(start_time, end_time))
+
+        for minutes in (10, 1, 45):
+            new_end_time = end_time + timedelta(minutes=minutes)
+            points = self.points_transferred(self.connector.get_data, start_time, new_end_time)
+            self.assertEqual(points, self.expected_points(end_time, new_end_time))
+            end_time = new_end_time
+
+        self.assertEqual(self.points_transferred(self.connector.get_data, start_time, end_time), 0)
+
+    def test_tail_poll_transfers_only_new_points(self):
+        self.connector.update_tail()
+        for _ in range(2):
+            cached_until = self.connector.cached_until()
+            points = self.points_transferred(self.connector.update_tail)
+            self.assertEqual(points, self.expected_points(cached_until, self.connector.cached_until()))
+            self.assertLessEqual(points, 2 * len(OSI_PI_PARAMETERS_REQUESTED))
+
+
+class SingleFlightTest(SimpleTestCase):
+    threads = 16
+
+    def setUp(self):
+        # The latency makes sure that concurrent requests overlap
+        self.stand_in = PIWebAPIStandIn(interval_seconds=300, latency_seconds=0.05).start()
+        self.connector = OSIPIConnector(
+            self.stand_in.base_url, 'user', 'password', tile_cache_directory='',
+            request_window_hours=24 * 7, tags_per_request=len(OSI_PI_PARAMETERS_REQUESTED),
+        )
+        # Off the 5 minute grid of the stand-in, so no recorded value lies on the boundary of two requests
+        self.base = pd.Timestamp(datetime.now(timezone)).floor('5min').to_pydatetime() - timedelta(hours=10) + timedelta(seconds=17)
+
+    def tearDown(self):
+        self.connector.close()
+        self.stand_in.stop()
+
+    def run_concurrently(self, ranges: list) -> list:
+        barrier = threading.Barrier(len(ranges))
+        results = [None] * len(ranges)
+
+        def query(index, start_time, end_time):
+            barrier.wait()
+            results[index] = self.connector.get_data(start_time, end_time)
+
+        threads = [threading.Thread(target=query, args=(index, *time_range)) for index, time_range in enumerate(ranges)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(30)
+        return results
+
+    def test_identical_queries_share_one_request(self):
+        time_range = (self.base, self.base + timedelta(hours=2))
+        results = self.run_concurrently([time_range] * self.threads)
+
+        self.assertEqual(self.stand_in.stats['requests'], 1)
+        self.assertEqual(self.connector.in_flight.in_flight(), [])
+        for df in results:
+            self.assertEqual(len(df), 24)
+            pd.testing.assert_frame_equal(df, results[0])
+
+    def test_overlapping_queries_request_every_point_once(self):
+        ranges = [(self.base + timedelta(minutes=7 * index), self.base + timedelta(hours=1, minutes=7 * index)) for index in range(self.threads)]
+        results = self.run_concurrently(ranges)
+
+        union = pd.date_range(pd.Timestamp(ranges[0][0]).ceil('5min'), ranges[-1][1], freq='5min')
+        self.assertEqual(self.stand_in.stats['points_served'], len(union) * len(OSI_PI_PARAMETERS_REQUESTED))
+        for (start_time, end_time), df in zip(ranges, results):
+            self.assertEqual(len(df), len(pd.date_range(pd.Timestamp(start_time).ceil('5min'), end_time, freq='5min')))
+            self.assertTrue(np.isfinite(df.to_numpy(dtype=float)).all())
+
+    def test_claim_returns_only_unclaimed_parts(self):
+        registry = InFlightRegistry()
+        fetch = registry.register(['A', 'B'], 10, 20)
+        self.assertEqual(registry.claim('A', [(0, 30)]), ([(0, 10), (20, 30)], {fetch}))
+        self.assertEqual(registry.claim('C', [(0, 30)]), ([(0, 30)], set()))
+
+        registry.complete(fetch, succeeded=True)
+        self.assertTrue(fetch.wait(0))
+        self.assertEqual(registry.claim('A', [(0, 30)]), ([(0, 30)], set()))
+
+
+class CacheSnapshotTest(SimpleTestCase):
+    def test_readers_see_consistent_snapshots_while_the_cache_is_written(self):
+        connector = RecordingOSIPIConnector()
+        now = datetime.now(timezone).replace(second=0, microsecond=0)
+        start_time, end_time = now - timedelta(hours=20), now - timedelta(hours=19)
+        connector.get_data(start_time, end_time)
+        stop, errors = threading.Event(), []
+
+        def write():
+            # Backfills in front of the cached range, every insert is merged into newly allocated arrays
+            for hours in range(1, 40):
+                connector.get_data(start_time - timedelta(hours=hours), start_time - timedelta(hours=hours - 1))
+            stop.set()
+
+        def read():
+            while not stop.is_set():
+                snapshot = connector.snapshot
+                df = connector.get_data(start_time, end_time)
+                if len(df) != 61 or not df.index.is_monotonic_increasing or df.isna().any().any():
+                    errors.append(df)
+                # Everything a snapshot claims to cover is in its store
+                for object_name, interval_set in snapshot.coverage.items():
+                    for covered_start, covered_end in interval_set:
+                        if snapshot.store.count(object_name, covered_start, covered_end) != (covered_end - covered_start) // timedelta(minutes=1) + 1:
+                            errors.append((object_name, covered_start, covered_end))
+
+        readers = [threading.Thread(target=read) for _ in range(4)]
+        for reader in readers:
+            reader.start()
+        write()
+        for reader in readers:
+            reader.join(30)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(connector.snapshot.coverage[OSI_PI_PARAMETERS_REQUESTED[0]].intervals, [(start_time - timedelta(hours=39), end_time)])
+        self.assertGreater(connector.snapshot.version, 39)
+
+
+class TileCacheTest(SimpleTestCase):
+    """
+    Two connectors sharing a tile cache directory, like two worker processes on a host.
+    """
+    def setUp(self):
+        self.stand_in = PIWebAPIStandIn(interval_seconds=300).start()
+        self.directory = tempfile.TemporaryDirectory()
+        self.workers = []
+        self.worker()
+        self.worker()
+        # Whole buckets well before the settle time, so the range is served from tiles only
+        self.start_time = pd.Timestamp(datetime.now(timezone)).floor('1h').to_pydatetime() - timedelta(hours=10)
+        self.end_time = self.start_time + timedelta(hours=4)
+
+    def tearDown(self):
+        for worker in self.workers:
+            worker.close()
+        self.stand_in.stop()
+        self.directory.cleanup()
+
+    def worker(self) -> OSIPIConnector:
+        """
+        Returns a new connector with an empty memory cache on the shared tile cache directory.
+        """
+        self.workers.append(OSIPIConnector(
+            self.stand_in.base_url, 'user', 'password', tile_cache_directory=self.directory.name,
+            request_window_hours=24 * 7, tags_per_request=len(OSI_PI_PARAMETERS_REQUESTED),
+        ))
+        return self.workers[-1]
+
+    def test_second_worker_reads_the_tiles_of_the_first(self):
+        expected = self.workers[0].get_data(self.start_time, self.end_time)
+        requests_after_first = self.stand_in.stats['requests']
+        self.assertGreater(requests_after_first, 0)
+
+        df = self.workers[1].get_data(self.start_time, self.end_time)
+        self.assertEqual(self.stand_in.stats['requests'], requests_after_first)
+        pd.testing.assert_frame_equal(df, expected)
+
+        tile_cache = self.workers[1].tile_cache
+        buckets = tile_cache.bucket_starts(self.start_time, self.end_time)
+        self.assertEqual(len(buckets), 4)
+        self.assertEqual(tile_cache.missing_buckets(buckets, OSI_PI_PARAMETERS_REQUESTED), [])
+        tiles = tile_cache.read(buckets, OSI_PI_PARAMETERS_REQUESTED[:1])[OSI_PI_PARAMETERS_REQUESTED[0]]
+        self.assertEqual([len(tile) for tile in tiles], [12, 12, 12, 12])
+        self.assertIsInstance(tiles[0], np.memmap)
+
+        # A longer range only fetches the buckets not on disk yet
+        self.workers[1].get_data(self.start_time - timedelta(hours=2), self.end_time)
+        self.assertEqual(self.stand_in.stats['requests'], requests_after_first + 1)
+
+    def test_corrupt_or_missing_index_refetches_the_buckets(self):
+        expected = self.workers[0].get_data(self.start_time, self.end_time)
+        index_path = os.path.join(self.directory.name, 'index.json')
+
+        with open(index_path, 'w') as index_file:
+            index_file.write('{"20240101T0000Z": [')
+        requests_before = self.stand_in.stats['requests']
+        pd.testing.assert_frame_equal(self.workers[1].get_data(self.start_time, self.end_time), expected)
+        self.assertGreater(self.stand_in.stats['requests'], requests_before)
+        with open(index_path) as index_file:
+            self.assertEqual(len(json.load(index_file)), 4)
+
+        os.remove(index_path)
+        requests_before = self.stand_in.stats['requests']
+        pd.testing.assert_frame_equal(self.worker().get_data(self.start_time, self.end_time), expected)
+        self.assertGreater(self.stand_in.stats['requests'], requests_before)
+        self.assertTrue(os.path.exists(index_path))
+
+
+class SharedSegmentTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.writer = RecordingOSIPIConnector(shared_segment_directory=self.directory.name, shared_segment_writer=True)
+        self.reader = RecordingOSIPIConnector(shared_segment_directory=self.directory.name)
+        self.now = datetime.now(timezone).replace(second=0, microsecond=0)
+
+    def tearDown(self):
+        self.writer.close()
+        self.reader.close()
+        self.directory.cleanup()
+
+    def test_readers_are_served_zero_copy_from_the_writer(self):
+        start_time, end_time = self.now - timedelta(hours=30), self.now - timedelta(hours=29)
+        expected = self.writer.get_data(start_time, end_time)
+        df = self.reader.get_data(start_time, end_time)
+        self.assertEqual(self.reader.requested_ranges, [])
+        pd.testing.assert_frame_equal(df, expected)
+
+        snapshot = self.reader.shared_segment.read()
+        timestamps, values = snapshot.store.range(OSI_PI_PARAMETERS_REQUESTED[0], start_time, end_time)
+        self.assertIsInstance(values.base, np.memmap)
+        self.assertFalse(values.flags.writeable)
+        self.assertEqual(len(timestamps), 61)
+
+    def test_sequence_number_reveals_updates(self):
+        start_time = self.now - timedelta(hours=30)
+        self.writer.get_data(start_time, start_time + timedelta(hours=1))
+        sequence = self.reader.shared_segment.sequence()
+        self.assertIs(self.reader.shared_segment.read(), self.reader.shared_segment.read())
+
+        # The segment is rewritten at most every OSI_PI_SHARED_SEGMENT_PUBLISH_INTERVAL_SECONDS, the tail poller publishes the rest
+        self.writer.get_data(start_time + timedelta(hours=1), start_time + timedelta(hours=2))
+        self.assertEqual(self.reader.shared_segment.sequence(), sequence)
+        self.assertTrue(self.writer.publish_shared_segment_if_due(interval_seconds=0))
+        self.assertFalse(self.writer.publish_shared_segment_if_due(interval_seconds=0))
+        self.assertGreater(self.reader.shared_segment.sequence(), sequence)
+        self.assertEqual(len(self.reader.get_data(start_time, start_time + timedelta(hours=2))), 121)
+        self.assertEqual(self.reader.requested_ranges, [])
+
+    def test_ranges_missing_in_the_segment_are_fetched_by_the_reader(self):
+        self.writer.get_data(self.now - timedelta(hours=30), self.now - timedelta(hours=29))
+        start_time, end_time = self.now - timedelta(hours=40), self.now - timedelta(hours=39)
+        self.assertEqual(len(self.reader.get_data(start_time, end_time)), 61)
+        self.assertEqual(self.reader.requested_ranges, [(start_time, end_time)])
+
+    def test_only_the_writer_writes(self):
+        with self.assertRaises(ValueError):
+            SharedSegment(self.directory.name).write(self.writer.snapshot)
+
+    def test_segment_is_written_without_the_cache_lock(self):
+        lock_available = []
+        write = self.writer.shared_segment.write
+
+        def take_cache_lock():
+            lock_available.append(self.writer._cache_lock.acquire(timeout=1))
+            if lock_available[-1]:
+                self.writer._cache_lock.release()
+
+        def write_checking_the_lock(snapshot):
+            thread = threading.Thread(target=take_cache_lock)
+            thread.start()
+            thread.join()
+            return write(snapshot)
+
+        self.writer.shared_segment.write = write_checking_the_lock
+        self.writer.get_data(self.now - timedelta(hours=30), self.now - timedelta(hours=29))
+        self.assertEqual(lock_available, [True])
+
+    def test_failed_write_leaves_no_temporary_file(self):
+        self.writer.get_data(self.now - timedelta(hours=30), self.now - timedelta(hours=29))
+        segment = self.writer.shared_segment
+        # A directory in place of the next segment file makes the write fail
+        os.makedirs(os.path.join(segment._segment_path(segment.sequence() + 1), 'blocked'))
+        with self.assertRaises(OSError):
+            segment.write(self.writer.snapshot)
+        self.assertEqual([file_name for file_name in os.listdir(self.directory.name) if file_name.endswith('.tmp')], [])
+
+
+class PIWebAPIStandInTest(SimpleTestCase):
+    def setUp(self):
+        self.stand_in = PIWebAPIStandIn(interval_seconds=60).start()
+        self.object_name = OSI_PI_PARAMETERS_REQUESTED[0]
+        self.params = {'webid': self.stand_in.webid_mapping[self.object_name], 'startTime': '2024-01-01T00:00:30Z', 'endTime': '2024-01-02T00:00:30Z'}
+
+    def tearDown(self):
+        self.stand_in.stop()
+
+    def get(self, endpoint: str, **params) -> requests.Response:
+        return requests.get(f'{self.stand_in.base_url}/piwebapi/streamsets/{endpoint}', params={**self.params, **params})
+
+    def test_interpolated_values_every_interval(self):
+        items = self.get('interpolated', interval='1h').json()['Items'][0]['Items']
+        self.assertEqual(len(items), 25)
+        self.assertEqual(items[1]['Timestamp'], '2024-01-01T01:00:30Z')
+        self.assertEqual(items[1]['Value'], self.stand_in.value(self.object_name, pd.Timestamp('2024-01-01T01:00:30Z')))
+        self.assertEqual(self.get('interpolated', interval='0.5s').status_code, 400)
+
+    def test_plot_keeps_first_last_minimum_and_maximum(self):
+        items = self.get('plot', intervals=10).json()['Items'][0]['Items']
+        recorded = self.get('recorded', maxCount=10000).json()['Items'][0]['Items']
+        values = [item['Value'] for item in items]
+        self.assertLessEqual(len(items), 40)
+        self.assertEqual(items[0], recorded[0])
+        self.assertEqual(items[-1], recorded[-1])
+        self.assertEqual(min(values), min(item['Value'] for item in recorded))
+        self.assertEqual(max(values), max(item['Value'] for item in recorded))
+
+    def test_injected_errors_leave_the_range_uncovered(self):
+        self.stand_in.error_rate = 1
+        connector = OSIPIConnector(self.stand_in.base_url, 'user', 'password', tile_cache_directory='')
+        now = datetime.now(timezone)
+        with self.assertLogs('connectors.OSIPIConnector', 'WARNING'):
+            self.assertTrue(connector.get_data(now - timedelta(hours=2), now - timedelta(hours=1)).empty)
+        self.assertFalse(connector.coverage[self.object_name])
+        self.assertGreater(self.stand_in.stats['errors'], 0)
+        self.assertEqual(self.stand_in.stats['requests'], 0)
+        connector.close()
+
+
+class CircuitBreakerTest(SimpleTestCase):
+    def test_opens_after_consecutive_failures_and_closes_after_a_successful_probe(self):
+        circuit_breaker = CircuitBreaker(failure_threshold=2, reset_timeout_seconds=0.05)
+        circuit_breaker.record_failure()
+        circuit_breaker.record_success()
+        circuit_breaker.record_failure()
+        self.assertTrue(circuit_breaker.allow_request())
+        circuit_breaker.record_failure()
+        self.assertTrue(circuit_breaker.is_open())
+        self.assertFalse(circuit_breaker.allow_request())
+
+        # After the reset timeout a single probe is let through, its failure opens the circuit again
+        time.sleep(0.06)
+        self.assertTrue(circuit_breaker.allow_request())
+        self.assertFalse(circuit_breaker.allow_request())
+        circuit_breaker.record_failure()
+        self.assertTrue(circuit_breaker.is_open())
+
+        time.sleep(0.06)
+        self.assertTrue(circuit_breaker.allow_request())
+        circuit_breaker.record_success()
+        self.assertEqual(circuit_breaker.get_stats(), {'state': 'closed', 'consecutive_failures': 0, 'opened': 2, 'rejected': 2})
+
+
+class RequestResilienceTest(SimpleTestCase):
+    def setUp(self):
+        self.object_name = OSI_PI_PARAMETERS_REQUESTED[0]
+        self.now = datetime.now(timezone)
+
+    def connector(self, stand_in: PIWebAPIStandIn, **kwargs) -> OSIPIConnector:
+        return OSIPIConnector(stand_in.base_url, 'user', 'password', tile_cache_directory='', backoff_seconds=0.01, **kwargs)
+
+    def test_transient_errors_are_retried(self):
+        with PIWebAPIStandIn(interval_seconds=60, error_rate=0.5, seed=1) as stand_in:
+            connector = self.connector(stand_in, request_retries=10, tags_per_request=len(OSI_PI_PARAMETERS_REQUESTED), circuit_breaker_failures=100)
+            with self.assertLogs('connectors.OSIPIConnector', 'WARNING'):
+                df = connector.get_data(self.now - timedelta(hours=2), self.now - timedelta(hours=1))
+            self.assertEqual(len(df), 60)
+            self.assertGreater(stand_in.stats['errors'], 0)
+            self.assertEqual(connector.get_request_stats()['retries'], stand_in.stats['errors'])
+            connector.close()
+
+    def test_a_failing_tag_does_not_void_the_other_chunks(self):
+        with PIWebAPIStandIn(interval_seconds=60, failing_object_names=[self.object_name]) as stand_in:
+            connector = self.connector(stand_in, request_retries=1, tags_per_request=4)
+            start_time, end_time = self.now - timedelta(hours=2), self.now - timedelta(hours=1)
+            with self.assertLogs('connectors.OSIPIConnector', 'WARNING'):
+                df = connector.get_data(start_time, end_time)
+            failed_tags = OSI_PI_PARAMETERS_REQUESTED[:4]
+            self.assertTrue(df[failed_tags].isna().all().all())
+            self.assertFalse(df[OSI_PI_PARAMETERS_REQUESTED[4:]].isna().any().any())
+            self.assertTrue(all(connector.coverage[object_name].covers(start_time, end_time) for object_name in OSI_PI_PARAMETERS_REQUESTED[4:]))
+            self.assertFalse(any(connector.coverage[object_name] for object_name in failed_tags))
+            self.assertEqual(connector.get_request_stats()['failed_requests'], 1)
+            connector.close()
+
+    def test_open_circuit_fails_fast_and_serves_the_cache(self):
+        with PIWebAPIStandIn(interval_seconds=60) as stand_in:
+            connector = self.connector(stand_in, request_retries=1, circuit_breaker_failures=2, circuit_breaker_reset_seconds=0.3)
+            cached_range = (self.now - timedelta(hours=3), self.now - timedelta(hours=2))
+            connector.get_data(*cached_range, tags=[self.object_name])
+
+            stand_in.error_rate = 1
+            with self.assertLogs('connectors.OSIPIConnector', 'WARNING'):
+                connector.get_data(self.now - timedelta(hours=1), self.now, tags=[self.object_name])
+            self.assertEqual(connector.circuit_breaker.state, 'open')
+            errors = stand_in.stats['errors']
+
+            # While the circuit is open no request is sent, the reads return what is cached right away
+            started = time.monotonic()
+            with self.assertLogs('connectors.OSIPIConnector', 'WARNING'):
+                df = connector.get_data(cached_range[0], self.now, tags=[self.object_name])
+            self.assertLess(time.monotonic() - started, 0.2)
+            self.assertEqual(stand_in.stats['errors'], errors)
+            self.assertEqual(len(df), 60)
+
+            # Once PI is healthy again the probe after the reset timeout closes the circuit
+            stand_in.error_rate = 0
+            time.sleep(0.3)
+            connector.get_data(self.now - timedelta(hours=1), self.now, tags=[self.object_name])
+            self.assertEqual(connector.circuit_breaker.state, 'closed')
+            self.assertTrue(connector.coverage[self.object_name].covers(self.now - timedelta(hours=1), self.now - timedelta(minutes=1)))
+            connector.close()
+
+    def test_broken_streamed_responses_release_their_connection(self):
+        with PIWebAPIStandIn(interval_seconds=60) as stand_in:
+            connector = self.connector(stand_in, request_retries=2, tags_per_request=len(OSI_PI_PARAMETERS_REQUESTED), request_window_hours=24 * 7, circuit_breaker_failures=100)
+            # Keep every response alive, so a connection it did not release stays checked out
+            responses = []
+            session_get = connector.session.get
+            connector.session.get = lambda *args, **kwargs: responses.append(session_get(*args, **kwargs)) or responses[-1]
+
+            # A day of all tags, the body is far longer than a chunk of the streaming decoder
+            start_time, end_time = self.now - timedelta(hours=25), self.now - timedelta(hours=1)
+            for damage in ('truncate', 'corrupt'):
+                setattr(stand_in, f'{damage}_rate', 1)
+                with self.assertLogs('connectors.OSIPIConnector', 'WARNING'):
+                    self.assertTrue(connector.get_data(start_time, end_time, streaming=True).empty)
+                setattr(stand_in, f'{damage}_rate', 0)
+            self.assertEqual((stand_in.stats['truncated'], stand_in.stats['corrupted']), (3, 3))
+            self.assertEqual(connector.get_request_stats()['failed_requests'], 2)
+            self.assertEqual([response.raw.connection for response in responses], [None] * 6)
+
+            self.assertAlmostEqual(len(connector.get_data(start_time, end_time, streaming=True)), 24 * 60, delta=1)
+            connector.close()
+
+
+class CachePolicyTest(SimpleTestCase):
+    def setUp(self):
+        # One unit is one hour of all tags, 60 points per tag
+        self.unit_bytes = 60 * 16 * len(OSI_PI_PARAMETERS_REQUESTED)
+        self.connector = RecordingOSIPIConnector(byte_budget=3 * self.unit_bytes)
+        base = datetime.now(timezone).replace(minute=0, second=0, microsecond=0) - timedelta(hours=60)
+        self.ranges = [(base + timedelta(hours=hours), base + timedelta(hours=hours, minutes=59)) for hours in range(4)]
+
+    def covered(self, time_range: tuple) -> bool:
+        return self.connector.snapshot.coverage[OSI_PI_PARAMETERS_REQUESTED[0]].covers(*time_range)
+
+    def test_least_recently_read_buckets_are_evicted_to_meet_the_budget(self):
+        for time_range in self.ranges[:3]:
+            self.connector.get_data(*time_range)
+        self.assertEqual(self.connector.get_cache_stats()['evictions'], 0)
+        self.connector.get_data(*self.ranges[0])
+
+        self.connector.get_data(*self.ranges[3])
+        stats = self.connector.get_cache_stats()
+        self.assertLessEqual(stats['bytes'], 3 * self.unit_bytes)
+        self.assertEqual(stats['evictions'], len(OSI_PI_PARAMETERS_REQUESTED))
+        self.assertEqual(stats['evicted_bytes'], self.unit_bytes)
+        self.assertEqual(stats['entries'], 3 * len(OSI_PI_PARAMETERS_REQUESTED))
+        self.assertEqual((stats['hits'], stats['misses']), (1, 4))
+        self.assertEqual([self.covered(time_range) for time_range in self.ranges], [True, False, True, True])
+
+        # An evicted bucket is fetched again on its next read
+        self.connector.requested_ranges.clear()
+        self.assertEqual(len(self.connector.get_data(*self.ranges[1])), 60)
+        self.assertEqual(self.connector.requested_ranges, [self.ranges[1]])
+
+    def test_live_tail_is_pinned(self):
+        now = datetime.now(timezone).replace(second=0, microsecond=0)
+        self.connector.get_data(now - timedelta(hours=6), now)
+        stats = self.connector.get_cache_stats()
+        self.assertGreater(stats['bytes'], 3 * self.unit_bytes)
+        self.assertEqual(stats['evictions'], 0)
+
+
+class LocalHistoryTest(TestCase):
+    def setUp(self):
+        self.stand_in = PIWebAPIStandIn(interval_seconds=600).start()
+        self.connector = OSIPIConnector(
+            self.stand_in.base_url, 'user', 'password', tile_cache_directory='', local_history=False,
+            tags_per_request=len(OSI_PI_PARAMETERS_REQUESTED),
+        )
+        self.history = LocalHistory(batch_size=500)
+        self.options = {'settle_seconds': 0, 'backfill_days': 8, 'window_hours': 48, 'retention_days': 7, 'verify_cert': False}
+
+    def tearDown(self):
+        self.connector.close()
+        self.stand_in.stop()
+
+    def test_ingestion_continues_from_the_covered_range(self):
+        written, deleted = IngestSensorReadingsCommand().ingest(self.connector, self.history, self.options)
+        self.assertEqual(written, self.history.reading_model.objects.count() + deleted)
+        self.assertEqual(deleted, 144 * len(OSI_PI_PARAMETERS_REQUESTED))
+        start, end = self.history.covered_range(OSI_PI_PARAMETERS_REQUESTED)
+        self.assertAlmostEqual((end - start).total_seconds(), 7 * 86400, delta=60)
+
+        requests_before = self.stand_in.stats['requests']
+        written, _ = IngestSensorReadingsCommand().ingest(self.connector, self.history, self.options)
+        self.assertLessEqual(written, 2 * len(OSI_PI_PARAMETERS_REQUESTED))
+        self.assertEqual(self.stand_in.stats['requests'] - requests_before, 1)
+
+        object_name = OSI_PI_PARAMETERS_REQUESTED[0]
+        timestamps, values = self.history.arrays(object_name, start, end)
+        self.assertEqual(values[0], self.stand_in.value(object_name, pd.Timestamp(timestamps[0], tz='UTC')))
+        self.assertTrue(np.all(np.diff(timestamps) == 600 * 10**9))
+
+    def test_write_updates_existing_readings_in_batches(self):
+        history = LocalHistory(batch_size=3)
+        index = pd.date_range('2024-01-10 09:00', periods=7, freq='min', tz='UTC')
+        df = pd.DataFrame({'A': np.arange(7.0), 'B': [np.nan] * 6 + [1.0]}, index=index)
+        self.assertEqual(history.write(df, index[0], index[-1]), 8)
+
+        df['A'] = df['A'] * 10
+        self.assertEqual(history.write(df.iloc[2:], index[2], index[-1], tags=['A']), 6)
+        self.assertEqual(history.reading_model.objects.count(), 8)
+        timestamps, values = history.arrays('A', index[0], index[-1])
+        np.testing.assert_array_equal(timestamps, index.as_unit('ns').asi8)
+        np.testing.assert_array_equal(values, [0, 1, 20, 30, 40, 50, 60])
+        self.assertEqual(history.arrays('B', index[0], index[-1])[1].tolist(), [1.0])
+
+    def test_connector_serves_ranges_held_by_the_local_history(self):
+        IngestSensorReadingsCommand().ingest(self.connector, self.history, self.options)
+        connector = OSIPIConnector(self.stand_in.base_url, 'user', 'password', tile_cache_directory='', local_history=True)
+        object_name = OSI_PI_PARAMETERS_REQUESTED[0]
+        now = datetime.now(timezone)
+        requests_before = self.stand_in.stats['requests']
+
+        # Older than the retention of the cache and within it
+        df_history = connector.get_data(now - timedelta(days=6, hours=12), now - timedelta(days=4), tags=[object_name])
+        df_cached = connector.get_data(now - timedelta(days=2), now - timedelta(days=1), tags=[object_name])
+        self.assertEqual(self.stand_in.stats['requests'], requests_before)
+        self.assertEqual(len(df_history), 360)
+        self.assertEqual(len(df_cached), 144)
+        self.assertFalse(df_history.index.has_duplicates)
+        self.assertEqual(df_history[object_name].iloc[0], self.stand_in.value(object_name, df_history.index[0]))
+
+        # The part after the covered range is requested from the OSI PI system
+        connector.get_data(now - timedelta(hours=1), now, tags=[object_name])
+        self.assertEqual(self.stand_in.stats['requests'], requests_before + 1)
+        connector.close()
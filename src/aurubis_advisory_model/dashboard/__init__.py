@@ -4,94 +4,147 @@
 
 # Library imports
 from datetime import datetime, timedelta
+import numpy as np
 import pandas as pd
 from django_plotly_dash import DjangoDash
-from dash import Dash, html, dcc
-from dash.dependencies import Input, Output
+from dash import Dash, Patch, html, dcc
+from dash.dependencies import Input, Output, State
 import plotly.express as px
 
 # Module imports
-from connectors import instantiated_osipiconnector as con
+from connectors import instantiated_osipiconnector as con, prefetcher
 from utils.TimestampHandling import tz_aware_timestamp
+from utils.Downsampling import downsample_frame
 
 # Configuration imports
 from config import (
     CELOX_O2_DEFAULT_UPPER_THRESHHOLD,
     CELOX_O2_DEFAULT_LOWER_THRESHHOLD,
     CHARGE_START_HOUR,
+    DASHBOARD_MAX_POINTS,
+    DASHBOARD_MAX_CHECKLIST_OPTIONS,
 )
 
+def measurement_events(series: pd.Series, max_events: int = DASHBOARD_MAX_CHECKLIST_OPTIONS) -> pd.Series:
+    """
+    Returns the Celox measurements of a series, i.e. the samples whose value differs from the previous sample,
+    limited to the max_events most recent ones.
+    """
+    values = series.to_numpy()
+    changed = np.empty(len(values), dtype=bool)
+    changed[:1] = True
+    np.not_equal(values[1:], values[:-1], out=changed[1:])
+    return series[changed].iloc[-max_events:]
+
+
+def checklist_options(events: pd.Series) -> list:
+    """
+    Returns the checklist options of the measurement events, the value of an option is its ISO timestamp.
+    """
+    labels = events.index.strftime('%Y-%m-%d %H:%M:%S')
+    return [{'label': f'{label} | {value:.1f}', 'value': timestamp} for label, value, timestamp in zip(labels, events.to_numpy(), events.index.map(pd.Timestamp.isoformat))]
+
+
+def checklist_update(options: list, shown_options: list):
+    """
+    Returns the checklist options to send to the browser: a Patch removing and adding only the changed options if the
+    new options extend the shown ones at either end, otherwise the complete list.
+    """
+    shown_values = [option['value'] for option in shown_options or []]
+    values = [option['value'] for option in options]
+    kept = set(shown_values) & set(values)
+    kept_positions = [position for position, value in enumerate(values) if value in kept]
+    if not kept_positions:
+        return options
+    first_kept, last_kept = kept_positions[0], kept_positions[-1]
+    if len(kept_positions) != last_kept - first_kept + 1:
+        return options  # New options in between the shown ones
+
+    patch = Patch()
+    for option in shown_options:
+        if option['value'] not in kept:
+            patch.remove(option)
+    for option in reversed(options[:first_kept]):
+        patch.prepend(option)
+    if last_kept + 1 < len(options):
+        patch.extend(options[last_kept + 1:])
+    return patch
+
+
+def session_id(request) -> str:
+    """
+    Returns the key identifying the browser session of a Django request for the prefetcher, all requests without
+    session share one key.
+    """
+    session = getattr(request, 'session', None)
+    return getattr(session, 'session_key', None) or 'anonymous'
+
+
 # Integrate Dash app into Flask app
 def create_dash_app():
     # Initiate the Dash app
     dash_app = DjangoDash('aurubis_advisory_model')
 
-    # Create timestamps for initial data-loading
-    initial_end_timestamp = datetime.utcnow()
-    initial_start_timestamp = initial_end_timestamp - timedelta(days=1)
-
-    parameter_to_display = 'ACTUAL_CELOX_O2'
-
-    # Pull the data once
-    df = con.get_data(
-        start_time = initial_start_timestamp, 
-        end_time = initial_end_timestamp,
-    )
-
-    df = df[df[parameter_to_display] <= 20000] # TODO: Create a dynamic threshhold handling
-
-    #df[parameter_to_display].dt.tz_localize('UTC')
-
-    filtered_df = df[(df[parameter_to_display] >= 0) ] 
-        
-    fig = px.line(filtered_df, y=parameter_to_display)
-
-    dash_app.layout = html.Div([
-        html.Div([  # Dieses div enthält die Elemente in der ersten Spalte (DatePicker, TimePickers)
-            dcc.DatePickerRange(
-                id='my-date-picker-range',
-                start_date=initial_start_timestamp.date(),
-                end_date=initial_end_timestamp.date(),
-                display_format='YYYY-MM-DD',
-            ),
-            dcc.Input(
-                id='start-time-picker',
-                type='time',
-                value='00:00',
-            ),
-            dcc.Input(
-                id='end-time-picker',
-                type='time',
-                value='23:59',
-            ),
-            dcc.Graph(
-                id='example-graph',
-                config={'responsive': True},
-                figure=fig
-            ),
-        ], style={'width': '70%', 'display': 'inline-block'}),
-
-        html.Div([  # Dieses div enthält die Elemente in der zweiten Spalte (Graph, Checklist)
+    parameter_to_display = 'ACTUAL_O2_CELOX'
+
+    # The layout is built on every page load without data, the callback below fills graph and checklist on the first
+    # request, so creating the app does no I/O and the default dates are always the current ones.
+    def serve_layout():
+        initial_end_timestamp = datetime.utcnow()
+        initial_start_timestamp = initial_end_timestamp - timedelta(days=1)
+        return html.Div([
+            html.Div([  # Dieses div enthält die Elemente in der ersten Spalte (DatePicker, TimePickers)
+                dcc.DatePickerRange(
+                    id='my-date-picker-range',
+                    start_date=initial_start_timestamp.date(),
+                    end_date=initial_end_timestamp.date(),
+                    display_format='YYYY-MM-DD',
+                ),
+                dcc.Input(
+                    id='start-time-picker',
+                    type='time',
+                    value='00:00',
+                ),
+                dcc.Input(
+                    id='end-time-picker',
+                    type='time',
+                    value='23:59',
+                ),
+                dcc.Graph(
+                    id='example-graph',
+                    config={'responsive': True},
+                    figure={}
+                ),
+            ], style={'width': '70%', 'display': 'inline-block'}),
+
+            html.Div([  # Dieses div enthält die Elemente in der zweiten Spalte (Graph, Checklist)
             
-            dcc.Checklist(
-                id="checklist",
-                options=[{'label': str(row[parameter_to_display]), 'value': str(i)+"_"+str(row[parameter_to_display])} for i, row in df.iterrows()]
-            )
-        ], style={'width': '30%', 'display': 'inline-block', 'float': 'right'}),
-    ], style={'width': '100%', 'height': '100%'})
+                dcc.Checklist(
+                    id="checklist",
+                    options=[]
+                ),
+                # The options currently shown, so that the callback only sends the changed ones
+                dcc.Store(id='checklist-options', data=[]),
+            ], style={'width': '30%', 'display': 'inline-block', 'float': 'right'}),
+        ], style={'width': '100%', 'height': '100%'})
+
+    dash_app.layout = serve_layout
 
     @dash_app.callback(
         Output('example-graph', 'figure'),
         Output('checklist', 'options'),
+        Output('checklist-options', 'data'),
         [
             Input('my-date-picker-range', 'start_date'),
             Input('my-date-picker-range', 'end_date'),
             Input('start-time-picker', 'value'),
             Input('end-time-picker', 'value'),
-            Input('checklist', 'value')  # Added input for checklist
+        ],
+        [
+            State('checklist-options', 'data'),
         ]
     )
-    def update_output(start_date, end_date, start_time, end_time, selected_values):
+    def update_output(start_date, end_date, start_time, end_time, shown_options, **kwargs):
 
         start_datetime = datetime.strptime(f"{start_date} {start_time}", '%Y-%m-%d %H:%M')
         end_datetime = datetime.strptime(f"{end_date} {end_time}", '%Y-%m-%d %H:%M')
@@ -102,12 +155,20 @@ def create_dash_app():
         df = con.get_data(
             start_time = start_datetime, 
             end_time = end_datetime,
+            tags = [parameter_to_display],
         )
+        # The adjacent windows the session is likely to page to next are fetched in the background
+        if prefetcher.is_running():
+            prefetcher.record_access(session_id(kwargs.get('request')), [parameter_to_display], start_datetime, end_datetime)
 
         filtered_df = df[(df.index >= pd.Timestamp(start_datetime)) & (df.index <= pd.Timestamp(end_datetime)) & (df[parameter_to_display] <= 20000) & (df[parameter_to_display] >= 0) ] 
         
-        fig = px.line(filtered_df, y=parameter_to_display)
-        opts = [{'label': str(row[parameter_to_display]), 'value': i} for i, row in filtered_df.iterrows()]
-        return fig, opts
+        # Only a pixel width worth of points is sent to the browser, LTTB keeps the O2 spikes
+        fig = px.line(downsample_frame(filtered_df[[parameter_to_display]], DASHBOARD_MAX_POINTS), y=parameter_to_display)
+        # Only the Celox measurements are listed instead of every sample, the browser receives the changed options only
+        # The store of the shown options receives the same update as the checklist
+        options = checklist_options(measurement_events(filtered_df[parameter_to_display]))
+        options_update = checklist_update(options, shown_options)
+        return fig, options_update, options_update
 
     return dash_app
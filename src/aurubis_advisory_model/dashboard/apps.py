@@ -1,6 +1,57 @@
+import os
+import sys
+import atexit
 from django.apps import AppConfig
 
+# Management commands which serve requests, all others (migrate, test, shell, ingest_sensor_readings, ...) do not
+SERVING_COMMANDS = ('runserver',)
+
+
+def save_checkpoint(connector):
+    # A connector which was never used has nothing to save
+    if connector.is_initialized():
+        connector.save_checkpoint_if_due(interval_seconds=0)
+
+
+def serves_requests(argv: list = None, environ: dict = None) -> bool:
+    """
+    Checks whether this process serves requests, i.e. runs under a WSGI/ASGI server or is the runserver process which
+    handles the requests, not a management command or the autoreload watcher of runserver.
+    """
+    argv = sys.argv if argv is None else argv
+    environ = os.environ if environ is None else environ
+    program = os.path.normpath(argv[0]) if argv else ''
+    is_management_command = os.path.basename(program) in ('manage.py', 'django-admin', 'django-admin.py') or program.endswith(os.path.join('django', '__main__.py'))
+    if not is_management_command:
+        return True
+    if len(argv) < 2 or argv[1] not in SERVING_COMMANDS:
+        return False
+    # The autoreloader of runserver imports the apps in a watcher process which serves no requests
+    return '--noreload' in argv or environ.get('RUN_MAIN') == 'true'
+
 
 class DashboardConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'dashboard'
+
+    def ready(self):
+        from config import OSI_PI_WARM_UP_ON_STARTUP, OSI_PI_TAIL_POLLER_ENABLED, OSI_PI_CACHE_CHECKPOINT_PATH, OSI_PI_PREFETCH_ENABLED
+        from connectors import instantiated_osipiconnector, tail_poller, prefetcher
+
+        # The background features only run in processes serving the dashboard, startup itself stays free of I/O
+        if not serves_requests():
+            return
+
+        # Optionally fill the connector cache in the background
+        if OSI_PI_WARM_UP_ON_STARTUP:
+            instantiated_osipiconnector.start_warm_up()
+
+        # Save the cache on graceful shutdown, registered first so it runs after the tail poller was stopped
+        if OSI_PI_CACHE_CHECKPOINT_PATH:
+            atexit.register(save_checkpoint, instantiated_osipiconnector)
+        if OSI_PI_TAIL_POLLER_ENABLED:
+            tail_poller.start()
+            atexit.register(tail_poller.stop, 5)
+        if OSI_PI_PREFETCH_ENABLED:
+            prefetcher.start()
+            atexit.register(prefetcher.stop, 5)
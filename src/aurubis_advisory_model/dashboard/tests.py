@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+from dash import Patch
+from django.test import SimpleTestCase
+
+from dashboard import measurement_events, checklist_options, checklist_update
+from dashboard.apps import serves_requests
+
+
+class ChecklistTest(SimpleTestCase):
+    def setUp(self):
+        # One sample per second for a day, the Celox probe measures every 10 minutes and holds the value in between
+        index = pd.date_range('2024-01-01', periods=24 * 3600, freq='1s', tz='Europe/Berlin')
+        self.series = pd.Series(np.repeat(np.arange(144) * 10.0, 600), index=index)
+
+    def test_only_the_most_recent_measurements_are_listed(self):
+        events = measurement_events(self.series, max_events=20)
+        self.assertEqual(len(events), 20)
+        self.assertEqual(events.index[-1], self.series.index[-600])
+        self.assertEqual(events.iloc[-1], 1430.0)
+
+        options = checklist_options(events)
+        self.assertEqual(options[-1], {'label': '2024-01-01 23:50:00 | 1430.0', 'value': '2024-01-01T23:50:00+01:00'})
+
+    def test_shifted_window_is_sent_as_patch(self):
+        shown_options = checklist_options(measurement_events(self.series.iloc[:6000], max_events=5))
+        options = checklist_options(measurement_events(self.series.iloc[:7200], max_events=5))
+
+        update = checklist_update(options, shown_options)
+        self.assertIsInstance(update, Patch)
+        operations = update.to_plotly_json()['operations']
+        self.assertEqual([operation['operation'] for operation in operations], ['Remove', 'Remove', 'Extend'])
+        self.assertEqual(operations[-1]['params']['value'], options[-2:])
+
+    def test_unrelated_window_is_sent_completely(self):
+        shown_options = checklist_options(measurement_events(self.series.iloc[:6000], max_events=5))
+        options = checklist_options(measurement_events(self.series.iloc[-6000:], max_events=5))
+        self.assertEqual(checklist_update(options, shown_options), options)
+        self.assertEqual(checklist_update(options, []), options)
+
+
+class BackgroundFeaturesTest(SimpleTestCase):
+    def test_only_processes_serving_requests_start_them(self):
+        self.assertTrue(serves_requests(['/usr/bin/gunicorn', 'aurubis_advisory_model.wsgi'], {}))
+        self.assertTrue(serves_requests(['manage.py', 'runserver'], {'RUN_MAIN': 'true'}))
+        self.assertTrue(serves_requests(['manage.py', 'runserver', '--noreload'], {}))
+        # The autoreload watcher of runserver and the other management commands serve no requests
+        self.assertFalse(serves_requests(['manage.py', 'runserver'], {}))
+        for command in ('migrate', 'test', 'shell', 'ingest_sensor_readings'):
+            self.assertFalse(serves_requests(['manage.py', command], {}))
+        self.assertFalse(serves_requests(['/venv/bin/django-admin', 'migrate'], {}))
+        self.assertFalse(serves_requests(['/venv/lib/python3.11/site-packages/django/__main__.py', 'migrate'], {}))
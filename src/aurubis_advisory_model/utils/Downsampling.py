@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Select at most max_points points of a series with the Largest-Triangle-Three-Buckets algorithm.
+    The first and the last point are always kept, from every bucket in between the point forming the largest triangle
+    with the previously selected point and the average of the next bucket is kept, so spikes survive the decimation.
+    Returns the sorted indices of the selected points.
+    """
+    n = len(x)
+    if n <= max_points:
+        return np.arange(n)
+    if max_points < 3:
+        return np.array([0, n - 1][:max(max_points, 0)], dtype=int)
+
+    x = np.asarray(x, dtype='float64') - float(x[0])
+    y = np.asarray(y, dtype='float64')
+    # max_points - 2 buckets over the inner points, the last point forms the bucket after the last one
+    edges = np.append(np.linspace(1, n - 1, max_points - 1).astype(int), n)
+    selected = np.empty(max_points, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+
+    previous = 0
+    for bucket in range(max_points - 2):
+        start, end, next_end = edges[bucket], edges[bucket + 1], edges[bucket + 2]
+        average_x, average_y = x[end:next_end].mean(), y[end:next_end].mean()
+        areas = np.abs((x[previous] - average_x) * (y[start:end] - y[previous]) - (x[previous] - x[start:end]) * (average_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def downsample_frame(df: pd.DataFrame, max_points: int) -> pd.DataFrame:
+    """
+    Reduce a DataFrame with a DatetimeIndex to at most max_points rows with LTTB, so every line of a graph has at most
+    max_points points whatever the number of columns. The budget is split evenly between the columns, every column
+    selects its share of the rows with LTTB ignoring its missing values, the result contains the union of the selected rows.
+    """
+    if df.empty or len(df) <= max_points:
+        return df
+    x = df.index.as_unit('ns').asi8
+    column_points = max_points // max(len(df.columns), 1)
+    rows = []
+    for column in df.columns:
+        values = df[column].to_numpy(dtype='float64', na_value=np.nan)
+        valid = np.flatnonzero(~np.isnan(values))
+        rows.append(valid[lttb_indices(x[valid], values[valid], column_points)])
+    return df.iloc[np.unique(np.concatenate(rows))]